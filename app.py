@@ -1,17 +1,200 @@
 from flask import Flask, request, jsonify, render_template, send_from_directory
-from coleta_service import ler_pontos_por_tipo_lixo, ler_todos_pontos
+from coleta_service import (ler_pontos_por_tipo_lixo, ler_todos_pontos, estatisticas_prefiltro, cache_rotas,
+                            tabela_rotas, coalescedor_rotas, resolvedor_rotas, buscar_pontos_proximos,
+                            consultar_pontos,
+                            pontos_geojson, exportar_pontos, ler_pontos_proximos_em_lote, FORMATO_NDJSON,
+                            FORMATO_JSON)
+from repositorio_pontos import obter_repositorio, MODO_TODOS, MODO_QUALQUER
+from cache_mapas import CacheMapas, MapaRenderizado
+from exportacao import CorposPreCalculados, comprimir_fluxo, escolher_codificacao
+from cache_respostas import CacheRespostas
+from metricas import metricas, duracao_etapas, TIPO_CONTEUDO
 import folium
 from folium.plugins import LocateControl
+import hashlib
+import html as html_lib
+import json
+import logging
 import os
+from registro import configurar_registro
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_url_path='/static', static_folder='static', template_folder='templates')
 
+# Carregar o CSV uma única vez na inicialização; depois só é relido se o arquivo mudar
+try:
+    obter_repositorio().dados()
+except FileNotFoundError:
+    logger.warning("pontos-de-coleta.csv não encontrado na inicialização")
+
+# Paginação de /api/coleta-pontos
+PAGE_SIZE = 10
+PAGE_SIZE_MAX = 100
+
+# Respostas serializadas de /api/coleta-pontos por consulta normalizada; as que
+# dependem de rotas expiram em TTL_RESPOSTAS_ROTAS segundos, e as sem localização
+# podem ser guardadas por CDNs/proxies por MAX_AGE_RESPOSTAS segundos
+cache_respostas = CacheRespostas(capacidade=int(os.getenv('CACHE_RESPOSTAS_CAPACIDADE', '256')))
+TTL_RESPOSTAS_ROTAS = int(os.getenv('CACHE_RESPOSTAS_TTL', '300'))
+MAX_AGE_RESPOSTAS = int(os.getenv('CACHE_RESPOSTAS_MAX_AGE', '60'))
+
+# Casas decimais padrão das coordenadas no feed GeoJSON (~1 m)
+PRECISAO_GEOJSON = 5
+
+# Exportação completa: tipo de conteúdo por formato e corpos sem filtro já prontos
+TIPOS_EXPORTACAO = {FORMATO_NDJSON: 'application/x-ndjson', FORMATO_JSON: 'application/json'}
+corpos_exportacao = CorposPreCalculados()
+
+# Mapas base renderizados por filtro (sem localização do usuário)
+cache_mapas = CacheMapas(capacidade=int(os.getenv('CACHE_MAPAS_CAPACIDADE', '32')))
+
 @app.route('/')
 def home():
     """Página inicial com informações sobre o projeto."""
     return render_template('index.html')
 
 
+def _ler_numeros(texto, quantidade, nome):
+    """
+    Converte um parâmetro "a,b,..." em uma lista de floats.
+    
+    Lança:
+        ValueError: se a quantidade de valores ou o formato forem inválidos
+    """
+    partes = texto.split(',')
+    if len(partes) != quantidade:
+        raise ValueError(f"Parâmetro {nome} deve ter {quantidade} valores separados por vírgula")
+    try:
+        return [float(p) for p in partes]
+    except ValueError:
+        raise ValueError(f"Parâmetro {nome} deve conter apenas números")
+
+
+def _normalizar_tipos_consulta(tipos_param):
+    """Tipos do parâmetro tipos sem espaços, minúsculos, sem repetição e ordenados."""
+    return sorted({t.strip().lower() for t in (tipos_param or '').split(',') if t.strip()})
+
+
+def _ler_roteamento(args=None):
+    """Lê o parâmetro roteamento (lista de provedores separados por vírgula), se houver."""
+    roteamento = (request.args if args is None else args).get('roteamento')
+    return [nome.strip() for nome in roteamento.split(',')] if roteamento else None
+
+
+def ler_consulta_coleta(args):
+    """
+    Lê e valida os parâmetros de /api/coleta-pontos e monta a chave normalizada da consulta.
+    
+    Usada pela view Flask e pelo caminho assíncrono de app_async.py.
+    
+    Args:
+        args: MultiDict com os parâmetros da query string
+    
+    Retorna:
+        Dicionário com os parâmetros convertidos, o tipo da consulta ("lista",
+        "near" ou "rotas"), a chave do cache de respostas, o TTL e o Cache-Control
+    
+    Lança:
+        ValueError: se algum parâmetro for inválido
+    """
+    tipos_param = args.get('tipos')
+    bbox_param = args.get('bbox')
+    near_param = args.get('near')
+    user_lat = args.get('lat', type=float)
+    user_lon = args.get('lon', type=float)
+    consulta = {
+        'tipos_lixo': _normalizar_tipos_consulta(tipos_param),
+        'modo': args.get('modo', default=MODO_TODOS),
+        # Paginação: page/page_size (deslocamento) ou cursor da página anterior
+        'page': args.get('page', default=1, type=int),
+        'page_size': args.get('page_size', default=PAGE_SIZE, type=int),
+        'cursor': args.get('cursor'),
+        'filtrada': bool(tipos_param or bbox_param or near_param),
+    }
+    if consulta['page'] < 1 or not 1 <= consulta['page_size'] <= PAGE_SIZE_MAX:
+        raise ValueError(f"Paginação inválida: page >= 1 e page_size entre 1 e {PAGE_SIZE_MAX}")
+    consulta['inicio'] = (consulta['page'] - 1) * consulta['page_size']
+    
+    if bbox_param and near_param:
+        raise ValueError("Use bbox ou near, não os dois ao mesmo tempo")
+    
+    # Chave da consulta normalizada: só entram os parâmetros que afetam o resultado
+    if near_param:
+        consulta['tipo'] = 'near'
+        consulta['near_lat'], consulta['near_lon'] = _ler_numeros(near_param, 2, 'near')
+        consulta['k'] = args.get('k', default=5, type=int)
+        parametros = (consulta['near_lat'], consulta['near_lon'], consulta['k'])
+    elif tipos_param and user_lat and user_lon:
+        # Origem quantizada como no cache de rotas (3 casas ~ 110 m)
+        consulta['tipo'] = 'rotas'
+        consulta['lat'] = round(user_lat, cache_rotas.precisao)
+        consulta['lon'] = round(user_lon, cache_rotas.precisao)
+        consulta['n'] = args.get('n', default=5, type=int)
+        consulta['roteamento'] = _ler_roteamento(args)
+        parametros = (consulta['lat'], consulta['lon'], consulta['n'], tuple(consulta['roteamento'] or ()))
+    else:
+        consulta['tipo'] = 'lista'
+        consulta['caixa'] = None
+        if bbox_param:
+            min_lon, min_lat, max_lon, max_lat = _ler_numeros(bbox_param, 4, 'bbox')
+            consulta['caixa'] = (min_lat, min_lon, max_lat, max_lon)
+        parametros = (consulta['caixa'], consulta['cursor'])
+    if consulta['tipo'] != 'lista' and consulta['cursor']:
+        raise ValueError("cursor só é aceito em listagens sem proximidade; use page")
+    
+    consulta['chave'] = (obter_repositorio().dados().assinatura, tuple(consulta['tipos_lixo']),
+                         consulta['modo'], consulta['filtrada'], consulta['page'], consulta['page_size'],
+                         consulta['tipo'], parametros)
+    consulta['ttl'] = TTL_RESPOSTAS_ROTAS if consulta['tipo'] == 'rotas' else None
+    # Sem localização do usuário: a mesma resposta serve a todos (CDN/proxies)
+    consulta['cache_control'] = (f'public, max-age={MAX_AGE_RESPOSTAS}' if consulta['tipo'] == 'lista'
+                                 else 'private, no-cache')
+    return consulta
+
+
+def corpo_coleta(consulta, pontos, total, proximo_cursor=None):
+    """Serializa a resposta JSON de /api/coleta-pontos (bytes)."""
+    page_size = consulta['page_size']
+    response = {
+        'total': total,
+        'page': consulta['page'],
+        'page_size': page_size,
+        'total_pages': (total + page_size - 1) // page_size,
+        'pontos': pontos,
+        'next_cursor': proximo_cursor
+    }
+    if consulta['filtrada']:
+        response['tipos_filtrados'] = consulta['tipos_lixo']
+        response['modo'] = consulta['modo']
+    with duracao_etapas.cronometrar(etapa="serializacao"):
+        return f"{app.json.dumps(response)}\n".encode('utf-8')
+
+
+def pagina_proximidade(consulta, pontos_dict):
+    """Página pedida de um ranking por proximidade (já limitado a k ou n): (pontos, total)."""
+    pontos = list(pontos_dict.values()) if pontos_dict else []
+    return pontos[consulta['inicio']:consulta['inicio'] + consulta['page_size']], len(pontos)
+
+
+def _gerar_corpo_coleta(consulta):
+    """Executa a consulta de /api/coleta-pontos e serializa o resultado."""
+    tipos_lixo, modo = consulta['tipos_lixo'], consulta['modo']
+    if consulta['tipo'] == 'near':
+        pontos_dict = buscar_pontos_proximos(consulta['near_lat'], consulta['near_lon'], consulta['k'],
+                                             tipos_lixo, modo)
+        return corpo_coleta(consulta, *pagina_proximidade(consulta, pontos_dict))
+    if consulta['tipo'] == 'rotas':
+        pontos_dict = ler_pontos_por_tipo_lixo(tipos_lixo, consulta['lat'], consulta['lon'], consulta['n'],
+                                               modo=modo, roteamento=consulta['roteamento'])
+        return corpo_coleta(consulta, *pagina_proximidade(consulta, pontos_dict))
+    
+    # Listagens (todos, por tipo e/ou por área): a consulta devolve só a página
+    resultado = consultar_pontos(tipos_lixo, modo, limite=consulta['page_size'], deslocamento=consulta['inicio'],
+                                 cursor=consulta['cursor'], caixa=consulta['caixa'])
+    return corpo_coleta(consulta, resultado['pontos'], resultado['total'], resultado['proximo_cursor'])
+
+
 @app.route('/api/coleta-pontos', methods=['GET'])
 def coleta_pontos():
     """
@@ -21,232 +204,452 @@ def coleta_pontos():
         tipos: Lista de tipos de lixo separados por vírgula (opcional)
                Exemplo: ?tipos=eletroeletronicos,pilhas
         page: Número da página (padrão: 1)
-              Cada página contém 10 resultados
+        page_size: Resultados por página (padrão: 10, máximo: 100)
+        cursor: Valor de next_cursor da resposta anterior, para buscar a página seguinte
+                sem recontar deslocamentos (listagens sem proximidade; ignora page)
         lat: Latitude do usuário (opcional, para cálculo de proximidade)
         lon: Longitude do usuário (opcional, para cálculo de proximidade)
         n: Número de pontos mais próximos a retornar (padrão: 5)
+        modo: "todos" (padrão) para pontos que aceitam todos os tipos,
+              "qualquer" para pontos que aceitam pelo menos um dos tipos
+        bbox: Retângulo min_lon,min_lat,max_lon,max_lat (opcional, índice espacial)
+              Exemplo: ?bbox=-47.95,-15.85,-47.85,-15.75
+        near: Origem lat,lon para os K vizinhos mais próximos em linha reta (opcional)
+              Exemplo: ?near=-15.79,-47.88&k=10
+        k: Número de vizinhos retornados com near (padrão: 5)
+        roteamento: Provedores de rotas para lat/lon, em ordem de preferência, separados
+                    por vírgula: google, osrm, estimativa (padrão: ROTEAMENTO_PADRAO)
     
     Retorna:
         JSON com pontos de coleta (filtrados ou todos)
-        Se lat/lon fornecidos: inclui distance_km e duration_min
+        Se lat/lon fornecidos: inclui distance_km, duration_min e fonte_distancia
+        Se near fornecido: inclui distancia_reta_km, do mais próximo ao mais distante
+        next_cursor: cursor da próxima página (null na última ou em consultas por proximidade)
+        
+    Cache:
+        O corpo é serializado uma vez por consulta normalizada (tipos ordenados,
+        paginação, filtros e lat/lon quantizados) e versão dos dados, com ETag forte;
+        If-None-Match com o ETag atual responde 304. Consultas sem localização
+        são públicas (Cache-Control: public, max-age); as com lat/lon ou near, privadas.
         
     Códigos de Status:
         200: Sucesso
+        304: Não modificado (If-None-Match)
+        400: Parâmetro inválido
         500: Erro interno do servidor
     """
     try:
-        import csv
-        
-        PAGE_SIZE = 10
+        consulta = ler_consulta_coleta(request.args)
+        entrada = cache_respostas.obter(consulta['chave'], lambda: _gerar_corpo_coleta(consulta),
+                                        ttl=consulta['ttl'])
+        resposta = app.response_class(entrada.corpo, mimetype='application/json')
+        resposta.set_etag(entrada.etag)
+        resposta.headers['Cache-Control'] = consulta['cache_control']
+        return resposta.make_conditional(request)
         
-        # Se tipos foi fornecido, filtrar por tipo
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo CSV não encontrado'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Erro ao processar requisição: {str(e)}'}), 500
+
+
+@app.route('/api/coleta-pontos/exportar', methods=['GET'])
+def exportar_coleta_pontos():
+    """
+    Endpoint REST GET para exportar todos os pontos do filtro de uma vez,
+    transmitidos em blocos (sem paginação).
+    
+    Query Parameters:
+        formato: "ndjson" (padrão, um ponto por linha) ou "json" (array JSON)
+        tipos: Lista de tipos de lixo separados por vírgula (opcional)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+    
+    A resposta é comprimida com gzip (ou brotli, se instalado) conforme o
+    Accept-Encoding. Sem filtro, o corpo já serializado e comprimido é
+    reaproveitado entre requisições até o CSV mudar (com ETag).
+    """
+    try:
+        formato = request.args.get('formato', default=FORMATO_NDJSON)
         tipos_param = request.args.get('tipos')
-        if tipos_param:
-            user_lat = request.args.get('lat', type=float)
-            user_lon = request.args.get('lon', type=float)
-            n = request.args.get('n', default=5, type=int)
-            tipos_lixo = [t.strip() for t in tipos_param.split(',')]
-            pontos_dict = ler_pontos_por_tipo_lixo(tipos_lixo, user_lat, user_lon, n)
-            pontos = list(pontos_dict.values()) if pontos_dict else []
-            
-            # Aplicar paginação se solicitado
-            page = request.args.get('page', default=1, type=int)
-            total = len(pontos)
-            start = (page - 1) * PAGE_SIZE
-            end = start + PAGE_SIZE
-            pontos_paginated = pontos[start:end]
-            
-            response = {
-                'total': total,
-                'page': page,
-                'page_size': PAGE_SIZE,
-                'total_pages': (total + PAGE_SIZE - 1) // PAGE_SIZE,
-                'tipos_filtrados': tipos_lixo,
-                'pontos': pontos_paginated
-            }
+        modo = request.args.get('modo', default=MODO_TODOS)
+        tipos_lixo = [t.strip() for t in tipos_param.split(',')] if tipos_param else []
+        codificacao = escolher_codificacao(request.headers.get('Accept-Encoding'))
+        
+        assinatura, partes = exportar_pontos(tipos_lixo, modo, formato)
+        if codificacao:
+            partes = comprimir_fluxo(partes, codificacao)
+        
+        if not tipos_lixo:
+            chave = (assinatura, formato, codificacao)
+            resposta = app.response_class(corpos_exportacao.obter(chave, lambda: partes),
+                                          mimetype=TIPOS_EXPORTACAO[formato])
+            resposta.set_etag(f"{assinatura}-{formato}-{codificacao or 'identity'}")
         else:
-            # Caso contrário, listar todos os pontos
-            pontos = []
-            
-            with open('pontos-de-coleta.csv', newline='', encoding='utf-8') as arquivo:
-                leitor = csv.DictReader(arquivo, skipinitialspace=True)
-                for row in leitor:
-                    if row['tipo_lixo']:
-                        pontos.append({
-                            'id': row['id'],
-                            'nome': row['nome'],
-                            'tipo_lixo': row['tipo_lixo'],
-                            'latitude': float(row['latitude']),
-                            'longitude': float(row['longitude']),
-                            'endereco': row['endereco']
-                        })
-            
-            # Aplicar paginação se solicitado
-            page = request.args.get('page', default=1, type=int)
-            total = len(pontos)
-            start = (page - 1) * PAGE_SIZE
-            end = start + PAGE_SIZE
-            pontos_paginated = pontos[start:end]
-            
-            response = {
-                'total': total,
-                'page': page,
-                'page_size': PAGE_SIZE,
-                'total_pages': (total + PAGE_SIZE - 1) // PAGE_SIZE,
-                'pontos': pontos_paginated
-            }
+            resposta = app.response_class(partes, mimetype=TIPOS_EXPORTACAO[formato])
+        
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+        resposta.headers['Vary'] = 'Accept-Encoding'
+        return resposta.make_conditional(request)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo CSV não encontrado'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Erro ao processar requisição: {str(e)}'}), 500
+
+
+@app.route('/api/coleta-pontos/lote', methods=['POST'])
+def coleta_pontos_lote():
+    """
+    Endpoint REST POST para muitas consultas de proximidade em uma requisição
+    (ex.: o ponto mais próximo de cada usuário de uma lista).
+
+    Corpo JSON:
+        consultas: Lista de {lat, lon, tipos, n}; tipos é uma lista ou texto separado
+                   por vírgula (vazio aceita qualquer ponto), n tem padrão 5
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        roteamento: Provedores de rotas em ordem de preferência (lista ou texto
+                    separado por vírgula; padrão: ROTEAMENTO_PADRAO)
+
+    Retorna:
+        JSON com "resultados" na ordem das consultas: {"pontos": [...], "total": n}
+        (com distance_km, duration_min e fonte_distancia) ou {"erro": mensagem}
+        para consultas inválidas; "erros" conta as consultas com erro
+
+    Códigos de Status:
+        200: Sucesso (mesmo com erros em consultas individuais)
+        400: Corpo inválido, modo/roteamento inválido ou consultas demais
+        500: Erro interno do servidor
+    """
+    try:
+        corpo = request.get_json(silent=True)
+        if not isinstance(corpo, dict) or not isinstance(corpo.get('consultas'), list):
+            raise ValueError("Corpo deve ser um objeto JSON com a lista consultas")
+        roteamento = corpo.get('roteamento')
+        if isinstance(roteamento, str):
+            roteamento = [nome.strip() for nome in roteamento.split(',')]
+        elif roteamento is not None and not isinstance(roteamento, list):
+            raise ValueError("roteamento deve ser uma lista ou texto separado por vírgula")
+
+        resultados = ler_pontos_proximos_em_lote(corpo['consultas'], corpo.get('modo', MODO_TODOS), roteamento)
+        resultados = [
+            resultado if 'erro' in resultado
+            else {'pontos': list(resultado['pontos'].values()), 'total': len(resultado['pontos'])}
+            for resultado in resultados
+        ]
+        return jsonify({
+            'resultados': resultados,
+            'total': len(resultados),
+            'erros': sum('erro' in resultado for resultado in resultados)
+        }), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo CSV não encontrado'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Erro ao processar requisição: {str(e)}'}), 500
+
+
+@app.route('/api/coleta-pontos.geojson', methods=['GET'])
+def coleta_pontos_geojson():
+    """
+    Endpoint REST GET com os pontos em GeoJSON compacto, para carregamento
+    sob demanda no mapa.
+    
+    Query Parameters:
+        tipos: Lista de tipos de lixo separados por vírgula (opcional)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        bbox: Área visível "min_lon,min_lat,max_lon,max_lat" (opcional)
+        zoom: Nível de zoom do mapa; abaixo de 17 os pontos próximos na tela são
+              agrupados no servidor (opcional; sem zoom, sem agrupamento)
+        precisao: Casas decimais das coordenadas (padrão: 5, ~1 m; de 0 a 8)
+    
+    Retorna:
+        FeatureCollection (application/geo+json); grupos têm as propriedades
+        cluster e quantidade, pontos isolados têm id, nome, tipo_lixo e endereco
+    """
+    try:
+        tipos_param = request.args.get('tipos')
+        bbox_param = request.args.get('bbox')
+        modo = request.args.get('modo', default=MODO_TODOS)
+        zoom = request.args.get('zoom', type=int)
+        precisao = request.args.get('precisao', default=PRECISAO_GEOJSON, type=int)
+        if zoom is not None and not 0 <= zoom <= 22:
+            raise ValueError("Parâmetro zoom deve estar entre 0 e 22")
+        if not 0 <= precisao <= 8:
+            raise ValueError("Parâmetro precisao deve estar entre 0 e 8")
+        tipos_lixo = [t.strip() for t in tipos_param.split(',')] if tipos_param else []
+        
+        caixa = None
+        if bbox_param:
+            min_lon, min_lat, max_lon, max_lat = _ler_numeros(bbox_param, 4, 'bbox')
+            caixa = (min_lat, min_lon, max_lat, max_lon)
         
-        return jsonify(response), 200
+        colecao = pontos_geojson(tipos_lixo, modo, caixa, zoom, precisao)
+        return app.response_class(json.dumps(colecao, ensure_ascii=False, separators=(',', ':')),
+                                  mimetype='application/geo+json'), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except FileNotFoundError:
         return jsonify({'error': 'Arquivo CSV não encontrado'}), 500
     except Exception as e:
         return jsonify({'error': f'Erro ao processar requisição: {str(e)}'}), 500
 
 
+@app.route('/api/estatisticas', methods=['GET'])
+def estatisticas():
+    """
+    Endpoint REST GET com contadores internos do serviço.
+    
+    Retorna:
+        JSON com a seção "prefiltro": consultas top-n, quantas tiveram o top-n final
+        diferente do ranking em linha reta (divergencias/taxa_divergencia) e o total
+        de destinos enviados para roteamento; e a seção "cache_rotas" com acertos
+        (memória/disco), faltas e taxa de acerto do cache de rotas; e a seção
+        "cache_mapas" com acertos, faltas e mapas base em memória; a seção
+        "exportacao" com os corpos de exportação sem filtro já serializados; a
+        seção "cache_respostas" com acertos, faltas e bytes das respostas de
+        /api/coleta-pontos em memória; a seção "coalescencia" com as chamadas de
+        roteamento executadas e as que aguardaram uma chamada idêntica em andamento;
+        a seção "dns_rotas" com consultas DNS e acertos do cache dos clientes de rotas;
+        e a seção "tabela_rotas" com acertos, faltas e origens sem célula válida na
+        tabela de tempos de direção pré-calculada
+    """
+    return jsonify({
+        'prefiltro': estatisticas_prefiltro.resumo(),
+        'cache_rotas': cache_rotas.resumo(),
+        'cache_mapas': cache_mapas.resumo(),
+        'exportacao': corpos_exportacao.resumo(),
+        'cache_respostas': cache_respostas.resumo(),
+        'coalescencia': coalescedor_rotas.resumo(),
+        'dns_rotas': resolvedor_rotas.resumo(),
+        'tabela_rotas': tabela_rotas.resumo()
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas no formato de texto do Prometheus: duração de cada etapa das
+    consultas (pontos_etapa_duracao_segundos), tempo de cada lote enviado à API
+    de rotas, chamadas/erros de roteamento, acertos do cache de rotas, tamanho do
+    conjunto de dados e duração da construção dos índices.
+    """
+    return app.response_class(metricas.expor(), mimetype=None, content_type=TIPO_CONTEUDO)
+
+
+def _popup_ponto(ponto):
+    """Monta o HTML do popup de um ponto (com distância/tempo, se houver)."""
+    lat = ponto['latitude']
+    lon = ponto['longitude']
+    
+    distance_info = ""
+    if ponto.get('distance_km') is not None and ponto.get('duration_min') is not None:
+        distance_info = f"<br><b>Distância:</b> {ponto['distance_km']:.1f} km<br><b>Tempo:</b> {ponto['duration_min']:.0f} min"
+        if ponto.get('fonte_distancia') == 'estimativa':
+            distance_info += " <small>(estimativa)</small>"
+    
+    google_maps_url = f"https://www.google.com/maps?q={lat},{lon}"
+    return f'''
+        <div style="min-width: 200px; font-family: Arial, sans-serif;">
+            <b style="font-size: 14px;">{ponto['nome']}</b><br>
+            <small>{ponto.get('endereco', 'N/A')}</small><br>
+            <b>Tipos:</b> {ponto['tipo_lixo']}<br>
+            {distance_info}
+            <br><a href="{google_maps_url}" target="_blank" style="color: blue; text-decoration: none;">
+            📍 Ver no Google Maps</a>
+        </div>
+    '''
+
+
+@duracao_etapas.cronometrar(etapa="mapa_base")
+def _renderizar_mapa_base(tipos_lixo, modo):
+    """
+    Renderiza o mapa com os controles e o carregador dos pontos do filtro,
+    sem nada que dependa da localização do usuário (o resultado vai para o cache).
+    Os filtros devem vir normalizados (CacheMapas.chave), já que o HTML é
+    servido a todas as requisições da mesma chave.
+    
+    Retorna:
+        MapaRenderizado
+    """
+    # Coordenadas padrão (Brasília)
+    centro_lat, centro_lon = -15.793889, -47.882778
+    
+    # Criar mapa
+    mapa = folium.Map(
+        location=[centro_lat, centro_lon],
+        zoom_start=13,
+        tiles='OpenStreetMap'
+    )
+    
+    # Adicionar controle de localização
+    LocateControl(
+        strings={"title": "Mostrar minha localização", "popup": "Você está aqui"},
+        locateOptions={"enableHighAccuracy": True, "maxZoom": 16}
+    ).add_to(mapa)
+    
+    # HTML para filtro
+    filter_html = '''
+        <div style="position: fixed; top: 10px; left: 50px; z-index:9999; font-size:14px; 
+                    background-color: white; padding: 10px; border-radius: 5px; border: 2px solid rgba(0,0,0,0.2);">
+            <b>🔍 Filtrar por:</b><br>
+            <a href="/mapa" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">✓ Todos</a>
+            <a href="/mapa?tipos=eletroeletronicos" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">💻 Eletrônicos</a>
+            <a href="/mapa?tipos=eletrodomesticos" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">🔌 Eletrodomésticos</a>
+            <a href="/mapa?tipos=pilhas" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">🔋 Pilhas</a>
+            <a href="/mapa?tipos=lampadas" style="text-decoration: none; color: black; display: block;">💡 Lâmpadas</a>
+        </div>
+    '''
+    mapa.get_root().html.add_child(folium.Element(filter_html))
+    
+    # HTML para botão "Sobre"
+    sobre_html = '''
+        <div style="position: fixed; top: 10px; right: 60px; z-index:9999;">
+            <a href="/sobre" style="background-color: white; padding: 8px 12px; border-radius: 5px; 
+               text-decoration: none; border: 2px solid rgba(0,0,0,0.2); color: black; 
+               font-weight: bold; display: block; text-align: center; margin-bottom: 10px;">ℹ️ Sobre</a>
+            <a href="/" style="background-color: white; padding: 8px 12px; border-radius: 5px; 
+               text-decoration: none; border: 2px solid rgba(0,0,0,0.2); color: black; 
+               font-weight: bold; display: block; text-align: center;">🏠 Home</a>
+        </div>
+    '''
+    mapa.get_root().html.add_child(folium.Element(sobre_html))
+    
+    # Apenas a contagem: os pontos são carregados pelo navegador, por área visível
+    total = consultar_pontos(tipos_lixo, modo, limite=0)['total']
+    
+    # Adicionar mensagem se nenhum ponto foi encontrado com os filtros
+    if tipos_lixo and total == 0:
+        tipos_texto = html_lib.escape(', '.join(tipos_lixo))
+        criterio = '<b>todos</b> os tipos selecionados simultaneamente'
+        if modo == MODO_QUALQUER:
+            criterio = 'pelo menos <b>um</b> dos tipos selecionados'
+        aviso_html = f'''
+            <div style="position: fixed; top: 50%; left: 50%; transform: translate(-50%, -50%); 
+                        z-index: 9999; background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%);
+                        color: white; padding: 30px 40px; border-radius: 12px; 
+                        box-shadow: 0 10px 40px rgba(0,0,0,0.3); text-align: center;
+                        font-family: Arial, sans-serif; max-width: 500px;">
+                <div style="font-size: 48px; margin-bottom: 15px;">⚠️</div>
+                <h2 style="margin: 0 0 15px 0; font-size: 22px; font-weight: bold;">
+                    Nenhum ponto encontrado
+                </h2>
+                <p style="margin: 0 0 10px 0; font-size: 16px; line-height: 1.5;">
+                    Não há pontos de coleta que aceitem {criterio}:
+                </p>
+                <p style="margin: 0; font-size: 15px; background: rgba(255,255,255,0.2); 
+                          padding: 10px; border-radius: 6px; font-weight: 600;">
+                    {tipos_texto}
+                </p>
+                <p style="margin: 15px 0 0 0; font-size: 14px; opacity: 0.9;">
+                    💡 Tente selecionar menos tipos ou busque por tipos individualmente.
+                </p>
+            </div>
+        '''
+        mapa.get_root().html.add_child(folium.Element(aviso_html))
+    
+    # Marcadores: carregados do feed GeoJSON para a área visível (agrupados por zoom)
+    filtros = {'tipos': ','.join(tipos_lixo), 'modo': modo} if tipos_lixo else {}
+    filtros_js = json.dumps(filtros).replace('</', '<\\/')
+    mapa.get_root().header.add_child(folium.JavascriptLink('/static/mapa_pontos.js'))
+    # O script do Folium cria o mapa depois deste trecho: esperar a página carregar
+    mapa.get_root().script.add_child(folium.Element(
+        f"window.addEventListener('load', function () {{ carregarPontosColeta({mapa.get_name()}, {filtros_js}); }});"
+    ))
+    
+    return MapaRenderizado(mapa.get_root().render(), mapa.get_name())
+
+
+def _sobreposicao_localizacao(nome_mapa, user_lat, user_lon, pontos):
+    """
+    Monta o script que adiciona ao mapa base o marcador do usuário e os
+    pontos mais próximos (em verde, com distância e tempo no popup).
+    """
+    marcadores = [{
+        'lat': user_lat, 'lon': user_lon, 'popup': '📍 Sua localização',
+        'cor': 'blue', 'icone': 'user', 'prefixo': 'fa'
+    }]
+    for ponto in pontos:
+        marcadores.append({
+            'lat': ponto['latitude'], 'lon': ponto['longitude'], 'popup': _popup_ponto(ponto),
+            'cor': 'green', 'icone': 'info-sign', 'prefixo': 'glyphicon'
+        })
+    # "</" escapado para o conteúdo dos popups não fechar a tag <script>
+    dados = json.dumps(marcadores, ensure_ascii=False).replace('</', '<\\/')
+    return f'''<script>
+    {dados}.forEach(function (m) {{
+        L.marker([m.lat, m.lon], {{
+            icon: L.AwesomeMarkers.icon({{icon: m.icone, prefix: m.prefixo, markerColor: m.cor, iconColor: "white"}}),
+            zIndexOffset: 1000
+        }}).bindPopup(m.popup, {{maxWidth: 300}}).addTo({nome_mapa});
+    }});
+</script>
+'''
+
+
 @app.route('/mapa')
 def mapa():
     """
     Rota para exibir mapa interativo com filtros.
     
+    O mapa base (controles e filtro) é renderizado uma vez por
+    combinação de tipos/modo e versão dos dados, e servido do cache com ETag
+    (If-None-Match responde 304); os pontos são carregados pelo navegador a partir
+    de /api/coleta-pontos.geojson, só para a área visível. Com lat/lon, o marcador do usuário e os n
+    pontos mais próximos entram como uma pequena sobreposição sobre o mapa base.
+    
     Query Parameters:
         tipos: Tipos de lixo separados por vírgula (opcional)
         lat: Latitude do usuário (opcional)
         lon: Longitude do usuário (opcional)
+        n: Número de pontos mais próximos destacados (padrão: 5, usado com tipos e lat/lon)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        roteamento: Provedores de rotas em ordem de preferência (opcional)
     """
     try:
-        # Coordenadas padrão (Brasília)
-        centro_lat, centro_lon = -15.793889, -47.882778
-        
-        # Criar mapa
-        mapa = folium.Map(
-            location=[centro_lat, centro_lon],
-            zoom_start=13,
-            tiles='OpenStreetMap'
-        )
-        
-        # Adicionar controle de localização
-        LocateControl(
-            strings={"title": "Mostrar minha localização", "popup": "Você está aqui"},
-            locateOptions={"enableHighAccuracy": True, "maxZoom": 16}
-        ).add_to(mapa)
-        
-        # HTML para filtro
-        filter_html = '''
-            <div style="position: fixed; top: 10px; left: 50px; z-index:9999; font-size:14px; 
-                        background-color: white; padding: 10px; border-radius: 5px; border: 2px solid rgba(0,0,0,0.2);">
-                <b>🔍 Filtrar por:</b><br>
-                <a href="/mapa" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">✓ Todos</a>
-                <a href="/mapa?tipos=eletroeletronicos" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">💻 Eletrônicos</a>
-                <a href="/mapa?tipos=eletrodomesticos" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">🔌 Eletrodomésticos</a>
-                <a href="/mapa?tipos=pilhas" style="text-decoration: none; color: black; display: block; margin-bottom: 5px;">🔋 Pilhas</a>
-                <a href="/mapa?tipos=lampadas" style="text-decoration: none; color: black; display: block;">💡 Lâmpadas</a>
-            </div>
-        '''
-        mapa.get_root().html.add_child(folium.Element(filter_html))
-        
-        # HTML para botão "Sobre"
-        sobre_html = '''
-            <div style="position: fixed; top: 10px; right: 60px; z-index:9999;">
-                <a href="/sobre" style="background-color: white; padding: 8px 12px; border-radius: 5px; 
-                   text-decoration: none; border: 2px solid rgba(0,0,0,0.2); color: black; 
-                   font-weight: bold; display: block; text-align: center; margin-bottom: 10px;">ℹ️ Sobre</a>
-                <a href="/" style="background-color: white; padding: 8px 12px; border-radius: 5px; 
-                   text-decoration: none; border: 2px solid rgba(0,0,0,0.2); color: black; 
-                   font-weight: bold; display: block; text-align: center;">🏠 Home</a>
-            </div>
-        '''
-        mapa.get_root().html.add_child(folium.Element(sobre_html))
-        
         # Obter parâmetros
         tipos_param = request.args.get('tipos')
         user_lat = request.args.get('lat', type=float)
         user_lon = request.args.get('lon', type=float)
         n = request.args.get('n', default=5, type=int)
+        modo = request.args.get('modo', default=MODO_TODOS)
+        if modo not in (MODO_TODOS, MODO_QUALQUER):
+            raise ValueError(f"Modo de filtro inválido: {modo}")
+        tipos_lixo = [t.strip() for t in tipos_param.split(',')] if tipos_param else []
         
-        # Obter pontos - reutilizando funções de coleta_service.py
-        if tipos_param:
-            tipos_lixo = [t.strip() for t in tipos_param.split(',')]
-            # Se lat/lon não foram obtidos, não enviar para evitar erro
-            if user_lat and user_lon:
-                pontos_dict = ler_pontos_por_tipo_lixo(tipos_lixo, user_lat, user_lon, n)
-            else:
-                # Se sem localização, retornar todos os pontos do tipo sem ordenar por proximidade
-                pontos_dict = ler_pontos_por_tipo_lixo(tipos_lixo)
-        else:
-            # Se não houver filtro, listar todos
-            pontos_dict = ler_todos_pontos()
-        
-        pontos = list(pontos_dict.values()) if pontos_dict else []
-        
-        # Adicionar mensagem se nenhum ponto foi encontrado com os filtros
-        if tipos_param and len(pontos) == 0:
-            tipos_texto = ', '.join(tipos_lixo)
-            aviso_html = f'''
-                <div style="position: fixed; top: 50%; left: 50%; transform: translate(-50%, -50%); 
-                            z-index: 9999; background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%);
-                            color: white; padding: 30px 40px; border-radius: 12px; 
-                            box-shadow: 0 10px 40px rgba(0,0,0,0.3); text-align: center;
-                            font-family: Arial, sans-serif; max-width: 500px;">
-                    <div style="font-size: 48px; margin-bottom: 15px;">⚠️</div>
-                    <h2 style="margin: 0 0 15px 0; font-size: 22px; font-weight: bold;">
-                        Nenhum ponto encontrado
-                    </h2>
-                    <p style="margin: 0 0 10px 0; font-size: 16px; line-height: 1.5;">
-                        Não há pontos de coleta que aceitem <b>todos</b> os tipos selecionados simultaneamente:
-                    </p>
-                    <p style="margin: 0; font-size: 15px; background: rgba(255,255,255,0.2); 
-                              padding: 10px; border-radius: 6px; font-weight: 600;">
-                        {tipos_texto}
-                    </p>
-                    <p style="margin: 15px 0 0 0; font-size: 14px; opacity: 0.9;">
-                        💡 Tente selecionar menos tipos ou busque por tipos individualmente.
-                    </p>
-                </div>
-            '''
-            mapa.get_root().html.add_child(folium.Element(aviso_html))
-        
-        # Adicionar marcadores ao mapa
-        for ponto in pontos:
-            lat = ponto['latitude']
-            lon = ponto['longitude']
-            nome = ponto['nome']
-            endereco = ponto.get('endereco', 'N/A')
-            tipo_lixo = ponto['tipo_lixo']
-            
-            # Construir popup com informações
-            distance_info = ""
-            if 'distance_km' in ponto and ponto['distance_km'] is not None and 'duration_min' in ponto and ponto['duration_min'] is not None:
-                distance_info = f"<br><b>Distância:</b> {ponto['distance_km']:.1f} km<br><b>Tempo:</b> {ponto['duration_min']:.0f} min"
-            
-            google_maps_url = f"https://www.google.com/maps?q={lat},{lon}"
-            popup_html = f'''
-                <div style="min-width: 200px; font-family: Arial, sans-serif;">
-                    <b style="font-size: 14px;">{nome}</b><br>
-                    <small>{endereco}</small><br>
-                    <b>Tipos:</b> {tipo_lixo}<br>
-                    {distance_info}
-                    <br><a href="{google_maps_url}" target="_blank" style="color: blue; text-decoration: none;">
-                    📍 Ver no Google Maps</a>
-                </div>
-            '''
-            
-            folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_html, max_width=300),
-                icon=folium.Icon(color='red', icon='info-sign')
-            ).add_to(mapa)
+        chave = CacheMapas.chave(obter_repositorio().dados().assinatura, tipos_lixo, modo)
+        # O mapa base vale para todas as requisições da chave: renderizar a partir dos filtros normalizados
+        _, tipos_chave, modo_chave = chave
+        base = cache_mapas.obter(chave, lambda: _renderizar_mapa_base(list(tipos_chave), modo_chave or MODO_TODOS))
+        html, etag = base.html, base.etag
         
-        # Se usuário forneceu localização, adicionar marcador azul
+        # Se usuário forneceu localização, sobrepor marcador azul e pontos mais próximos
         if user_lat and user_lon:
-            folium.Marker(
-                location=[user_lat, user_lon],
-                popup='📍 Sua localização',
-                icon=folium.Icon(color='blue', icon='user', prefix='fa')
-            ).add_to(mapa)
+            proximos = []
+            if tipos_lixo:
+                proximos_dict = ler_pontos_por_tipo_lixo(tipos_lixo, user_lat, user_lon, n, modo=modo,
+                                                         roteamento=_ler_roteamento())
+                proximos = list(proximos_dict.values())
+            with duracao_etapas.cronometrar(etapa="mapa_sobreposicao"):
+                sobreposicao = _sobreposicao_localizacao(base.nome_mapa, user_lat, user_lon, proximos)
+            antes, fim, depois = html.rpartition('</html>')
+            html = antes + sobreposicao + fim + depois
+            etag = f"{etag}-{hashlib.sha1(sobreposicao.encode('utf-8')).hexdigest()[:12]}"
         
-        return mapa.get_root().render()
+        resposta = app.make_response(html)
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta.make_conditional(request)
         
+    except ValueError as e:
+        return f"<h1>Parâmetro inválido</h1><p>{str(e)}</p>", 400
     except FileNotFoundError as e:
         return f"<h1>Erro</h1><p>Arquivo não encontrado: {str(e)}</p>", 500
     except Exception as e:
@@ -259,5 +662,15 @@ def sobre():
     return render_template('sobre.html')
 
 
+def criar_app():
+    """
+    Fábrica para servidores WSGI (ex.: gunicorn 'app:criar_app()'): configura
+    o registro (registro.py) e retorna o app. Importar este módulo não mexe
+    na configuração de logging de quem importa.
+    """
+    configurar_registro()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    criar_app().run(debug=True, host='0.0.0.0', port=5000)
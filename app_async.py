@@ -0,0 +1,112 @@
+"""
+Servidor ASGI da aplicação, com caminho assíncrono para consultas por proximidade.
+
+Em app.py (WSGI), uma consulta com lat/lon prende a thread do worker enquanto
+os provedores de rotas respondem; poucas respostas lentas da Routes API
+esgotam o pool. Aqui, /api/coleta-pontos com tipos, lat e lon é atendido por
+uma corrotina que aguarda o roteamento (ClienteRotasAsync), de modo que um
+único worker mantém muitas consultas em andamento. As demais rotas, que só
+consultam dados em memória, continuam no app Flask (via asgiref).
+
+Uso:
+    uvicorn app_async:criar_aplicacao --factory --host 0.0.0.0 --port 5000
+
+(criar_aplicacao configura o registro; `app_async:aplicacao` serve a mesma
+aplicação sem mexer no logging, ex.: em testes ou embutida em outro programa.)
+"""
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags, quote_etag
+
+from app import app, cache_respostas, ler_consulta_coleta, corpo_coleta, pagina_proximidade
+from coleta_service import ler_pontos_por_tipo_lixo_async, fechar_clientes_rotas_async
+from registro import configurar_registro
+
+aplicacao_wsgi = WsgiToAsgi(app)
+
+
+async def _enviar(send, status, cabecalhos, corpo=b''):
+    """Envia uma resposta completa; cabecalhos é uma lista de (nome, valor)."""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(nome.encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos]
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+async def _enviar_json(send, status, corpo, cabecalhos=()):
+    """Envia uma resposta completa com corpo JSON (bytes)."""
+    await _enviar(send, status, [('Content-Type', 'application/json'), ('Content-Length', str(len(corpo)))]
+                  + list(cabecalhos), corpo)
+
+
+async def _coleta_pontos_async(consulta, scope, send):
+    """Atende /api/coleta-pontos com rotas, aguardando os provedores sem bloquear o worker."""
+    async def gerar():
+        pontos_dict = await ler_pontos_por_tipo_lixo_async(
+            consulta['tipos_lixo'], consulta['lat'], consulta['lon'], consulta['n'],
+            modo=consulta['modo'], roteamento=consulta['roteamento']
+        )
+        return corpo_coleta(consulta, *pagina_proximidade(consulta, pontos_dict))
+
+    try:
+        entrada = await cache_respostas.obter_async(consulta['chave'], gerar, ttl=consulta['ttl'])
+    except ValueError as e:
+        await _enviar_json(send, 400, app.json.dumps({'error': str(e)}).encode('utf-8'))
+        return
+    except FileNotFoundError:
+        await _enviar_json(send, 500, app.json.dumps({'error': 'Arquivo CSV não encontrado'}).encode('utf-8'))
+        return
+    except Exception as e:
+        erro = {'error': f'Erro ao processar requisição: {str(e)}'}
+        await _enviar_json(send, 500, app.json.dumps(erro).encode('utf-8'))
+        return
+
+    cabecalhos = [('ETag', quote_etag(entrada.etag)), ('Cache-Control', consulta['cache_control'])]
+    if_none_match = dict(scope['headers']).get(b'if-none-match')
+    if if_none_match and parse_etags(if_none_match.decode('latin-1')).contains_weak(entrada.etag):
+        # Como o make_conditional do Flask: 304 sem os cabeçalhos de entidade
+        await _enviar(send, 304, cabecalhos)
+        return
+    await _enviar_json(send, 200, entrada.corpo, cabecalhos)
+
+
+async def _ciclo_de_vida(receive, send):
+    """Eventos lifespan: fecha os clientes de rotas assíncronos no encerramento."""
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await fechar_clientes_rotas_async()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def aplicacao(scope, receive, send):
+    """Aplicação ASGI: proximidade com rotas é assíncrona; o resto vai para o app Flask."""
+    if scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/api/coleta-pontos':
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        try:
+            consulta = ler_consulta_coleta(args)
+        except Exception:
+            # Parâmetros inválidos: o app Flask monta a mesma resposta de erro
+            consulta = None
+        if consulta is not None and consulta['tipo'] == 'rotas':
+            await _coleta_pontos_async(consulta, scope, send)
+            return
+
+    await aplicacao_wsgi(scope, receive, send)
+
+
+def criar_aplicacao():
+    """Fábrica para o uvicorn (--factory): configura o registro e retorna a aplicação ASGI."""
+    configurar_registro()
+    return aplicacao
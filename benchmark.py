@@ -0,0 +1,316 @@
+"""
+Benchmarks do serviço com conjuntos de pontos sintéticos.
+
+Gera CSVs sintéticos (por padrão com 1k, 10k, 100k e 1M pontos, com a mesma
+mistura de tipo_lixo do CSV real e pontos concentrados em polos pelo DF) e mede:
+carga do CSV e do snapshot, ler_todos_pontos, ler_pontos_por_tipo_lixo (só
+filtro e com rotas), pontos_mais_proximos, /api/coleta-pontos e /mapa de ponta
+a ponta (cliente de teste do Flask). A Routes API é substituída por um
+ServidorRotasFalso com latência configurável, e cada medição de rotas usa uma
+origem diferente com os caches vazios.
+
+O resultado sai em JSON (um resumo de tempos por tamanho e caso), para ser
+guardado e comparado entre commits:
+
+    python benchmark.py --saida base.json
+    python benchmark.py --comparar base.json --tolerancia 0.2
+
+Com --comparar, casos cuja mediana piorou mais que a tolerância são listados
+no stderr e o processo termina com código 1.
+
+Uso:
+    python benchmark.py [--tamanhos 1000,10000,100000,1000000] [--repeticoes 5]
+                        [--latencia 0.05] [--dados DIRETORIO] [--casos a,b,...]
+                        [--saida ARQUIVO] [--comparar ARQUIVO] [--tolerancia 0.2]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import app
+import coleta_service
+from cache_rotas import CacheRotas
+from coleta_service import ler_pontos_por_tipo_lixo, ler_todos_pontos, pontos_mais_proximos
+from registro import configurar_registro
+from repositorio_pontos import CSV_PADRAO, MODO_QUALQUER, RepositorioPontos
+from servidor_rotas_falso import ServidorRotasFalso
+from snapshot_pontos import caminho_snapshot, compilar_snapshot
+
+TAMANHOS_PADRAO = (1000, 10000, 100000, 1000000)
+
+# Mistura de tipo_lixo do CSV real (fração dos pontos com cada combinação)
+MISTURA_TIPOS = (
+    ("pilhas", 0.63),
+    ("lampadas", 0.11),
+    ("eletroeletronicos", 0.105),
+    ("eletroeletronicos\\,pilhas", 0.05),
+    ("eletroeletronicos\\,eletrodomesticos\\,pilhas", 0.045),
+    ("lampadas\\,pilhas", 0.045),
+    ("eletroeletronicos\\,eletrodomesticos", 0.015),
+)
+
+# Área do DF e dispersão (graus) dos pontos em torno de cada polo
+LAT_MIN, LAT_MAX = -16.05, -15.50
+LON_MIN, LON_MAX = -48.30, -47.30
+POLOS = 30
+DISPERSAO = 0.03
+
+
+def gerar_csv_sintetico(caminho, linhas, semente=42):
+    """
+    Grava um CSV no formato de pontos-de-coleta.csv com `linhas` pontos sintéticos.
+
+    Args:
+        caminho: Arquivo de destino
+        linhas: Quantidade de pontos
+        semente: Semente do gerador (o mesmo valor gera o mesmo arquivo)
+    """
+    gerador = random.Random(semente)
+    polos = [(gerador.uniform(LAT_MIN, LAT_MAX), gerador.uniform(LON_MIN, LON_MAX)) for _ in range(POLOS)]
+    tipos = [tipo for tipo, _ in MISTURA_TIPOS]
+    pesos = [peso for _, peso in MISTURA_TIPOS]
+
+    def pontos():
+        for i, tipo_lixo in enumerate(gerador.choices(tipos, pesos, k=linhas)):
+            lat, lon = gerador.choice(polos)
+            yield (f"{i:07d}", f"Ponto sintético {i}", tipo_lixo,
+                   round(gerador.gauss(lat, DISPERSAO), 6), round(gerador.gauss(lon, DISPERSAO), 6),
+                   f"Quadra {i % 999 + 1} Lote {i % 97 + 1}")
+
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(["id", "nome", "tipo_lixo", "latitude", "longitude", "endereco"])
+        escritor.writerows(pontos())
+
+
+def resumir_tempos(tempos):
+    """Resumo (ms) de uma lista de durações em segundos."""
+    ordenados = sorted(tempos)
+    return {
+        "repeticoes": len(tempos),
+        "min_ms": round(ordenados[0] * 1000, 3),
+        "mediana_ms": round(statistics.median(ordenados) * 1000, 3),
+        "p95_ms": round(ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))] * 1000, 3),
+        "media_ms": round(statistics.fmean(ordenados) * 1000, 3),
+    }
+
+
+def medir(funcao, repeticoes, preparar=None, aquecer=True):
+    """
+    Mede funcao() `repeticoes` vezes.
+
+    Args:
+        funcao: Função sem argumentos medida
+        repeticoes: Quantidade de medições
+        preparar: Função executada antes de cada medição, fora do tempo medido
+        aquecer: Se executa funcao() uma vez antes, sem medir
+
+    Retorna:
+        Dicionário de resumir_tempos
+    """
+    if aquecer:
+        if preparar:
+            preparar()
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resumir_tempos(tempos)
+
+
+def _origem(gerador):
+    return round(gerador.uniform(LAT_MIN, LAT_MAX), 5), round(gerador.uniform(LON_MIN, LON_MAX), 5)
+
+
+def _get(caminho):
+    resposta = app.app.test_client().get(caminho)
+    if resposta.status_code != 200:
+        raise RuntimeError(f"{caminho} respondeu {resposta.status_code}: {resposta.get_data(as_text=True)[:200]}")
+    return resposta
+
+
+def casos_de_medicao(gerador):
+    """
+    Casos medidos em cada tamanho, na ordem de execução.
+
+    Retorna:
+        Dicionário {nome: (funcao, preparar, aquecer)}; as funções leem o CSV
+        padrão do diretório atual
+    """
+    consulta = {}
+
+    def nova_origem():
+        consulta["lat"], consulta["lon"] = _origem(gerador)
+        coleta_service.cache_rotas = CacheRotas()
+        app.cache_respostas.limpar()
+
+    def preparar_ranking():
+        if "ranking" not in consulta:
+            pontos = ler_pontos_por_tipo_lixo(["pilhas"])
+            for ponto in pontos.values():
+                ponto["duration_min"] = gerador.uniform(1, 60)
+            consulta["ranking"] = pontos
+
+    def sem_snapshot():
+        RepositorioPontos(CSV_PADRAO, usar_snapshot=False).dados()
+
+    def com_snapshot():
+        RepositorioPontos(CSV_PADRAO).dados()
+
+    return {
+        "carga_csv": (sem_snapshot, None, False),
+        "carga_snapshot": (com_snapshot, None, False),
+        "ler_todos_pontos": (ler_todos_pontos, None, True),
+        "filtro_tipos": (lambda: ler_pontos_por_tipo_lixo(["pilhas"]), None, True),
+        "filtro_tipos_qualquer": (
+            lambda: ler_pontos_por_tipo_lixo(["lampadas", "eletroeletronicos"], modo=MODO_QUALQUER), None, True
+        ),
+        "proximos_com_rotas": (
+            lambda: ler_pontos_por_tipo_lixo(["pilhas"], consulta["lat"], consulta["lon"], 5,
+                                             roteamento=["google"]),
+            nova_origem, True
+        ),
+        "pontos_mais_proximos": (lambda: pontos_mais_proximos(consulta["ranking"], 5), preparar_ranking, True),
+        "api_lista": (lambda: _get("/api/coleta-pontos?tipos=pilhas&page=2"), app.cache_respostas.limpar, True),
+        "api_rotas": (
+            lambda: _get(f"/api/coleta-pontos?tipos=pilhas&lat={consulta['lat']}&lon={consulta['lon']}&n=5"
+                         "&roteamento=google"),
+            nova_origem, True
+        ),
+        "mapa": (lambda: _get("/mapa?tipos=pilhas"), app.cache_mapas.limpar, True),
+        "mapa_proximos": (
+            lambda: _get(f"/mapa?tipos=pilhas&lat={consulta['lat']}&lon={consulta['lon']}&n=5&roteamento=google"),
+            nova_origem, True
+        ),
+    }
+
+
+def executar_tamanho(diretorio, linhas, repeticoes, casos=None, semente=42):
+    """
+    Gera (ou reaproveita) o CSV de `linhas` pontos e mede os casos.
+
+    Args:
+        diretorio: Diretório dos dados sintéticos (um subdiretório por tamanho)
+        linhas: Quantidade de pontos
+        repeticoes: Medições por caso
+        casos: Nomes dos casos a medir (padrão: todos)
+        semente: Semente dos dados e das origens
+
+    Retorna:
+        Dicionário {caso: resumo de tempos}
+    """
+    pasta = os.path.join(diretorio, str(linhas))
+    os.makedirs(pasta, exist_ok=True)
+    csv_file = os.path.join(pasta, CSV_PADRAO)
+    if not os.path.exists(csv_file):
+        gerar_csv_sintetico(csv_file, linhas, semente)
+    if not os.path.exists(caminho_snapshot(csv_file)):
+        compilar_snapshot(csv_file)
+
+    anterior = os.getcwd()
+    os.chdir(pasta)
+    try:
+        resultados = {}
+        for nome, (funcao, preparar, aquecer) in casos_de_medicao(random.Random(semente)).items():
+            if casos and nome not in casos:
+                continue
+            resultados[nome] = medir(funcao, repeticoes, preparar, aquecer)
+            print(f"  {linhas:>8} {nome:<24} mediana {resultados[nome]['mediana_ms']:>10.3f} ms", file=sys.stderr)
+        return resultados
+    finally:
+        os.chdir(anterior)
+
+
+def comparar(atual, base, tolerancia):
+    """
+    Compara as medianas de dois resultados.
+
+    Retorna:
+        Lista de (tamanho, caso, mediana_base_ms, mediana_atual_ms) dos casos que
+        pioraram mais que `tolerancia` (fração)
+    """
+    regressoes = []
+    for tamanho, casos in atual["resultados"].items():
+        for caso, resumo in casos.items():
+            anterior = base.get("resultados", {}).get(tamanho, {}).get(caso)
+            if anterior and resumo["mediana_ms"] > anterior["mediana_ms"] * (1 + tolerancia):
+                regressoes.append((tamanho, caso, anterior["mediana_ms"], resumo["mediana_ms"]))
+    return regressoes
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks com conjuntos de pontos sintéticos")
+    parser.add_argument("--tamanhos", default=",".join(map(str, TAMANHOS_PADRAO)),
+                        help="quantidades de pontos separadas por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=5, help="medições por caso")
+    parser.add_argument("--latencia", type=float, default=0.05, help="latência do servidor de rotas falso (s)")
+    parser.add_argument("--dados", default=os.path.join(tempfile.gettempdir(), "pontos-benchmark"),
+                        help="diretório dos CSVs sintéticos (reaproveitados entre execuções)")
+    parser.add_argument("--casos", help="casos a medir, separados por vírgula (padrão: todos)")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--comparar", help="resultado JSON anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="piora máxima da mediana aceita com --comparar (fração)")
+    args = parser.parse_args()
+    # Os registros por requisição não se misturam ao resultado, salvo com LOG_NIVEL
+    configurar_registro(nivel=os.getenv("LOG_NIVEL", "WARNING"))
+
+    tamanhos = [int(t) for t in args.tamanhos.split(",")]
+    casos = set(args.casos.split(",")) if args.casos else None
+    resultado = {
+        "metadados": {
+            "commit": _commit(),
+            "data": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "repeticoes": args.repeticoes,
+            "latencia_rotas_s": args.latencia,
+        },
+        "resultados": {},
+    }
+
+    with ServidorRotasFalso(latencia=args.latencia) as upstream:
+        coleta_service.GOOGLE_API_KEY = "chave-benchmark"
+        coleta_service.GOOGLE_ROUTES_URL = upstream.url
+        for linhas in tamanhos:
+            resultado["resultados"][str(linhas)] = executar_tamanho(args.dados, linhas, args.repeticoes, casos)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        for tamanho, caso, antes, depois in regressoes:
+            print(f"Regressão: {caso} com {tamanho} pontos: {antes:.3f} ms -> {depois:.3f} ms", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import hashlib
+from lru import LRU
+
+
+class MapaRenderizado:
+    """
+    HTML de um mapa base já renderizado.
+
+    Atributos:
+        html: Documento completo gerado pelo Folium
+        etag: Hash do conteúdo, usado em ETag/If-None-Match
+        nome_mapa: Nome da variável JavaScript do mapa Leaflet (para sobreposições)
+    """
+
+    __slots__ = ("html", "etag", "nome_mapa")
+
+    def __init__(self, html, nome_mapa):
+        self.html = html
+        self.etag = hashlib.sha1(html.encode("utf-8")).hexdigest()[:20]
+        self.nome_mapa = nome_mapa
+
+
+class CacheMapas:
+    """
+    LRU de mapas base renderizados, um por combinação normalizada de filtros.
+
+    A chave inclui a assinatura dos dados de pontos: quando o CSV é recarregado
+    as entradas antigas deixam de ser encontradas e saem do LRU naturalmente.
+    Duas requisições simultâneas para a mesma chave podem renderizar o mapa
+    em paralelo; a última gravação vale (o resultado é o mesmo).
+
+    Args:
+        capacidade: Máximo de mapas mantidos em memória
+    """
+
+    def __init__(self, capacidade=32):
+        self.capacidade = capacidade
+        self._mapas = LRU(capacidade)
+
+    @staticmethod
+    def chave(assinatura, tipos_lixo, modo):
+        """
+        Normaliza os filtros: tipos sem espaços, minúsculos, sem repetição e
+        ordenados; com até um tipo, "todos" e "qualquer" são equivalentes.
+        """
+        tipos = tuple(sorted({t.strip().lower() for t in tipos_lixo or [] if t.strip()}))
+        if len(tipos) <= 1:
+            modo = None
+        return (assinatura, tipos, modo)
+
+    def obter(self, chave, gerar):
+        """
+        Retorna o mapa da chave, renderizando-o com gerar() se não estiver no cache.
+
+        Args:
+            chave: Chave montada por chave()
+            gerar: Função sem argumentos que retorna um MapaRenderizado
+
+        Retorna:
+            MapaRenderizado
+        """
+        mapa = self._mapas.obter(chave)
+        if mapa is None:
+            mapa = self._mapas.gravar(chave, gerar())
+        return mapa
+
+    def limpar(self):
+        """Remove todos os mapas do cache."""
+        self._mapas.limpar()
+
+    def resumo(self):
+        """Retorna contadores de acertos/faltas e o tamanho atual."""
+        resumo = self._mapas.resumo()
+        return {
+            'acertos': resumo['acertos'],
+            'faltas': resumo['faltas'],
+            'mapas': resumo['entradas']
+        }
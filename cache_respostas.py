@@ -0,0 +1,92 @@
+import hashlib
+import time
+from lru import LRU
+
+
+class RespostaSerializada:
+    """
+    Corpo JSON de uma resposta já serializado.
+
+    Atributos:
+        corpo: Bytes prontos para enviar
+        etag: ETag forte: assinatura dos dados + hash do corpo
+        expira_em: Instante (time.monotonic) em que a entrada expira, ou None
+    """
+
+    __slots__ = ("corpo", "etag", "expira_em")
+
+    def __init__(self, corpo, assinatura, ttl=None):
+        self.corpo = corpo
+        self.etag = f"{assinatura}-{hashlib.sha1(corpo).hexdigest()[:20]}"
+        self.expira_em = time.monotonic() + ttl if ttl is not None else None
+
+    def expirada(self, agora):
+        return self.expira_em is not None and agora >= self.expira_em
+
+
+class CacheRespostas:
+    """
+    LRU de respostas serializadas de /api/coleta-pontos, uma por consulta normalizada.
+
+    A chave começa pela assinatura dos dados: quando o CSV é recarregado as
+    entradas antigas deixam de ser encontradas e saem do LRU naturalmente.
+    Entradas que dependem de provedores de rotas recebem um TTL, porque a
+    mesma consulta pode ter resultados melhores quando o provedor volta.
+
+    Args:
+        capacidade: Máximo de respostas mantidas em memória
+    """
+
+    def __init__(self, capacidade=256):
+        self.capacidade = capacidade
+        self._respostas = LRU(capacidade)
+
+    def obter(self, chave, gerar, ttl=None):
+        """
+        Retorna a resposta da chave, serializando-a com gerar() se não estiver no cache.
+
+        Args:
+            chave: Tupla hashable cujo primeiro elemento é a assinatura dos dados
+            gerar: Função sem argumentos que retorna o corpo (bytes)
+            ttl: Segundos até a entrada expirar (None: vale até sair do LRU)
+
+        Retorna:
+            RespostaSerializada
+        """
+        resposta = self._buscar(chave)
+        if resposta is not None:
+            return resposta
+        return self._gravar(chave, RespostaSerializada(gerar(), chave[0], ttl))
+
+    async def obter_async(self, chave, gerar, ttl=None):
+        """
+        Como obter(), para o servidor ASGI: gerar é uma função assíncrona.
+
+        Retorna:
+            RespostaSerializada
+        """
+        resposta = self._buscar(chave)
+        if resposta is not None:
+            return resposta
+        return self._gravar(chave, RespostaSerializada(await gerar(), chave[0], ttl))
+
+    def _buscar(self, chave):
+        agora = time.monotonic()
+        return self._respostas.obter(chave, lambda resposta: not resposta.expirada(agora))
+
+    def _gravar(self, chave, resposta):
+        return self._respostas.gravar(chave, resposta)
+
+    def limpar(self):
+        """Remove todas as respostas do cache."""
+        self._respostas.limpar()
+
+    def resumo(self):
+        """Retorna contadores de acertos/faltas, respostas e bytes em memória."""
+        resumo = self._respostas.resumo()
+        return {
+            'acertos': resumo['acertos'],
+            'faltas': resumo['faltas'],
+            'respostas': resumo['entradas'],
+            'bytes': sum(len(r.corpo) for r in self._respostas.valores())
+        }
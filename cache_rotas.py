@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import threading
+import time
+from lru import LRU
+
+# Intervalo mínimo (segundos) entre remoções das linhas vencidas do SQLite
+INTERVALO_LIMPEZA = 3600
+
+
+class CacheRotas:
+    """
+    Cache de resultados de roteamento (distance_km, duration_min).
+
+    A chave é (origem quantizada, id e coordenadas do destino, modo de viagem):
+    a origem é arredondada para `precisao` casas decimais (3 casas ~ 110 m), de
+    modo que usuários do mesmo bairro compartilham resultados; um ponto que muda
+    de lugar no CSV deixa de acertar as entradas antigas. Há duas camadas:
+    um LRU em memória e, opcionalmente, um arquivo SQLite que sobrevive a
+    reinícios do processo. Entradas expiram após `ttl` segundos; as linhas
+    vencidas do SQLite são removidas ao abrir o arquivo e, depois, a cada
+    INTERVALO_LIMPEZA segundos junto com uma gravação. O disco tem um lock
+    próprio: um commit não segura as consultas que a memória responde.
+
+    Args:
+        ttl: Tempo de vida das entradas, em segundos
+        capacidade: Máximo de entradas no LRU em memória
+        caminho_sqlite: Arquivo SQLite da camada em disco (None desativa)
+        precisao: Casas decimais usadas para quantizar a origem
+    """
+
+    def __init__(self, ttl=86400, capacidade=10000, caminho_sqlite=None, precisao=3):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self.precisao = precisao
+        self.caminho_sqlite = caminho_sqlite
+        self.acertos_disco = 0
+        self.faltas = 0
+        self._memoria = LRU(capacidade)
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()
+        self._conexao = None
+        self._ultima_limpeza = 0.0
+        if caminho_sqlite:
+            self._conexao = sqlite3.connect(caminho_sqlite, check_same_thread=False)
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS rotas ("
+                " chave TEXT PRIMARY KEY, distance_km REAL, duration_min REAL, expira REAL)"
+            )
+            with self._lock_disco:
+                self._remover_vencidas(time.time())
+                self._conexao.commit()
+
+    @classmethod
+    def da_configuracao(cls):
+        """
+        Cria o cache a partir das variáveis de ambiente CACHE_ROTAS_TTL,
+        CACHE_ROTAS_CAPACIDADE, CACHE_ROTAS_ARQUIVO e CACHE_ROTAS_PRECISAO.
+        """
+        return cls(
+            ttl=float(os.getenv("CACHE_ROTAS_TTL", "86400")),
+            capacidade=int(os.getenv("CACHE_ROTAS_CAPACIDADE", "10000")),
+            caminho_sqlite=os.getenv("CACHE_ROTAS_ARQUIVO") or None,
+            precisao=int(os.getenv("CACHE_ROTAS_PRECISAO", "3")),
+        )
+
+    def chave(self, origem_lat, origem_lon, destino_id, destino_lat, destino_lon, modo="DRIVE"):
+        """Monta a chave textual (origem quantizada, destino e suas coordenadas, modo)."""
+        return (f"{origem_lat:.{self.precisao}f},{origem_lon:.{self.precisao}f}"
+                f"|{destino_id}@{destino_lat:.6f},{destino_lon:.6f}|{modo}")
+
+    def obter_muitos(self, origem_lat, origem_lon, pontos, modo="DRIVE"):
+        """
+        Busca no cache os resultados de vários destinos para uma origem.
+
+        Args:
+            origem_lat: Latitude da origem
+            origem_lon: Longitude da origem
+            pontos: Dicionário {id: {latitude, longitude, ...}} dos destinos
+            modo: Modo de viagem (ex.: "DRIVE")
+
+        Retorna:
+            Dicionário {destino_id: {distance_km, duration_min}} só com os acertos
+        """
+        agora = time.time()
+        chaves = {
+            self.chave(origem_lat, origem_lon, d, ponto['latitude'], ponto['longitude'], modo): d
+            for d, ponto in pontos.items()
+        }
+        # Entradas da memória: (valor, expira)
+        da_memoria = self._memoria.obter_muitos(list(chaves), lambda entrada: entrada[1] > agora)
+        encontrados = {chaves[chave]: dict(valor) for chave, (valor, _) in da_memoria.items()}
+        pendentes = [chave for chave in chaves if chave not in da_memoria]
+
+        do_disco = []
+        if pendentes and self._conexao is not None:
+            with self._lock_disco:
+                do_disco = list(self._ler_disco(pendentes, agora))
+            self._memoria.gravar_muitos((chave, (valor, expira)) for chave, valor, expira in do_disco)
+            for chave, valor, _ in do_disco:
+                encontrados[chaves[chave]] = dict(valor)
+
+        with self._lock:
+            self.acertos_disco += len(do_disco)
+            self.faltas += len(chaves) - len(encontrados)
+        return encontrados
+
+    def gravar_muitos(self, origem_lat, origem_lon, pontos, resultados, modo="DRIVE"):
+        """
+        Grava resultados de roteamento. Resultados sem distância (falhas) não são gravados.
+
+        Args:
+            origem_lat: Latitude da origem
+            origem_lon: Longitude da origem
+            pontos: Dicionário {id: {latitude, longitude, ...}} com (ao menos) os destinos de resultados
+            resultados: Dicionário {destino_id: {distance_km, duration_min}}
+            modo: Modo de viagem (ex.: "DRIVE")
+        """
+        agora = time.time()
+        expira = agora + self.ttl
+        linhas = []
+        for destino_id, valor in resultados.items():
+            if valor.get("distance_km") is None or valor.get("duration_min") is None:
+                continue
+            ponto = pontos[destino_id]
+            chave = self.chave(origem_lat, origem_lon, destino_id, ponto['latitude'], ponto['longitude'], modo)
+            linhas.append((chave, valor["distance_km"], valor["duration_min"], expira))
+        self._memoria.gravar_muitos(
+            (chave, ({"distance_km": distance_km, "duration_min": duration_min}, expira))
+            for chave, distance_km, duration_min, expira in linhas
+        )
+
+        if linhas and self._conexao is not None:
+            with self._lock_disco:
+                self._conexao.executemany("INSERT OR REPLACE INTO rotas VALUES (?, ?, ?, ?)", linhas)
+                if agora - self._ultima_limpeza >= INTERVALO_LIMPEZA:
+                    self._remover_vencidas(agora)
+                self._conexao.commit()
+
+    @property
+    def usa_disco(self):
+        """Indica se há camada SQLite (consultas e gravações podem esperar pelo disco)."""
+        return self._conexao is not None
+
+    def _remover_vencidas(self, agora):
+        # Chamado com _lock_disco; o commit fica com quem chamou
+        self._conexao.execute("DELETE FROM rotas WHERE expira < ?", (agora,))
+        self._ultima_limpeza = agora
+
+    def _ler_disco(self, chaves, agora):
+        # SQLite limita o número de parâmetros por consulta
+        for inicio in range(0, len(chaves), 500):
+            lote = chaves[inicio:inicio + 500]
+            marcadores = ",".join("?" * len(lote))
+            cursor = self._conexao.execute(
+                f"SELECT chave, distance_km, duration_min, expira FROM rotas"
+                f" WHERE chave IN ({marcadores}) AND expira > ?",
+                (*lote, agora)
+            )
+            for chave, distance_km, duration_min, expira in cursor:
+                yield chave, {"distance_km": distance_km, "duration_min": duration_min}, expira
+
+    def limpar(self):
+        """Remove todas as entradas (memória e disco) e zera os contadores."""
+        self._memoria.limpar(zerar_contadores=True)
+        with self._lock:
+            self.acertos_disco = self.faltas = 0
+        if self._conexao is not None:
+            with self._lock_disco:
+                self._conexao.execute("DELETE FROM rotas")
+                self._conexao.commit()
+
+    def resumo(self):
+        """Retorna contadores de acertos/faltas e o tamanho atual do cache."""
+        memoria = self._memoria.resumo()
+        with self._lock:
+            acertos = memoria['acertos'] + self.acertos_disco
+            consultas = acertos + self.faltas
+            return {
+                'acertos_memoria': memoria['acertos'],
+                'acertos_disco': self.acertos_disco,
+                'faltas': self.faltas,
+                'taxa_acerto': acertos / consultas if consultas else 0.0,
+                'entradas_memoria': memoria['entradas'],
+                'ttl_segundos': self.ttl
+            }
@@ -0,0 +1,443 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from metricas import duracao_lotes_rotas, erros_rotas
+from registro import Adiado, logger_payloads
+from transporte_rotas import AdaptadorRotas, ResolvedorDNS, transporte_async
+
+# httpx é opcional (pip install httpx): só o ClienteRotasAsync, usado pelo servidor ASGI, depende dele
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Códigos HTTP que indicam falha temporária (vale tentar de novo)
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+
+# Campos pedidos ao computeRouteMatrix
+FIELD_MASK = "originIndex,destinationIndex,distanceMeters,duration,condition,status"
+
+logger = logging.getLogger(__name__)
+# Corpos enviados e recebidos (DEBUG, amostrados; ver registro.py)
+payloads = logger_payloads(__name__)
+
+
+def waypoint(lat, lon):
+    """Monta um waypoint da Routes API a partir de coordenadas."""
+    return {
+        "waypoint": {
+            "location": {
+                "latLng": {
+                    "latitude": lat,
+                    "longitude": lon
+                }
+            }
+        }
+    }
+
+
+def resultado_vazio():
+    """Resultado usado quando não foi possível obter a rota."""
+    return {"distance_km": None, "duration_min": None}
+
+
+def interpretar_elemento(elemento):
+    """
+    Converte um elemento da matriz em {distance_km, duration_min}.
+
+    Elementos sem rota (condition ROUTE_NOT_FOUND) ou com status de erro viram None.
+    """
+    if elemento.get("condition", "ROUTE_EXISTS") != "ROUTE_EXISTS" or elemento.get("status", {}).get("code"):
+        return resultado_vazio()
+
+    # Distância em metros (omitida pela API quando é zero)
+    dist_m = elemento.get("distanceMeters", 0)
+
+    # Duração em segundos (formato "1234s")
+    dur_s = elemento.get("duration", "0s")
+    dur_seconds = float(dur_s.rstrip('s')) if isinstance(dur_s, str) else dur_s
+
+    return {
+        "distance_km": dist_m / 1000,
+        "duration_min": dur_seconds / 60
+    }
+
+
+def dividir_matriz(n_origens, n_destinos, limite_elementos):
+    """
+    Divide uma matriz origens x destinos em blocos de até limite_elementos.
+
+    Retorna:
+        Lista de tuplas (inicio_origem, fim_origem, inicio_destino, fim_destino)
+    """
+    tam_origens = min(n_origens, limite_elementos)
+    tam_destinos = max(1, limite_elementos // tam_origens)
+    return [
+        (o, min(o + tam_origens, n_origens), d, min(d + tam_destinos, n_destinos))
+        for o in range(0, n_origens, tam_origens)
+        for d in range(0, n_destinos, tam_destinos)
+    ]
+
+
+def corpo_bloco(origens, destinos, modo):
+    """Serializa o corpo JSON de uma requisição computeRouteMatrix."""
+    return json.dumps({
+        "origins": [waypoint(lat, lon) for lat, lon in origens],
+        "destinations": [waypoint(lat, lon) for lat, lon in destinos],
+        "travelMode": modo
+    })
+
+
+def preencher_matriz(matriz, inicio_origem, inicio_destino, elementos):
+    """Copia os elementos de um bloco para a matriz completa, ignorando índices inválidos."""
+    for elemento in elementos:
+        i, j = elemento.get("originIndex", 0), elemento.get("destinationIndex")
+        if j is None:
+            continue
+        if 0 <= inicio_origem + i < len(matriz) and 0 <= inicio_destino + j < len(matriz[0]):
+            matriz[inicio_origem + i][inicio_destino + j] = interpretar_elemento(elemento)
+
+
+class _ClienteRotasBase:
+    """
+    Protocolo comum aos clientes síncrono e assíncrono do computeRouteMatrix.
+
+    Guarda a configuração e os contadores, divide a matriz em blocos, monta a
+    matriz com as respostas e decide repetições e esperas de cada bloco
+    (_protocolo_bloco). As subclasses só fazem a E/S: enviar a requisição e
+    aguardar, com threads ou com corrotinas.
+
+    Args: como em ClienteRotas
+    """
+
+    # Exceções de transporte da biblioteca HTTP da subclasse (erros de rede, repetíveis)
+    ERROS_TRANSPORTE = ()
+
+    def __init__(self, url, chave_api, limite_elementos, max_concorrencia, tentativas,
+                 prazo, backoff_base, backoff_max, resolvedor):
+        self.url = url
+        self.chave_api = chave_api
+        self.limite_elementos = limite_elementos
+        self.max_concorrencia = max_concorrencia
+        self.tentativas = tentativas
+        self.prazo = prazo
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.resolvedor = resolvedor or ResolvedorDNS.da_configuracao()
+        self.cabecalhos = {
+            "Content-Type": "application/json",
+            "X-Goog-Api-Key": chave_api,
+            "X-Goog-FieldMask": FIELD_MASK
+        }
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.repeticoes = 0
+        self.falhas = 0
+
+    def _preparar_matriz(self, origens, destinos, prazo):
+        """Retorna a matriz vazia, o instante limite (time.monotonic) e os blocos a enviar."""
+        matriz = [[resultado_vazio() for _ in destinos] for _ in origens]
+        if not origens or not destinos:
+            return matriz, None, []
+        limite = time.monotonic() + (self.prazo if prazo is None else prazo)
+        return matriz, limite, dividir_matriz(len(origens), len(destinos), self.limite_elementos)
+
+    @staticmethod
+    def _registrar_prazo(pendentes, total):
+        """Conta e registra os blocos que não terminaram dentro do prazo."""
+        if pendentes:
+            erros_rotas.inc(pendentes, provedor="google", tipo="prazo")
+            logger.warning("%d de %d lotes não terminaram dentro do prazo", pendentes, total)
+
+    def _espera(self, tentativa, resposta=None):
+        # Retry-After (segundos) tem precedência sobre o backoff calculado
+        if resposta is not None:
+            try:
+                return float(resposta.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                pass
+        teto = min(self.backoff_max, self.backoff_base * (2 ** tentativa))
+        return random.uniform(0, teto)
+
+    def _protocolo_bloco(self, origens, destinos, modo, limite):
+        """
+        Repetições de um bloco, independente de como a requisição é feita.
+
+        É um gerador: produz ("enviar", payload, restante) e recebe a resposta
+        HTTP (ou uma exceção de ERROS_TRANSPORTE via throw()), ou produz
+        ("esperar", segundos) e recebe None depois da espera.
+
+        Retorna (StopIteration.value):
+            Lista de elementos do bloco (vazia em caso de falha)
+        """
+        payload = corpo_bloco(origens, destinos, modo)
+
+        for tentativa in range(self.tentativas):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            resposta = None
+            with self._lock:
+                self.requisicoes += 1
+                if tentativa:
+                    self.repeticoes += 1
+            try:
+                payloads.debug("Requisição (%d origens x %d destinos): %s", len(origens), len(destinos), payload)
+                resposta = yield "enviar", payload, restante
+                payloads.debug("Resposta HTTP %d: %s", resposta.status_code, Adiado(lambda: resposta.text))
+                if resposta.status_code == 200:
+                    elementos = resposta.json()
+                    if isinstance(elementos, list):
+                        return elementos
+                    erros_rotas.inc(provedor="google", tipo="resposta_invalida")
+                    logger.warning("Resposta inválida da API Google Routes (%s em vez de lista)",
+                                   type(elementos).__name__)
+                    break
+                if resposta.status_code not in STATUS_REPETIVEIS:
+                    erros_rotas.inc(provedor="google", tipo="http")
+                    logger.error("Erro HTTP %d da API Google Routes: %.200s", resposta.status_code, resposta.text)
+                    break
+                erros_rotas.inc(provedor="google", tipo="http_temporario")
+            except self.ERROS_TRANSPORTE as e:
+                erros_rotas.inc(provedor="google", tipo="conexao")
+                logger.warning("Erro ao chamar API Google Routes (tentativa %d): %s", tentativa + 1, e)
+            except ValueError as e:
+                erros_rotas.inc(provedor="google", tipo="json")
+                logger.error("Resposta da API Google Routes não é JSON válido: %s", e)
+                break
+
+            espera = self._espera(tentativa, resposta)
+            if tentativa + 1 >= self.tentativas or time.monotonic() + espera >= limite:
+                break
+            yield "esperar", espera
+
+        with self._lock:
+            self.falhas += 1
+        return []
+
+    def resumo(self):
+        """Retorna contadores de requisições, repetições e blocos que falharam."""
+        with self._lock:
+            return {
+                'requisicoes': self.requisicoes,
+                'repeticoes': self.repeticoes,
+                'falhas': self.falhas
+            }
+
+
+class ClienteRotas(_ClienteRotasBase):
+    """
+    Cliente do endpoint computeRouteMatrix com conexões persistentes.
+
+    Os blocos da matriz são enviados em paralelo, no máximo `max_concorrencia`
+    por chamada de calcular_matriz, por um pool de threads compartilhado por
+    todas as chamadas (até `max_conexoes` requisições simultâneas no cliente
+    inteiro), todos pela mesma requests.Session (as conexões TCP/TLS são
+    reaproveitadas). Respostas 429/5xx e erros de rede
+    são repetidos com backoff exponencial com jitter, e toda a consulta
+    respeita um prazo único: o que não terminar até lá fica sem resultado.
+
+    Args:
+        url: Endpoint computeRouteMatrix
+        chave_api: Chave da Google API
+        limite_elementos: Máximo de origens x destinos por requisição
+        max_concorrencia: Máximo de requisições simultâneas de cada chamada (consulta)
+        max_conexoes: Máximo de requisições simultâneas somando todas as chamadas
+                      (threads do pool e conexões mantidas na sessão)
+        tentativas: Número máximo de tentativas por bloco
+        prazo: Tempo total (segundos) de uma consulta, incluindo repetições
+        backoff_base: Espera base (segundos) entre tentativas
+        backoff_max: Espera máxima (segundos) entre tentativas
+        resolvedor: ResolvedorDNS das conexões (padrão: ResolvedorDNS.da_configuracao())
+    """
+
+    ERROS_TRANSPORTE = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, url, chave_api, limite_elementos=625, max_concorrencia=4, tentativas=3,
+                 prazo=10.0, backoff_base=0.25, backoff_max=2.0, max_conexoes=64, resolvedor=None):
+        super().__init__(url, chave_api, limite_elementos, max_concorrencia, tentativas,
+                         prazo, backoff_base, backoff_max, resolvedor)
+        self.sessao = requests.Session()
+        self.sessao.trust_env = False  # Desabilita detecção automática de proxy
+        # DNS com cache e preferência IPv4 só nesta sessão; conexões mantidas no pool (keep-alive)
+        adaptador = AdaptadorRotas(self.resolvedor, pool_connections=1, pool_maxsize=max_conexoes)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.headers.update(self.cabecalhos)
+        self._executor = ThreadPoolExecutor(max_workers=max_conexoes, thread_name_prefix="rotas")
+
+    def calcular_matriz(self, origens, destinos, modo="DRIVE", prazo=None):
+        """
+        Calcula distância e duração de cada origem para cada destino.
+
+        Args:
+            origens: Lista de tuplas (lat, lon)
+            destinos: Lista de tuplas (lat, lon)
+            modo: travelMode da Routes API
+            prazo: Tempo total em segundos (padrão: self.prazo)
+
+        Retorna:
+            Matriz (lista de listas) [origem][destino] de {distance_km, duration_min};
+            posições sem resposta dentro do prazo ficam com None
+        """
+        matriz, limite, blocos = self._preparar_matriz(origens, destinos, prazo)
+        fila = iter(blocos)
+        # No máximo max_concorrencia blocos desta chamada no pool; cada um que termina libera o próximo
+        em_andamento = {}
+        while True:
+            for o0, o1, d0, d1 in fila:
+                futuro = self._executor.submit(self._enviar_bloco, origens[o0:o1], destinos[d0:d1], modo, limite)
+                em_andamento[futuro] = (o0, d0)
+                if len(em_andamento) >= self.max_concorrencia:
+                    break
+            restante = limite - time.monotonic() if em_andamento else 0
+            if restante <= 0:
+                break
+            concluidos, _ = wait(em_andamento, timeout=restante, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                o0, d0 = em_andamento.pop(futuro)
+                preencher_matriz(matriz, o0, d0, futuro.result())
+
+        for futuro in em_andamento:
+            futuro.cancel()
+        self._registrar_prazo(len(em_andamento) + sum(1 for _ in fila), len(blocos))
+        return matriz
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos, modo="DRIVE", prazo=None):
+        """
+        Atalho para uma única origem.
+
+        Retorna:
+            Lista de {distance_km, duration_min}, na mesma ordem de destinos
+        """
+        return self.calcular_matriz([(origem_lat, origem_lon)], destinos, modo, prazo)[0]
+
+    def _enviar_bloco(self, origens, destinos, modo, limite):
+        """Envia um bloco com repetições; retorna a lista de elementos (vazia em caso de falha)."""
+        protocolo = self._protocolo_bloco(origens, destinos, modo, limite)
+        try:
+            acao = next(protocolo)
+            while True:
+                if acao[0] == "esperar":
+                    time.sleep(acao[1])
+                    acao = protocolo.send(None)
+                    continue
+                _, payload, restante = acao
+                try:
+                    with duracao_lotes_rotas.cronometrar(cliente="sincrono"):
+                        resposta = self.sessao.post(self.url, data=payload, timeout=restante)
+                except self.ERROS_TRANSPORTE as e:
+                    acao = protocolo.throw(e)
+                else:
+                    acao = protocolo.send(resposta)
+        except StopIteration as fim:
+            return fim.value
+
+    def fechar(self):
+        """Encerra o pool de threads e as conexões."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.sessao.close()
+
+
+class ClienteRotasAsync(_ClienteRotasBase):
+    """
+    Versão assíncrona do ClienteRotas, sobre httpx.AsyncClient.
+
+    Mesmo protocolo (blocos, repetições com backoff e prazo único), mas as
+    requisições são corrotinas: enquanto a Routes API responde, o event loop
+    atende outras consultas. `max_concorrencia` limita os blocos simultâneos
+    de cada consulta; `max_conexoes` limita as conexões abertas pelo cliente
+    inteiro (compartilhadas, com keep-alive, entre todas as consultas).
+    O cliente pertence ao event loop em que foi criado.
+
+    Args:
+        url, chave_api, limite_elementos, max_concorrencia, tentativas, prazo,
+        backoff_base, backoff_max, resolvedor: Como em ClienteRotas
+        max_conexoes: Máximo de conexões simultâneas com a API
+
+    Lança:
+        RuntimeError: se o pacote httpx não estiver instalado
+    """
+
+    ERROS_TRANSPORTE = (httpx.TransportError,) if httpx is not None else ()
+
+    def __init__(self, url, chave_api, limite_elementos=625, max_concorrencia=4, tentativas=3,
+                 prazo=10.0, backoff_base=0.25, backoff_max=2.0, max_conexoes=100, resolvedor=None):
+        if httpx is None:
+            raise RuntimeError("ClienteRotasAsync requer o pacote httpx (pip install httpx)")
+        super().__init__(url, chave_api, limite_elementos, max_concorrencia, tentativas,
+                         prazo, backoff_base, backoff_max, resolvedor)
+        self.cliente = httpx.AsyncClient(
+            trust_env=False,  # Desabilita detecção automática de proxy
+            transport=transporte_async(self.resolvedor, max_conexoes),
+            headers=self.cabecalhos
+        )
+
+    async def calcular_matriz(self, origens, destinos, modo="DRIVE", prazo=None):
+        """
+        Calcula distância e duração de cada origem para cada destino.
+
+        Args e Retorna: iguais a ClienteRotas.calcular_matriz
+        """
+        matriz, limite, blocos = self._preparar_matriz(origens, destinos, prazo)
+        if not blocos:
+            return matriz
+
+        semaforo = asyncio.Semaphore(self.max_concorrencia)
+
+        async def enviar_limitado(o0, o1, d0, d1):
+            async with semaforo:
+                return await self._enviar_bloco(origens[o0:o1], destinos[d0:d1], modo, limite)
+
+        tarefas = {asyncio.ensure_future(enviar_limitado(*bloco)): bloco for bloco in blocos}
+        concluidas, pendentes = await asyncio.wait(tarefas, timeout=max(0.0, limite - time.monotonic()))
+        for tarefa in pendentes:
+            tarefa.cancel()
+        self._registrar_prazo(len(pendentes), len(tarefas))
+
+        for tarefa in concluidas:
+            o0, _, d0, _ = tarefas[tarefa]
+            preencher_matriz(matriz, o0, d0, tarefa.result())
+        return matriz
+
+    async def calcular_distancias(self, origem_lat, origem_lon, destinos, modo="DRIVE", prazo=None):
+        """
+        Atalho para uma única origem.
+
+        Retorna:
+            Lista de {distance_km, duration_min}, na mesma ordem de destinos
+        """
+        return (await self.calcular_matriz([(origem_lat, origem_lon)], destinos, modo, prazo))[0]
+
+    async def _enviar_bloco(self, origens, destinos, modo, limite):
+        """Envia um bloco com repetições; retorna a lista de elementos (vazia em caso de falha)."""
+        protocolo = self._protocolo_bloco(origens, destinos, modo, limite)
+        try:
+            acao = next(protocolo)
+            while True:
+                if acao[0] == "esperar":
+                    await asyncio.sleep(acao[1])
+                    acao = protocolo.send(None)
+                    continue
+                _, payload, restante = acao
+                try:
+                    with duracao_lotes_rotas.cronometrar(cliente="assincrono"):
+                        resposta = await self.cliente.post(self.url, content=payload, timeout=restante)
+                except self.ERROS_TRANSPORTE as e:
+                    acao = protocolo.throw(e)
+                else:
+                    acao = protocolo.send(resposta)
+        except StopIteration as fim:
+            return fim.value
+
+    async def fechar(self):
+        """Fecha as conexões do cliente."""
+        await self.cliente.aclose()
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Voo:
+    """Execução em andamento de uma chave, aguardada pelas chamadas seguidoras."""
+
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    """
+    Coalescência de chamadas simultâneas ("single-flight"): enquanto uma
+    chamada com determinada chave está em andamento, as demais com a mesma
+    chave esperam por ela e recebem o mesmo resultado (ou a mesma exceção).
+
+    Funciona entre threads (executar) e entre corrotinas de um event loop
+    (executar_async). Com `caminho_sqlite`, processos que compartilham o
+    arquivo também coalescem: o primeiro registra uma reserva da chave, os
+    outros consultam o arquivo até o resultado (serializado em JSON) aparecer;
+    se a reserva expirar sem resultado, cada processo executa por conta própria.
+
+    Args:
+        caminho_sqlite: Arquivo SQLite compartilhado entre processos (None desativa)
+        prazo_reserva: Segundos que uma reserva entre processos é respeitada
+        retencao: Segundos que um resultado fica disponível para outros processos
+        intervalo_consulta: Intervalo (segundos) entre consultas ao arquivo
+    """
+
+    def __init__(self, caminho_sqlite=None, prazo_reserva=15.0, retencao=5.0, intervalo_consulta=0.05):
+        self.caminho_sqlite = caminho_sqlite
+        self.prazo_reserva = prazo_reserva
+        self.retencao = retencao
+        self.intervalo_consulta = intervalo_consulta
+        self.execucoes = 0
+        self.coalescidas = 0
+        self.coalescidas_entre_processos = 0
+        self._voos = {}
+        self._voos_async = {}
+        self._lock = threading.Lock()
+        self._conexao = None
+        if caminho_sqlite:
+            self._conexao = sqlite3.connect(caminho_sqlite, timeout=5.0, check_same_thread=False)
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS voos ("
+                " chave TEXT PRIMARY KEY, expira REAL, resultado TEXT)"
+            )
+            self._conexao.commit()
+
+    @classmethod
+    def da_configuracao(cls):
+        """
+        Cria o coalescedor a partir de ROTAS_COALESCENCIA_ARQUIVO (arquivo
+        compartilhado entre workers; padrão: só dentro do processo) e
+        ROTAS_PRAZO (prazo das reservas entre processos).
+        """
+        return cls(
+            caminho_sqlite=os.getenv("ROTAS_COALESCENCIA_ARQUIVO") or None,
+            prazo_reserva=float(os.getenv("ROTAS_PRAZO", "10")) + 5.0,
+        )
+
+    def executar(self, chave, funcao):
+        """
+        Executa funcao() uma única vez para chamadas simultâneas com a mesma chave.
+
+        Args:
+            chave: Texto que identifica a chamada
+            funcao: Função sem argumentos; com arquivo compartilhado, o resultado
+                    deve ser serializável em JSON
+
+        Retorna:
+            Resultado de funcao() (o mesmo objeto para todas as chamadas coalescidas)
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            voo.resultado = self._entre_processos(chave, funcao)
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.evento.set()
+
+    async def executar_async(self, chave, funcao):
+        """
+        Como executar(), para corrotinas: funcao é uma função assíncrona sem argumentos.
+
+        Retorna:
+            Resultado de await funcao()
+        """
+        chave_loop = (asyncio.get_running_loop(), chave)
+        futuro = self._voos_async.get(chave_loop)
+        if futuro is not None:
+            with self._lock:
+                self.coalescidas += 1
+            return await asyncio.shield(futuro)
+
+        futuro = self._voos_async[chave_loop] = asyncio.get_running_loop().create_future()
+        try:
+            resultado = await self._entre_processos_async(chave, funcao)
+            futuro.set_result(resultado)
+            return resultado
+        except BaseException as e:
+            futuro.set_exception(e)
+            futuro.exception()  # Evita o aviso de exceção não recuperada sem seguidores
+            raise
+        finally:
+            del self._voos_async[chave_loop]
+
+    def _entre_processos(self, chave, funcao):
+        if self._conexao is None:
+            return self._contar(funcao)
+        limite = time.time() + self.prazo_reserva
+        while True:
+            situacao, resultado = self._reservar(chave)
+            if situacao == "reservado":
+                return self._executar_reservado(chave, funcao)
+            if situacao == "pronto":
+                return resultado
+            if time.time() >= limite:
+                return self._contar(funcao)
+            time.sleep(self.intervalo_consulta)
+
+    async def _entre_processos_async(self, chave, funcao):
+        if self._conexao is None:
+            return await self._contar_async(funcao)
+        limite = time.time() + self.prazo_reserva
+        while True:
+            situacao, resultado = await asyncio.to_thread(self._reservar, chave)
+            if situacao == "reservado":
+                try:
+                    resultado = await self._contar_async(funcao)
+                except BaseException:
+                    await asyncio.to_thread(self._liberar, chave)
+                    raise
+                await asyncio.to_thread(self._publicar, chave, resultado)
+                return resultado
+            if situacao == "pronto":
+                return resultado
+            if time.time() >= limite:
+                return await self._contar_async(funcao)
+            await asyncio.sleep(self.intervalo_consulta)
+
+    def _contar(self, funcao):
+        with self._lock:
+            self.execucoes += 1
+        return funcao()
+
+    async def _contar_async(self, funcao):
+        with self._lock:
+            self.execucoes += 1
+        return await funcao()
+
+    def _executar_reservado(self, chave, funcao):
+        try:
+            resultado = self._contar(funcao)
+        except BaseException:
+            self._liberar(chave)
+            raise
+        self._publicar(chave, resultado)
+        return resultado
+
+    def _reservar(self, chave):
+        """
+        Tenta reservar a chave no arquivo compartilhado.
+
+        Retorna:
+            ("reservado", None), ("pronto", resultado) ou ("ocupado", None)
+        """
+        agora = time.time()
+        with self._lock:
+            try:
+                with self._conexao:
+                    self._conexao.execute("DELETE FROM voos WHERE expira <= ?", (agora,))
+                    linha = self._conexao.execute(
+                        "SELECT resultado FROM voos WHERE chave = ?", (chave,)
+                    ).fetchone()
+                    if linha is None:
+                        self._conexao.execute(
+                            "INSERT INTO voos (chave, expira, resultado) VALUES (?, ?, NULL)",
+                            (chave, agora + self.prazo_reserva)
+                        )
+                        return "reservado", None
+            except sqlite3.Error as e:
+                logger.warning("Falha no arquivo de coalescência (%s); executando sem coalescer", e)
+                return "reservado", None
+            if linha[0] is None:
+                return "ocupado", None
+            self.coalescidas_entre_processos += 1
+            return "pronto", json.loads(linha[0])
+
+    def _publicar(self, chave, resultado):
+        """Grava o resultado da chave reservada para os outros processos."""
+        with self._lock:
+            try:
+                with self._conexao:
+                    self._conexao.execute(
+                        "UPDATE voos SET resultado = ?, expira = ? WHERE chave = ?",
+                        (json.dumps(resultado), time.time() + self.retencao, chave)
+                    )
+            except sqlite3.Error as e:
+                logger.warning("Não foi possível publicar o resultado coalescido (%s)", e)
+
+    def _liberar(self, chave):
+        """Remove a reserva de uma chave cuja execução falhou."""
+        with self._lock:
+            try:
+                with self._conexao:
+                    self._conexao.execute("DELETE FROM voos WHERE chave = ?", (chave,))
+            except sqlite3.Error:
+                pass
+
+    def resumo(self):
+        """Retorna execuções reais e chamadas coalescidas (no processo e entre processos)."""
+        with self._lock:
+            return {
+                'execucoes': self.execucoes,
+                'coalescidas': self.coalescidas,
+                'coalescidas_entre_processos': self.coalescidas_entre_processos
+            }
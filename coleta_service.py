@@ -1,170 +1,531 @@
-import csv
-import requests
-import os
+import asyncio
+import base64
+import bisect
+import hashlib
+import heapq
 import json
-import socket
+import logging
+import os
+import math
+import threading
+import weakref
+import numpy as np
+from cache_rotas import CacheRotas
+from coalescencia import Coalescedor
+from cliente_rotas import ClienteRotas, ClienteRotasAsync, resultado_vazio
+from indice_espacial import agrupar_por_pixels
+from metricas import cache_rotas_consultas, chamadas_rotas, duracao_etapas, erros_rotas
+from provedores_rotas import ErroRoteamento, ProvedorEstimativa, ProvedorGoogle, ProvedorOSRM
+from repositorio_pontos import obter_repositorio, MODO_TODOS, MODO_QUALQUER
+from tabela_rotas import TabelaRotas
+from transporte_rotas import ResolvedorDNS
 
-# Forçar uso de IPv4 apenas para resolver problemas de lentidão no Windows
-original_getaddrinfo = socket.getaddrinfo
-def getaddrinfo_ipv4_only(host, port, family=0, type=0, proto=0, flags=0):
-    return original_getaddrinfo(host, port, socket.AF_INET, type, proto, flags)
-socket.getaddrinfo = getaddrinfo_ipv4_only
+logger = logging.getLogger(__name__)
 
 # Tentar obter a chave de variável de ambiente, senão usar placeholder
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "YOUR_GOOGLE_API_KEY")
 
+# Endpoint da Routes API (pode ser apontado para um servidor local em testes)
+GOOGLE_ROUTES_URL = os.getenv(
+    "GOOGLE_ROUTES_URL",
+    "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+)
+
+# Máximo de elementos (origens x destinos) aceito pelo computeRouteMatrix por requisição
+LIMITE_ELEMENTOS_MATRIZ = 625
+
+# Cliente de rotas: requisições simultâneas por consulta, tentativas por lote e prazo total (segundos) por consulta
+ROTAS_CONCORRENCIA = int(os.getenv("ROTAS_CONCORRENCIA", "4"))
+# Requisições simultâneas do cliente síncrono somando todas as consultas do processo (pool de threads e
+# conexões); dimensione como threads do worker x ROTAS_CONCORRENCIA
+ROTAS_CONEXOES = int(os.getenv("ROTAS_CONEXOES", "64"))
+ROTAS_TENTATIVAS = int(os.getenv("ROTAS_TENTATIVAS", "3"))
+ROTAS_PRAZO = float(os.getenv("ROTAS_PRAZO", "10"))
+
+# Resolução DNS dos clientes de rotas: cache por ROTAS_DNS_TTL segundos e política de família
+# ROTAS_FAMILIA_IP (padrão: IPv4 primeiro, que evita a espera por IPv6 em redes sem rota IPv6)
+resolvedor_rotas = ResolvedorDNS.da_configuracao()
+
+# Cliente assíncrono (servidor ASGI): conexões simultâneas com a API, somando todas as consultas
+ROTAS_CONEXOES_ASYNC = int(os.getenv("ROTAS_CONEXOES_ASYNC", "100"))
+
+# Modo de viagem enviado à Routes API (também faz parte da chave do cache de rotas)
+MODO_VIAGEM = "DRIVE"
+
+# Cache de resultados de roteamento (LRU em memória + SQLite opcional), configurado por
+# CACHE_ROTAS_TTL, CACHE_ROTAS_CAPACIDADE, CACHE_ROTAS_ARQUIVO e CACHE_ROTAS_PRECISAO
+cache_rotas = CacheRotas.da_configuracao()
+
+# Tempos de direção pré-calculados por célula de origem (tabela_rotas.py), consultados antes
+# do cache de rotas; configurados por TABELA_ROTAS_ARQUIVO e TABELA_ROTAS_VALIDADE
+tabela_rotas = TabelaRotas.da_configuracao()
+
+# Coalescência de chamadas de roteamento idênticas em andamento (entre threads e
+# corrotinas; entre workers com ROTAS_COALESCENCIA_ARQUIVO)
+coalescedor_rotas = Coalescedor.da_configuracao()
+
+# Fator de sobreamostragem do pré-filtro geométrico: com n pedidos, apenas os
+# n * FATOR_PREFILTRO pontos mais próximos em linha reta são enviados para roteamento
+FATOR_PREFILTRO = float(os.getenv("FATOR_PREFILTRO", "3"))
+
+# Consultas em lote: máximo de consultas por chamada e fração mínima de elementos
+# úteis (pares origem/destino pedidos por alguma consulta) em cada matriz enviada
+# ao provedor; abaixo dela, as consultas seguintes vão para outra matriz (acima
+# de 0.5, duas consultas sem destinos em comum não dividem uma matriz)
+MAX_CONSULTAS_LOTE = int(os.getenv("MAX_CONSULTAS_LOTE", "500"))
+EFICIENCIA_MINIMA_MATRIZ = float(os.getenv("EFICIENCIA_MINIMA_MATRIZ", "0.6"))
+
+# A partir deste nível de zoom o feed GeoJSON entrega os pontos sem agrupar
+ZOOM_SEM_AGRUPAMENTO = 17
+
+# Formatos de exportação completa e quantidade de pontos serializados por bloco
+FORMATO_NDJSON = "ndjson"
+FORMATO_JSON = "json"
+PONTOS_POR_BLOCO_EXPORTACAO = 500
+
 # Avisar se a chave não foi configurada
 if GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY":
-    print("\n⚠️  AVISO: Chave de API do Google não configurada!")
-    print("   Configure a variável de ambiente GOOGLE_API_KEY com sua chave real.")
-    print("   Sem a chave, a função de proximidade não funcionará.\n")
+    logger.warning("Chave de API do Google não configurada: defina GOOGLE_API_KEY; "
+                   "sem ela, as distâncias por rota do Google não estarão disponíveis")
+
+
+_clientes_rotas = {}
+_clientes_rotas_lock = threading.Lock()
+
+
+def obter_cliente_rotas():
+    """
+    Retorna o ClienteRotas compartilhado para a configuração atual
+    (GOOGLE_ROUTES_URL, GOOGLE_API_KEY e LIMITE_ELEMENTOS_MATRIZ).
+    
+    O cliente mantém a sessão HTTP e o pool de threads entre requisições.
+    """
+    chave = (GOOGLE_ROUTES_URL, GOOGLE_API_KEY, LIMITE_ELEMENTOS_MATRIZ)
+    cliente = _clientes_rotas.get(chave)
+    if cliente is None:
+        with _clientes_rotas_lock:
+            cliente = _clientes_rotas.get(chave)
+            if cliente is None:
+                cliente = ClienteRotas(
+                    GOOGLE_ROUTES_URL,
+                    GOOGLE_API_KEY,
+                    limite_elementos=LIMITE_ELEMENTOS_MATRIZ,
+                    max_concorrencia=ROTAS_CONCORRENCIA,
+                    tentativas=ROTAS_TENTATIVAS,
+                    prazo=ROTAS_PRAZO,
+                    max_conexoes=ROTAS_CONEXOES,
+                    resolvedor=resolvedor_rotas
+                )
+                _clientes_rotas[chave] = cliente
+    return cliente
 
 
 def get_distances_from_google(origin_lat, origin_lon, destinations):
     """
     Chama a Google Routes API v2 (Distance Matrix endpoint) para obter distância e tempo de direção.
     
+    Os destinos são enviados em lotes de até LIMITE_ELEMENTOS_MATRIZ por requisição,
+    em paralelo (até ROTAS_CONCORRENCIA por consulta), com repetição de falhas temporárias e um
+    prazo total de ROTAS_PRAZO segundos para a consulta inteira.
+    
     Args:
         origin_lat: Latitude do usuário
         origin_lon: Longitude do usuário
         destinations: Lista de tuplas (lat, lon)
     
     Retorna:
-        Lista de dicionários com distance_km e duration_min
+        Lista de dicionários com distance_km e duration_min, na mesma ordem de destinations
     """
     if not destinations:
         return []
     
     # Verificar se a chave de API foi configurada
     if GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY":
-        print("❌ Erro: Chave de API do Google não configurada!")
+        erros_rotas.inc(provedor="google", tipo="sem_chave")
+        logger.error("Chave de API do Google não configurada")
         return [{"distance_km": None, "duration_min": None}] * len(destinations)
     
-    url = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": GOOGLE_API_KEY,
-        "X-Goog-FieldMask": "originIndex,destinationIndex,distanceMeters,duration"
-    }
+    return obter_cliente_rotas().calcular_distancias(origin_lat, origin_lon, destinations, MODO_VIAGEM)
 
-    results = []
-    
-    # Processar cada destino individualmente
-    for dest_lat, dest_lon in destinations:
-
-        payload = {
-            "origins": [
-                {
-                    "waypoint": {
-                        "location": {
-                            "latLng": {
-                                "latitude": origin_lat,
-                                "longitude": origin_lon
-                            }
-                        }
-                    }
-                }
-            ],
-            "destinations": [
-                {
-                    "waypoint": {
-                        "location": {
-                            "latLng": {
-                                "latitude": dest_lat,
-                                "longitude": dest_lon
-                            }
-                        }
-                    }
-                }
-            ],
-            "travelMode": "DRIVE"
-        }
+
+def get_route_matrix_from_google(origins, destinations):
+    """
+    Chama a Google Routes API v2 para muitas origens e muitos destinos de uma vez
+    (usado pelas consultas em lote).
+    
+    Args:
+        origins: Lista de tuplas (lat, lon) das origens
+        destinations: Lista de tuplas (lat, lon) dos destinos
         
-        print(f"Debug - Payload enviado:")
-        print(f"  Origin: lat={origin_lat}, lon={origin_lon}")
-        print(f"  Destination: lat={dest_lat}, lon={dest_lon}")
-        print(f"  Payload completo: {json.dumps(payload, indent=2)}")
+    Retorna:
+        Matriz [origem][destino] de dicionários com distance_km e duration_min
+    """
+    if GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY":
+        erros_rotas.inc(provedor="google", tipo="sem_chave")
+        logger.error("Chave de API do Google não configurada")
+        return [[resultado_vazio() for _ in destinations] for _ in origins]
+    
+    return obter_cliente_rotas().calcular_matriz(origins, destinations, MODO_VIAGEM)
 
-        try:
-            resposta = requests.post(
-                url, 
-                headers=headers, 
-                data=json.dumps(payload), 
-                timeout=10,
-                proxies={'http': None, 'https': None}  # Desabilita detecção automática de proxy
-            ).json()
-            print(f"Debug - Resposta API para destino ({dest_lat}, {dest_lon}): {resposta}")
-            
-            # A resposta é uma lista de elementos no formato:
-            # [{'originIndex': 0, 'destinationIndex': 0, 'distanceMeters': 21443, 'duration': '1708s'}]
-            if resposta and isinstance(resposta, list) and len(resposta) > 0:
-                elemento = resposta[0]
-                
-                # Distância em metros
-                dist_m = elemento.get("distanceMeters", 0)
-                
-                # Duração em segundos (formato "1234s")
-                dur_s = elemento.get("duration", "0s")
-                # Converter string de duração (ex: "1708s") para segundos
-                dur_seconds = float(dur_s.rstrip('s')) if isinstance(dur_s, str) else dur_s
-                
-                results.append({
-                    "distance_km": dist_m / 1000,
-                    "duration_min": dur_seconds / 60
-                })
-                print(f"✅ Sucesso: {dist_m/1000:.2f} km, {dur_seconds/60:.1f} min")
-            else:
-                # Se não houver resultado válido, retornar None
-                print(f"⚠️  Aviso: resposta vazia ou inválida da API para destino ({dest_lat}, {dest_lon})")
-                results.append({
-                    "distance_km": None,
-                    "duration_min": None
-                })
+
+# Clientes assíncronos por event loop (o httpx.AsyncClient pertence ao loop em que foi criado)
+_clientes_rotas_async = weakref.WeakKeyDictionary()
+
+
+def obter_cliente_rotas_async():
+    """
+    Retorna o ClienteRotasAsync do event loop atual para a configuração atual.
+    
+    Deve ser chamada de dentro de uma corrotina.
+    """
+    clientes = _clientes_rotas_async.setdefault(asyncio.get_running_loop(), {})
+    chave = (GOOGLE_ROUTES_URL, GOOGLE_API_KEY, LIMITE_ELEMENTOS_MATRIZ)
+    cliente = clientes.get(chave)
+    if cliente is None:
+        cliente = clientes[chave] = ClienteRotasAsync(
+            GOOGLE_ROUTES_URL,
+            GOOGLE_API_KEY,
+            limite_elementos=LIMITE_ELEMENTOS_MATRIZ,
+            max_concorrencia=ROTAS_CONCORRENCIA,
+            tentativas=ROTAS_TENTATIVAS,
+            prazo=ROTAS_PRAZO,
+            max_conexoes=ROTAS_CONEXOES_ASYNC,
+            resolvedor=resolvedor_rotas
+        )
+    return cliente
+
+
+async def fechar_clientes_rotas_async():
+    """Fecha os clientes assíncronos do event loop atual (no encerramento do servidor ASGI)."""
+    clientes = _clientes_rotas_async.pop(asyncio.get_running_loop(), {})
+    for cliente in clientes.values():
+        await cliente.fechar()
+
+
+async def get_distances_from_google_async(origin_lat, origin_lon, destinations):
+    """
+    Versão assíncrona de get_distances_from_google, sobre o ClienteRotasAsync.
+    
+    Retorna:
+        Lista de dicionários com distance_km e duration_min, na mesma ordem de destinations
+    """
+    if not destinations:
+        return []
+    
+    if GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY":
+        erros_rotas.inc(provedor="google", tipo="sem_chave")
+        logger.error("Chave de API do Google não configurada")
+        return [{"distance_km": None, "duration_min": None}] * len(destinations)
+    
+    return await obter_cliente_rotas_async().calcular_distancias(origin_lat, origin_lon, destinations,
+                                                                 MODO_VIAGEM)
+
+
+# Provedores de rotas disponíveis, por nome. O servidor OSRM local é configurado por OSRM_URL.
+PROVEDORES_ROTAS = {
+    'google': ProvedorGoogle(
+        lambda lat, lon, destinos: get_distances_from_google(lat, lon, destinos),
+        disponivel=lambda: GOOGLE_API_KEY != "YOUR_GOOGLE_API_KEY",
+        funcao_distancias_async=lambda lat, lon, destinos: get_distances_from_google_async(lat, lon, destinos),
+        funcao_matriz=lambda origens, destinos: get_route_matrix_from_google(origens, destinos)
+    ),
+    'osrm': ProvedorOSRM(os.getenv("OSRM_URL"), resolvedor=resolvedor_rotas),
+    'estimativa': ProvedorEstimativa(),
+}
+
+# Cadeia padrão de provedores (primeiro o preferido, depois os de reserva)
+ROTEAMENTO_PADRAO = [nome.strip() for nome in os.getenv("ROTEAMENTO_PADRAO", "google,estimativa").split(",")]
+
+
+def resolver_provedores(roteamento=None):
+    """
+    Converte nomes de provedores de rotas na cadeia de provedores a usar.
+    
+    Args:
+        roteamento: Lista de nomes (ex.: ["osrm", "estimativa"]) ou None para ROTEAMENTO_PADRAO
         
-        except Exception as e:
-            print(f"❌ Erro ao chamar API Google Routes: {str(e)}")
-            results.append({
-                "distance_km": None,
-                "duration_min": None
-            })
+    Retorna:
+        Lista de instâncias de ProvedorRotas, na ordem de preferência
+    
+    Lança:
+        ValueError: se algum nome não corresponder a um provedor conhecido
+    """
+    nomes = ROTEAMENTO_PADRAO if not roteamento else [nome.strip().lower() for nome in roteamento]
+    desconhecidos = [nome for nome in nomes if nome not in PROVEDORES_ROTAS]
+    if desconhecidos:
+        raise ValueError(f"Provedor de rotas inválido: {', '.join(desconhecidos)} "
+                         f"(opções: {', '.join(PROVEDORES_ROTAS)})")
+    return [PROVEDORES_ROTAS[nome] for nome in nomes]
+
+
+def _resultados_conhecidos(provedor, user_lat, user_lon, pontos, ids, modo_cache):
+    """
+    Resultados de um provedor já disponíveis sem chamá-lo: primeiro a tabela
+    pré-calculada da célula da origem, depois o cache de rotas.
+    
+    Retorna:
+        Dicionário {id: {distance_km, duration_min}} só com os destinos encontrados
+    """
+    calculados = tabela_rotas.obter_muitos(provedor.nome, user_lat, user_lon, {i: pontos[i] for i in ids},
+                                           MODO_VIAGEM)
+    da_tabela = len(calculados)
+    restantes = {id_ponto: pontos[id_ponto] for id_ponto in ids if id_ponto not in calculados}
+    if restantes:
+        calculados.update(cache_rotas.obter_muitos(user_lat, user_lon, restantes, modo_cache))
+    cache_rotas_consultas.inc(da_tabela, resultado="tabela")
+    cache_rotas_consultas.inc(len(calculados) - da_tabela, resultado="acerto")
+    cache_rotas_consultas.inc(len(ids) - len(calculados), resultado="falta")
+    return calculados
+
+
+def _cadeia_roteamento(pontos, user_lat, user_lon, roteamento=None):
+    """
+    Percorre a cadeia de provedores de rotas, consultando a tabela pré-calculada
+    (tabela_rotas) e o cache de rotas.
+    
+    É um gerador: a cada chamada necessária produz (provedor, destinos) e recebe
+    de volta a lista de resultados (ou ErroRoteamento via throw()). Assim a mesma
+    lógica serve ao caminho síncrono e ao assíncrono, que só diferem em como
+    aguardam o provedor.
+    
+    Retorna (StopIteration.value):
+        Dicionário {id: {distance_km, duration_min, fonte_distancia}} dos pontos calculados
+    """
+    resultados = {}
+    pendentes = list(pontos)
+    for provedor in resolver_provedores(roteamento):
+        if not pendentes:
+            break
+        if not provedor.disponivel():
+            continue
+        
+        modo_cache = f"{provedor.nome}:{MODO_VIAGEM}"
+        calculados = {}
+        if provedor.usa_cache:
+            # Consultar a tabela pré-calculada e o cache de rotas antes de chamar o provedor
+            calculados = _resultados_conhecidos(provedor, user_lat, user_lon, pontos, pendentes, modo_cache)
+        faltando = [id_ponto for id_ponto in pendentes if id_ponto not in calculados]
+        
+        if faltando:
+            # Extrair destinos como lista de tuplas (lat, lon)
+            destinations = [(pontos[id_ponto]['latitude'], pontos[id_ponto]['longitude']) for id_ponto in faltando]
+            logger.debug("Calculando rotas (%s) para %d pontos (%d vindos do cache)",
+                         provedor.nome, len(destinations), len(calculados))
+            chamadas_rotas.inc(provedor=provedor.nome)
+            try:
+                novos = dict(zip(faltando, (yield provedor, destinations)))
+            except ErroRoteamento as e:
+                erros_rotas.inc(provedor=provedor.nome, tipo="falha")
+                logger.warning("Provedor de rotas %s falhou: %s", provedor.nome, e)
+                novos = {}
+            if provedor.usa_cache:
+                cache_rotas.gravar_muitos(user_lat, user_lon, pontos, novos, modo_cache)
+            calculados.update(novos)
+        
+        for id_ponto, resultado in calculados.items():
+            if resultado['distance_km'] is not None and resultado['duration_min'] is not None:
+                resultados[id_ponto] = dict(resultado, fonte_distancia=provedor.nome)
+        pendentes = [id_ponto for id_ponto in pendentes if id_ponto not in resultados]
+    return resultados
+
+
+def _chave_coalescencia(provedor, user_lat, user_lon, destinos):
+    """Chave de coalescência: provedor, origem quantizada (como no cache de rotas) e conjunto de destinos."""
+    resumo_destinos = hashlib.sha1(json.dumps(destinos).encode('utf-8')).hexdigest()
+    precisao = cache_rotas.precisao
+    return f"{provedor.nome}:{MODO_VIAGEM}|{user_lat:.{precisao}f},{user_lon:.{precisao}f}|{resumo_destinos}"
+
+
+def _calcular_coalescido(provedor, user_lat, user_lon, destinos):
+    """
+    Chama o provedor; chamadas simultâneas idênticas a provedores externos compartilham o resultado.
     
-    return results
+    A chave usa o conjunto de destinos (o pré-filtro pode ordenar os mesmos pontos
+    de formas diferentes para origens vizinhas); o resultado compartilhado guarda
+    os pares (destino, resultado) e volta na ordem de destinos de cada chamada.
+    """
+    if not provedor.usa_cache:
+        # Provedores locais (estimativa) são baratos: não vale coalescer
+        return provedor.calcular_distancias(user_lat, user_lon, destinos)
+    pares = coalescedor_rotas.executar(
+        _chave_coalescencia(provedor, user_lat, user_lon, sorted(set(destinos))),
+        lambda: list(zip(destinos, provedor.calcular_distancias(user_lat, user_lon, destinos)))
+    )
+    return _reordenar(pares, destinos)
+
+
+async def _calcular_coalescido_async(provedor, user_lat, user_lon, destinos):
+    """Versão assíncrona de _calcular_coalescido."""
+    if not provedor.usa_cache:
+        return await provedor.calcular_distancias_async(user_lat, user_lon, destinos)
+
+    async def calcular():
+        return list(zip(destinos, await provedor.calcular_distancias_async(user_lat, user_lon, destinos)))
+
+    pares = await coalescedor_rotas.executar_async(
+        _chave_coalescencia(provedor, user_lat, user_lon, sorted(set(destinos))), calcular
+    )
+    return _reordenar(pares, destinos)
 
 
+def _reordenar(pares, destinos):
+    """Resultados de pares (destino, resultado) na ordem de destinos (sem resultado: vazio)."""
+    # Pares vindos de outro processo chegam do JSON com o destino como lista
+    por_destino = {tuple(destino): resultado for destino, resultado in pares}
+    return [por_destino.get(tuple(destino), resultado_vazio()) for destino in destinos]
 
 
-def enriquecer_pontos_com_distancias(pontos, user_lat, user_lon):
+def _aplicar_distancias(pontos, resultados):
+    """Adiciona distance_km, duration_min e fonte_distancia (None sem resultado) a cada ponto."""
+    for id_ponto, ponto in pontos.items():
+        resultado = resultados.get(id_ponto, {})
+        ponto['distance_km'] = resultado.get('distance_km')
+        ponto['duration_min'] = resultado.get('duration_min')
+        ponto['fonte_distancia'] = resultado.get('fonte_distancia')
+    return pontos
+
+
+def enriquecer_pontos_com_distancias(pontos, user_lat, user_lon, roteamento=None):
     """
-    Adiciona distance_km e duration_min a cada ponto usando Google Routes API v2.
+    Adiciona distance_km, duration_min e fonte_distancia a cada ponto.
+    
+    Os provedores de rotas são tentados em ordem: os pontos que um provedor não
+    conseguir calcular (ou todos, se ele falhar ou não estiver configurado) passam
+    para o próximo. Resultados já presentes no cache de rotas não geram chamadas,
+    e consultas simultâneas com a mesma origem quantizada e os mesmos destinos
+    compartilham uma única chamada (coalescedor_rotas).
     
     Args:
         pontos: Dicionário de pontos {id: {latitude, longitude, ...}}
         user_lat: Latitude do usuário
         user_lon: Longitude do usuário
+        roteamento: Lista de nomes de provedores (padrão: ROTEAMENTO_PADRAO)
+    
+    Retorna:
+        Dicionário pontos atualizado com distance_km, duration_min e fonte_distancia
+    """
+    if not pontos or not user_lat or not user_lon:
+        return pontos
+    
+    cadeia = _cadeia_roteamento(pontos, user_lat, user_lon, roteamento)
+    try:
+        provedor, destinos = next(cadeia)
+        while True:
+            try:
+                calculados = _calcular_coalescido(provedor, user_lat, user_lon, destinos)
+            except ErroRoteamento as e:
+                provedor, destinos = cadeia.throw(e)
+            else:
+                provedor, destinos = cadeia.send(calculados)
+    except StopIteration as fim:
+        return _aplicar_distancias(pontos, fim.value)
+
+
+def _avancar_cadeia(metodo, valor=None):
+    """
+    Avança um gerador com send/throw sem deixar StopIteration escapar (que não
+    atravessa um Future, ex.: de asyncio.to_thread).
     
     Retorna:
-        Dicionário pontos atualizado com distance_km e duration_min adicionados
+        Tupla (terminou, valor produzido ou retornado)
+    """
+    try:
+        return False, metodo(valor)
+    except StopIteration as fim:
+        return True, fim.value
+
+
+async def enriquecer_pontos_com_distancias_async(pontos, user_lat, user_lon, roteamento=None):
+    """
+    Versão assíncrona de enriquecer_pontos_com_distancias: as chamadas aos
+    provedores são aguardadas (calcular_distancias_async) sem bloquear o event loop.
+    Com o cache de rotas em SQLite, os passos da cadeia (que consultam e gravam
+    o cache) rodam em uma thread (asyncio.to_thread), fora do event loop.
     """
     if not pontos or not user_lat or not user_lon:
         return pontos
     
-    # Extrair destinos como lista de tuplas (lat, lon)
-    destinations = [(ponto['latitude'], ponto['longitude']) for ponto in pontos.values()]
+    cadeia = _cadeia_roteamento(pontos, user_lat, user_lon, roteamento)
+    em_thread = cache_rotas.usa_disco
     
-    # Obter distâncias da API Google Routes v2
-    print(f"Chamando Google Routes API v2 para {len(destinations)} pontos...")
-    results = get_distances_from_google(user_lat, user_lon, destinations)
+    async def avancar(metodo, valor=None):
+        if em_thread:
+            return await asyncio.to_thread(_avancar_cadeia, metodo, valor)
+        return _avancar_cadeia(metodo, valor)
     
-    # Adicionar distância e duração a cada ponto
-    ponto_list = list(pontos.items())
-    for (id_ponto, ponto), result in zip(ponto_list, results):
-        ponto['distance_km'] = result['distance_km']
-        ponto['duration_min'] = result['duration_min']
+    terminou, passo = await avancar(cadeia.send)
+    while not terminou:
+        provedor, destinos = passo
+        try:
+            calculados = await _calcular_coalescido_async(provedor, user_lat, user_lon, destinos)
+        except ErroRoteamento as e:
+            terminou, passo = await avancar(cadeia.throw, e)
+        else:
+            terminou, passo = await avancar(cadeia.send, calculados)
+    return _aplicar_distancias(pontos, passo)
+
+
+class EstatisticasPrefiltro:
+    """
+    Contadores de qualidade do pré-filtro geométrico.
     
-    return pontos
+    Atributos:
+        consultas: Consultas top-n que passaram pelo pré-filtro
+        divergencias: Consultas cujo top-n final (por tempo de direção) tem pontos
+                      diferentes do top-n em linha reta
+        candidatos_roteados: Total de destinos enviados para roteamento
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.divergencias = 0
+        self.candidatos_roteados = 0
 
+    def registrar(self, top_reta, top_final, candidatos):
+        with self._lock:
+            self.consultas += 1
+            self.candidatos_roteados += candidatos
+            if set(top_reta) != set(top_final):
+                self.divergencias += 1
 
-def ler_pontos_por_tipo_lixo(tipos_lixo, user_lat=None, user_lon=None, n=None, csv_file="pontos-de-coleta.csv"):
+    def resumo(self):
+        """Retorna os contadores e a taxa de divergência como dicionário."""
+        with self._lock:
+            return {
+                'consultas': self.consultas,
+                'divergencias': self.divergencias,
+                'taxa_divergencia': self.divergencias / self.consultas if self.consultas else 0.0,
+                'candidatos_roteados': self.candidatos_roteados
+            }
+
+
+estatisticas_prefiltro = EstatisticasPrefiltro()
+
+
+def prefiltrar_por_distancia_reta(dados, tipos_lixo, modo, user_lat, user_lon, limite):
+    """
+    Seleciona os pontos mais próximos do usuário em linha reta (haversine),
+    usando a grade espacial combinada com o filtro de tipos.
+    
+    Args:
+        dados: DadosPontos do repositório
+        tipos_lixo: Tipos de lixo já normalizados
+        modo: "todos" ou "qualquer"
+        user_lat: Latitude do usuário
+        user_lon: Longitude do usuário
+        limite: Quantidade máxima de pontos a manter
+        
+    Retorna:
+        Lista de até `limite` visões Ponto, do mais próximo para o mais distante
+    """
+    permitido = dados.filtro_tipos(tipos_lixo, modo)
+    vizinhos = dados.grade.k_mais_proximos(user_lat, user_lon, limite, permitido)
+    return dados.pontos(posicao for _, posicao in vizinhos)
+
+
+def ler_pontos_por_tipo_lixo(tipos_lixo, user_lat=None, user_lon=None, n=None, csv_file="pontos-de-coleta.csv",
+                             modo=MODO_TODOS, fator_prefiltro=None, roteamento=None):
     """
     Filtra pontos de coleta pelos tipos de lixo especificados.
     Opcionalmente, calcula distância e tempo de direção do usuário e retorna os N mais próximos.
@@ -175,43 +536,41 @@ def ler_pontos_por_tipo_lixo(tipos_lixo, user_lat=None, user_lon=None, n=None, c
         user_lon: Longitude do usuário (opcional, para calcular proximidade)
         n: Número de pontos mais próximos a retornar (opcional)
         csv_file: Caminho do arquivo CSV
+        modo: "todos" (padrão) exige todos os tipos no ponto;
+              "qualquer" aceita pontos com pelo menos um dos tipos
+        fator_prefiltro: Com lat/lon e n, só os n * fator pontos mais próximos em
+                         linha reta são roteados (padrão: FATOR_PREFILTRO)
+        roteamento: Cadeia de provedores de rotas, ex.: ["osrm", "estimativa"]
+                    (padrão: ROTEAMENTO_PADRAO)
         
     Retorna:
         Dicionário com pontos de coleta filtrados, chaveado por ID
         Se user_lat/user_lon fornecidos: inclui distance_km e duration_min
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer" ou se o roteamento
+                    tiver provedor desconhecido
     """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    resolver_provedores(roteamento)
+
     if not tipos_lixo:
         return {}
     
-    # Limpar e normalizar os tipos de lixo da entrada
-    tipos_lixo_normalizados = [t.strip().lower() for t in tipos_lixo]
-    
-    pontos = {}
     try:
-        with open(csv_file, newline='', encoding='utf-8') as arquivo:
-            leitor = csv.DictReader(arquivo, skipinitialspace=True)
-            for row in leitor:
-                if row['tipo_lixo']:
-                    # Dividir os tipos pelo separador \,
-                    tipos_do_ponto = [t.strip().lower() for t in row['tipo_lixo'].split(r"\,")]
-                    
-                    # Verificar se todos os tipos solicitados estão presentes no ponto
-                    if all(t in tipos_do_ponto for t in tipos_lixo_normalizados):
-                        pontos[row['id']] = {
-                            'id': row['id'],
-                            'nome': row['nome'],
-                            'tipo_lixo': row['tipo_lixo'],
-                            'latitude': float(row['latitude']),
-                            'longitude': float(row['longitude']),
-                            'endereco': row['endereco']
-                        }
+        pontos, candidatos, prefiltrado = _candidatos_por_tipo(tipos_lixo, user_lat, user_lon, n, csv_file,
+                                                               modo, fator_prefiltro)
+
         # Se user_lat e user_lon forem fornecidos, enriquecer com distâncias do Google API
         if user_lat and user_lon:
-            pontos = enriquecer_pontos_com_distancias(pontos, user_lat, user_lon)
+            with duracao_etapas.cronometrar(etapa="roteamento"):
+                pontos = enriquecer_pontos_com_distancias(pontos, user_lat, user_lon, roteamento)
         
         # Ordenar pelos N mais próximos se solicitado
-        if user_lat and user_lon and n:
-            pontos = pontos_mais_proximos(pontos, n)
+        if prefiltrado:
+            with duracao_etapas.cronometrar(etapa="ordenacao"):
+                pontos = _selecionar_top_n(pontos, candidatos, n)
                         
     except FileNotFoundError:
         raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
@@ -220,9 +579,618 @@ def ler_pontos_por_tipo_lixo(tipos_lixo, user_lat=None, user_lon=None, n=None, c
     
     return pontos
 
+
+async def ler_pontos_por_tipo_lixo_async(tipos_lixo, user_lat=None, user_lon=None, n=None,
+                                         csv_file="pontos-de-coleta.csv", modo=MODO_TODOS,
+                                         fator_prefiltro=None, roteamento=None):
+    """
+    Versão assíncrona de ler_pontos_por_tipo_lixo, para o servidor ASGI (app_async.py).
+    
+    O filtro e o pré-filtro em memória rodam direto no event loop (são rápidos);
+    só o roteamento é aguardado, de modo que um worker atende muitas consultas
+    por proximidade ao mesmo tempo enquanto os provedores respondem.
+    
+    Args e Retorna: iguais a ler_pontos_por_tipo_lixo
+    """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    resolver_provedores(roteamento)
+
+    if not tipos_lixo:
+        return {}
+    
+    try:
+        pontos, candidatos, prefiltrado = _candidatos_por_tipo(tipos_lixo, user_lat, user_lon, n, csv_file,
+                                                               modo, fator_prefiltro)
+        if user_lat and user_lon:
+            with duracao_etapas.cronometrar(etapa="roteamento"):
+                pontos = await enriquecer_pontos_com_distancias_async(pontos, user_lat, user_lon, roteamento)
+        if prefiltrado:
+            with duracao_etapas.cronometrar(etapa="ordenacao"):
+                pontos = _selecionar_top_n(pontos, candidatos, n)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
+    except Exception as e:
+        raise Exception(f"Erro ao ler arquivo CSV: {str(e)}")
+    
+    return pontos
+
+
+def _candidatos_por_tipo(tipos_lixo, user_lat, user_lon, n, csv_file, modo, fator_prefiltro):
+    """
+    Filtra os pontos pelos tipos e, com lat/lon e n, aplica o pré-filtro geométrico.
+    
+    Retorna:
+        Tupla (pontos {id: dict}, candidatos em ordem de distância reta, prefiltrado)
+    """
+    # Limpar e normalizar os tipos de lixo da entrada
+    tipos_lixo_normalizados = [t.strip().lower() for t in tipos_lixo]
+    
+    with duracao_etapas.cronometrar(etapa="carga"):
+        dados = obter_repositorio(csv_file).dados()
+
+    with duracao_etapas.cronometrar(etapa="filtro"):
+        # Interseção (todos) ou união (qualquer) dos bitsets do índice de tipos;
+        # pré-filtro geométrico: rotear apenas os n * fator candidatos mais próximos em linha reta
+        prefiltrado = bool(user_lat and user_lon and n)
+        if prefiltrado:
+            fator = FATOR_PREFILTRO if fator_prefiltro is None else fator_prefiltro
+            limite = max(n, math.ceil(n * fator))
+            candidatos = prefiltrar_por_distancia_reta(dados, tipos_lixo_normalizados, modo,
+                                                       user_lat, user_lon, limite)
+        else:
+            candidatos = dados.filtrar_por_tipos(tipos_lixo_normalizados, modo)
+
+        # Dicionários só na fronteira da resposta
+        pontos = {ponto.id: ponto.para_dict() for ponto in candidatos}
+    return pontos, candidatos, prefiltrado
+
+
+def _validar_consulta_lote(consulta):
+    """
+    Valida uma consulta do lote.
+    
+    Retorna:
+        Tupla (lat, lon, tipos normalizados e ordenados, n)
+    
+    Lança:
+        ValueError: com a mensagem devolvida para a consulta
+    """
+    if not isinstance(consulta, dict):
+        raise ValueError("Consulta deve ser um objeto com lat, lon, tipos e n")
+    try:
+        lat, lon = float(consulta['lat']), float(consulta['lon'])
+    except KeyError as e:
+        raise ValueError(f"Campo obrigatório ausente: {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("lat e lon devem ser números")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon fora do intervalo válido")
+    tipos = consulta.get('tipos') or []
+    if isinstance(tipos, str):
+        tipos = tipos.split(',')
+    if not isinstance(tipos, list) or not all(isinstance(t, str) for t in tipos):
+        raise ValueError("tipos deve ser uma lista de textos")
+    n = consulta.get('n', 5)
+    if isinstance(n, bool) or not isinstance(n, int) or n < 1:
+        raise ValueError("n deve ser um inteiro maior que zero")
+    return lat, lon, tuple(sorted({t.strip().lower() for t in tipos if t.strip()})), n
+
+
+def _agrupar_para_matriz(faltando, origens):
+    """
+    Agrupa consultas em matrizes origens x destinos para o provedor de rotas.
+    
+    As consultas são percorridas em ordem geográfica (vizinhas costumam ter os
+    mesmos candidatos) e entram na matriz atual enquanto pelo menos
+    EFICIENCIA_MINIMA_MATRIZ dos elementos pedidos forem úteis.
+    
+    Args:
+        faltando: Dicionário {indice: [ids de destino]} das consultas a rotear
+        origens: Dicionário {indice: (lat, lon)}
+    
+    Retorna:
+        Lista de grupos (listas de índices de consulta)
+    """
+    ordem = sorted(faltando, key=lambda i: (round(origens[i][0], 2), origens[i][1]))
+    grupos = []
+    atual, uniao, uteis, linhas = [], set(), 0, set()
+    for indice in ordem:
+        ids = faltando[indice]
+        nova_uniao = uniao | set(ids)
+        novas_linhas = linhas | {origens[indice]}
+        if atual and uteis + len(ids) < EFICIENCIA_MINIMA_MATRIZ * len(novas_linhas) * len(nova_uniao):
+            grupos.append(atual)
+            atual, uteis = [], 0
+            nova_uniao, novas_linhas = set(ids), {origens[indice]}
+        atual.append(indice)
+        uniao, linhas = nova_uniao, novas_linhas
+        uteis += len(ids)
+    if atual:
+        grupos.append(atual)
+    return grupos
+
+
+def _rotear_em_lote(pontos_por_consulta, origens, roteamento):
+    """
+    Percorre a cadeia de provedores de rotas para várias consultas de uma vez.
+    
+    Como na cadeia de uma consulta (_cadeia_roteamento), cada provedor recebe só os
+    pontos ainda sem resultado, e a tabela pré-calculada e o cache de rotas são
+    consultados por origem (o cache também é alimentado); as chamadas de cada
+    provedor, porém, são matrizes com várias origens (uma chamada por grupo de
+    _agrupar_para_matriz).
+    
+    Args:
+        pontos_por_consulta: Dicionário {indice: {id: ponto}}
+        origens: Dicionário {indice: (lat, lon)}
+        roteamento: Lista de nomes de provedores (padrão: ROTEAMENTO_PADRAO)
+    
+    Retorna:
+        Dicionário {indice: {id: {distance_km, duration_min, fonte_distancia}}}
+    """
+    resultados = {indice: {} for indice in pontos_por_consulta}
+    pendentes = {indice: list(pontos) for indice, pontos in pontos_por_consulta.items()}
+    for provedor in resolver_provedores(roteamento):
+        if not any(pendentes.values()):
+            break
+        if not provedor.disponivel():
+            continue
+        
+        modo_cache = f"{provedor.nome}:{MODO_VIAGEM}"
+        calculados, faltando = {}, {}
+        for indice, ids in pendentes.items():
+            if not ids:
+                continue
+            calculados[indice] = {}
+            if provedor.usa_cache:
+                calculados[indice] = _resultados_conhecidos(provedor, *origens[indice], pontos_por_consulta[indice],
+                                                            ids, modo_cache)
+            faltam = [id_ponto for id_ponto in ids if id_ponto not in calculados[indice]]
+            if faltam:
+                faltando[indice] = faltam
+        
+        for grupo in _agrupar_para_matriz(faltando, origens):
+            linhas = list(dict.fromkeys(origens[indice] for indice in grupo))
+            colunas = {}
+            for indice in grupo:
+                for id_ponto in faltando[indice]:
+                    ponto = pontos_por_consulta[indice][id_ponto]
+                    colunas.setdefault(id_ponto, (len(colunas), (ponto['latitude'], ponto['longitude'])))
+            destinos = [coordenadas for _, coordenadas in colunas.values()]
+            logger.debug("Calculando matriz de rotas (%s): %d origens x %d destinos para %d consultas",
+                         provedor.nome, len(linhas), len(destinos), len(grupo))
+            chamadas_rotas.inc(provedor=provedor.nome)
+            try:
+                matriz = provedor.calcular_matriz(linhas, destinos)
+            except ErroRoteamento as e:
+                erros_rotas.inc(provedor=provedor.nome, tipo="falha")
+                logger.warning("Provedor de rotas %s falhou: %s", provedor.nome, e)
+                continue
+            
+            posicao_linha = {origem: posicao for posicao, origem in enumerate(linhas)}
+            for indice in grupo:
+                linha = matriz[posicao_linha[origens[indice]]]
+                novos = {id_ponto: linha[colunas[id_ponto][0]] for id_ponto in faltando[indice]}
+                if provedor.usa_cache:
+                    cache_rotas.gravar_muitos(*origens[indice], pontos_por_consulta[indice], novos, modo_cache)
+                calculados[indice].update(novos)
+        
+        for indice, calculados_consulta in calculados.items():
+            for id_ponto, resultado in calculados_consulta.items():
+                if resultado['distance_km'] is not None and resultado['duration_min'] is not None:
+                    resultados[indice][id_ponto] = dict(resultado, fonte_distancia=provedor.nome)
+            pendentes[indice] = [id_ponto for id_ponto in pendentes[indice] if id_ponto not in resultados[indice]]
+    return resultados
+
+
+def ler_pontos_proximos_em_lote(consultas, modo=MODO_TODOS, roteamento=None, fator_prefiltro=None,
+                                csv_file="pontos-de-coleta.csv"):
+    """
+    Responde muitas consultas de proximidade (origem, tipos, n) de uma vez.
+    
+    Consultas com os mesmos tipos compartilham um único filtro de tipos e um
+    único cálculo vetorizado de distâncias em linha reta (pré-filtro de todas as
+    origens do grupo); o roteamento dos candidatos de todas as consultas é
+    agrupado em poucas chamadas de matriz (muitas origens x muitos destinos).
+    
+    Args:
+        consultas: Lista de dicionários {lat, lon, tipos, n}; tipos é uma lista
+                   (ou texto separado por vírgulas; vazio aceita qualquer ponto) e
+                   n tem padrão 5
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        roteamento: Cadeia de provedores de rotas (padrão: ROTEAMENTO_PADRAO)
+        fator_prefiltro: Candidatos roteados por consulta = n * fator (padrão: FATOR_PREFILTRO)
+        csv_file: Caminho do arquivo CSV
+    
+    Retorna:
+        Lista na ordem de consultas: {"pontos": {id: ponto com distance_km,
+        duration_min e fonte_distancia}} ou {"erro": mensagem} para consultas inválidas
+    
+    Lança:
+        ValueError: se o modo ou o roteamento forem inválidos, ou houver mais de
+                    MAX_CONSULTAS_LOTE consultas
+    """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    resolver_provedores(roteamento)
+    if len(consultas) > MAX_CONSULTAS_LOTE:
+        raise ValueError(f"Máximo de {MAX_CONSULTAS_LOTE} consultas por lote")
+    
+    resultados = [None] * len(consultas)
+    grupos = {}
+    for indice, consulta in enumerate(consultas):
+        try:
+            lat, lon, tipos, n = _validar_consulta_lote(consulta)
+        except ValueError as e:
+            resultados[indice] = {'erro': str(e)}
+            continue
+        grupos.setdefault(tipos, []).append((indice, lat, lon, n))
+    if not grupos:
+        return resultados
+    
+    fator = FATOR_PREFILTRO if fator_prefiltro is None else fator_prefiltro
+    try:
+        with duracao_etapas.cronometrar(etapa="carga"):
+            dados = obter_repositorio(csv_file).dados()
+        
+        candidatos, pontos_por_consulta, origens, quantidades = {}, {}, {}, {}
+        with duracao_etapas.cronometrar(etapa="filtro"):
+            for tipos, membros in grupos.items():
+                selecao = dados.selecao_tipos(list(tipos), modo)
+                limites = [max(n, math.ceil(n * fator)) for _, _, _, n in membros]
+                _, posicoes = dados.distancias().k_mais_proximos(
+                    [lat for _, lat, _, _ in membros], [lon for _, _, lon, _ in membros], max(limites), selecao
+                )
+                for (indice, lat, lon, n), limite, linha in zip(membros, limites, posicoes):
+                    candidatos[indice] = dados.pontos(linha[:limite].tolist())
+                    pontos_por_consulta[indice] = {ponto.id: ponto.para_dict() for ponto in candidatos[indice]}
+                    origens[indice] = (lat, lon)
+                    quantidades[indice] = n
+        
+        with duracao_etapas.cronometrar(etapa="roteamento"):
+            distancias = _rotear_em_lote(pontos_por_consulta, origens, roteamento)
+        
+        with duracao_etapas.cronometrar(etapa="ordenacao"):
+            for indice, pontos in pontos_por_consulta.items():
+                _aplicar_distancias(pontos, distancias[indice])
+                resultados[indice] = {
+                    'pontos': _selecionar_top_n(pontos, candidatos[indice], quantidades[indice])
+                }
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
+    except Exception as e:
+        raise Exception(f"Erro ao ler arquivo CSV: {str(e)}")
+    
+    return resultados
+
+
+def _selecionar_top_n(pontos, candidatos, n):
+    """Mantém os n pontos mais próximos por tempo de direção e registra a divergência do pré-filtro."""
+    roteados = len(pontos)
+    pontos = pontos_mais_proximos(pontos, n)
+    top_reta = [ponto.id for ponto in candidatos[:n]]
+    estatisticas_prefiltro.registrar(top_reta, list(pontos), roteados)
+    return pontos
+
+
+def buscar_pontos_proximos(lat, lon, k, tipos_lixo=None, modo=MODO_TODOS, csv_file="pontos-de-coleta.csv"):
+    """
+    Busca os K pontos mais próximos em linha reta usando o índice espacial.
+    Não chama nenhuma API externa.
+    
+    Args:
+        lat: Latitude da origem
+        lon: Longitude da origem
+        k: Número de vizinhos a retornar
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Dicionário com até K pontos, do mais próximo para o mais distante,
+        cada um com distancia_reta_km
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer"
+    """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    
+    tipos_lixo_normalizados = [t.strip().lower() for t in tipos_lixo or []]
+    
+    try:
+        dados = obter_repositorio(csv_file).dados()
+        permitido = dados.filtro_tipos(tipos_lixo_normalizados, modo)
+        pontos = {}
+        for distancia, posicao in dados.grade.k_mais_proximos(lat, lon, k, permitido):
+            ponto = dados.ponto(posicao).para_dict()
+            ponto['distancia_reta_km'] = distancia
+            pontos[ponto['id']] = ponto
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
+    except Exception as e:
+        raise Exception(f"Erro ao ler arquivo CSV: {str(e)}")
+    
+    return pontos
+
+
+def codificar_cursor(assinatura, posicao):
+    """
+    Gera o cursor opaco de paginação: assinatura dos dados + posição do último
+    registro entregue.
+    """
+    return base64.urlsafe_b64encode(f"{assinatura}:{posicao}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """
+    Lê um cursor gerado por codificar_cursor.
+    
+    Retorna:
+        Tupla (assinatura, posicao)
+    
+    Lança:
+        ValueError: se o cursor for inválido
+    """
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        assinatura, posicao = texto.rsplit(":", 1)
+        return assinatura, int(posicao)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor de paginação inválido")
+
+
+def _filtrar_posicoes(tipos_lixo, modo, caixa, csv_file):
+    """
+    Resolve o filtro de tipos (e retângulo, se houver) em posições do repositório.
+    
+    Retorna:
+        Tupla (dados, posicoes): snapshot DadosPontos e sequência crescente de posições
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer"
+    """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    
+    tipos_lixo_normalizados = [t.strip().lower() for t in tipos_lixo or []]
+    
+    try:
+        dados = obter_repositorio(csv_file).dados()
+        if caixa is not None:
+            permitido = dados.filtro_tipos(tipos_lixo_normalizados, modo)
+            posicoes = dados.grade.na_caixa(*caixa, permitido)
+        else:
+            posicoes = dados.posicoes(tipos_lixo_normalizados, modo)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
+    except Exception as e:
+        raise Exception(f"Erro ao ler arquivo CSV: {str(e)}")
+    return dados, posicoes
+
+
+def consultar_pontos(tipos_lixo=None, modo=MODO_TODOS, limite=None, deslocamento=0, cursor=None,
+                     caixa=None, csv_file="pontos-de-coleta.csv"):
+    """
+    Consulta paginada de pontos (sem proximidade), na ordem do CSV.
+    
+    O filtro é resolvido sobre posições (bitsets do índice de tipos e grade espacial)
+    e apenas os registros da página pedida são convertidos em dicionários.
+    
+    Args:
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional; sem tipos = todos)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        limite: Tamanho da página (None = todos os pontos restantes)
+        deslocamento: Quantidade de pontos a pular (ignorado quando há cursor)
+        cursor: Cursor retornado pela página anterior (opcional)
+        caixa: Retângulo (min_lat, min_lon, max_lat, max_lon) para filtrar (opcional)
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Dicionário com "pontos" (lista da página), "total" (pontos que atendem ao filtro)
+        e "proximo_cursor" (None na última página)
+    
+    Lança:
+        ValueError: se o modo ou o cursor forem inválidos, ou se o cursor
+                    for de uma versão anterior dos dados
+    """
+    if deslocamento < 0 or (limite is not None and limite < 0):
+        raise ValueError("Paginação inválida: limite e deslocamento devem ser positivos")
+    posicao_cursor = None
+    if cursor:
+        assinatura_cursor, posicao_cursor = decodificar_cursor(cursor)
+    
+    dados, posicoes = _filtrar_posicoes(tipos_lixo, modo, caixa, csv_file)
+    
+    if posicao_cursor is not None:
+        if assinatura_cursor != dados.assinatura:
+            raise ValueError("Cursor expirado: os dados foram atualizados, recomece a paginação")
+        deslocamento = bisect.bisect_right(posicoes, posicao_cursor)
+    
+    fim = len(posicoes) if limite is None else min(len(posicoes), deslocamento + limite)
+    pagina = posicoes[deslocamento:fim]
+    proximo_cursor = None
+    if fim < len(posicoes) and len(pagina):
+        proximo_cursor = codificar_cursor(dados.assinatura, pagina[-1])
+    
+    return {
+        'pontos': [ponto.para_dict() for ponto in dados.pontos(pagina)],
+        'total': len(posicoes),
+        'proximo_cursor': proximo_cursor
+    }
+
+
+def pontos_geojson(tipos_lixo=None, modo=MODO_TODOS, caixa=None, zoom=None, precisao=None,
+                   csv_file="pontos-de-coleta.csv"):
+    """
+    Monta uma FeatureCollection GeoJSON com os pontos do filtro.
+    
+    Com zoom abaixo de ZOOM_SEM_AGRUPAMENTO, pontos que ficariam a menos de
+    TAMANHO_GRUPO_PX pixels uns dos outros na tela são agrupados no servidor:
+    cada grupo vira uma única feature no centróide, com "cluster": true e a
+    quantidade de pontos. Pontos isolados trazem id, nome, tipo_lixo e endereco.
+    
+    Args:
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional; sem tipos = todos)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        caixa: Retângulo (min_lat, min_lon, max_lat, max_lon) visível (opcional)
+        zoom: Nível de zoom do mapa (None = sem agrupamento)
+        precisao: Casas decimais das coordenadas (None = sem arredondamento)
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Dicionário FeatureCollection, com "total" = número de pontos (não de features)
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer"
+    """
+    dados, posicoes = _filtrar_posicoes(tipos_lixo, modo, caixa, csv_file)
+    latitudes, longitudes, textos = dados.latitudes, dados.longitudes, dados.textos
+    
+    def coordenada(valor):
+        return valor if precisao is None else round(valor, precisao)
+    
+    if zoom is not None and zoom < ZOOM_SEM_AGRUPAMENTO:
+        grupos = agrupar_por_pixels(dados.grade.coordenadas, posicoes, zoom)
+    else:
+        grupos = [[posicao] for posicao in posicoes]
+    
+    features = []
+    for grupo in grupos:
+        if len(grupo) == 1:
+            posicao = grupo[0]
+            lat, lon = latitudes[posicao], longitudes[posicao]
+            propriedades = {
+                'id': textos[dados.ids[posicao]],
+                'nome': textos[dados.nomes[posicao]],
+                'tipo_lixo': textos[dados.tipos_lixo[posicao]],
+                'endereco': textos[dados.enderecos[posicao]]
+            }
+        else:
+            lat = sum(latitudes[posicao] for posicao in grupo) / len(grupo)
+            lon = sum(longitudes[posicao] for posicao in grupo) / len(grupo)
+            propriedades = {'cluster': True, 'quantidade': len(grupo)}
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [coordenada(lon), coordenada(lat)]},
+            'properties': propriedades
+        })
+    
+    return {'type': 'FeatureCollection', 'total': len(posicoes), 'features': features}
+
+
+def buscar_pontos_proximos_em_lote(origens, k, tipos_lixo=None, modo=MODO_TODOS,
+                                   csv_file="pontos-de-coleta.csv"):
+    """
+    Busca os K pontos mais próximos em linha reta de muitas origens de uma vez
+    (cálculo vetorizado sobre todos os pontos do filtro, sem API externa).
+    
+    Args:
+        origens: Sequência de tuplas (lat, lon)
+        k: Número de vizinhos por origem
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Lista (uma por origem, na mesma ordem) de listas de tuplas (id, distancia_km),
+        do mais próximo para o mais distante
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer"
+    """
+    if modo not in (MODO_TODOS, MODO_QUALQUER):
+        raise ValueError(f"Modo de filtro inválido: {modo}")
+    if not len(origens):
+        return []
+    
+    tipos_lixo_normalizados = [t.strip().lower() for t in tipos_lixo or []]
+    
+    try:
+        dados = obter_repositorio(csv_file).dados()
+        selecao = dados.selecao_tipos(tipos_lixo_normalizados, modo)
+        coordenadas = np.asarray(origens, dtype=np.float64).reshape(-1, 2)
+        distancias, posicoes = dados.distancias().k_mais_proximos(coordenadas[:, 0], coordenadas[:, 1], k, selecao)
+        textos, ids = dados.textos, dados.ids
+        return [
+            [(textos[ids[posicao]], distancia) for distancia, posicao in zip(linha_d.tolist(), linha_p.tolist())]
+            for linha_d, linha_p in zip(distancias, posicoes)
+        ]
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
+    except Exception as e:
+        raise Exception(f"Erro ao ler arquivo CSV: {str(e)}")
+
+
+def exportar_pontos(tipos_lixo=None, modo=MODO_TODOS, formato=FORMATO_NDJSON, csv_file="pontos-de-coleta.csv"):
+    """
+    Prepara a exportação completa dos pontos do filtro como um fluxo de bytes.
+    
+    O filtro é resolvido na chamada (erros aparecem antes de a resposta
+    começar); os pontos são serializados depois, em blocos de
+    PONTOS_POR_BLOCO_EXPORTACAO, sem montar a lista completa em memória.
+    
+    Args:
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional; sem tipos = todos)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        formato: "ndjson" (um ponto JSON por linha) ou "json" (array JSON)
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Tupla (assinatura dos dados, gerador de bytes UTF-8)
+    
+    Lança:
+        ValueError: se o modo ou o formato forem inválidos
+    """
+    if formato not in (FORMATO_NDJSON, FORMATO_JSON):
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    dados, posicoes = _filtrar_posicoes(tipos_lixo, modo, None, csv_file)
+    
+    def partes():
+        ndjson = formato == FORMATO_NDJSON
+        if not ndjson:
+            yield b"["
+        for inicio in range(0, len(posicoes), PONTOS_POR_BLOCO_EXPORTACAO):
+            bloco = [json.dumps(ponto.para_dict(), ensure_ascii=False)
+                     for ponto in dados.pontos(posicoes[inicio:inicio + PONTOS_POR_BLOCO_EXPORTACAO])]
+            if ndjson:
+                yield ("\n".join(bloco) + "\n").encode("utf-8")
+            else:
+                yield (("," if inicio else "") + ",".join(bloco)).encode("utf-8")
+        if not ndjson:
+            yield b"]"
+    
+    return dados.assinatura, partes()
+
+
+def ler_pontos_na_area(min_lat, min_lon, max_lat, max_lon, tipos_lixo=None, modo=MODO_TODOS,
+                       csv_file="pontos-de-coleta.csv"):
+    """
+    Retorna os pontos dentro de um retângulo (bounding box) usando o índice espacial.
+    
+    Args:
+        min_lat, min_lon, max_lat, max_lon: Limites do retângulo
+        tipos_lixo: Lista de tipos de lixo para filtrar (opcional)
+        modo: "todos" (padrão) ou "qualquer" para combinar os tipos
+        csv_file: Caminho do arquivo CSV
+        
+    Retorna:
+        Dicionário com os pontos da área, chaveado por ID, na ordem do CSV
+    
+    Lança:
+        ValueError: se o modo não for "todos" nem "qualquer"
+    """
+    resultado = consultar_pontos(tipos_lixo, modo, caixa=(min_lat, min_lon, max_lat, max_lon), csv_file=csv_file)
+    return {ponto['id']: ponto for ponto in resultado['pontos']}
+
+
 def pontos_mais_proximos(pontos, n):
     """
-    Ordena pontos pelo tempo de direção (quando disponível) e retorna os N mais próximos.
+    Seleciona os N pontos com menor tempo de direção (quando disponível).
+    
+    Usa seleção parcial com heap (O(m log n)) em vez de ordenar todos os pontos;
+    pontos sem duration_min ficam por último, mantendo a ordem de entrada.
     
     Args:
         pontos: Dicionário de pontos com duração calculada
@@ -234,33 +1202,17 @@ def pontos_mais_proximos(pontos, n):
     if not pontos or n <= 0:
         return {}
     
-    def ordem_dist(tupla):
+    def ordem_dist(id_ponto):
         # Se duration_min for None, colocar no final (infinito)
-        duration = tupla[1]
+        duration = pontos[id_ponto].get('duration_min')
         return duration if duration is not None else float('inf')
     
-    def pontos_ordenados(pontos, n):
-        pontos_ordem = []
-        for id in pontos:
-            dist_ponto = (id, pontos[id].get('duration_min', float('inf')))
-            pontos_ordem.append(dist_ponto)
-        pontos_ordem.sort(key=ordem_dist)
-        if len(pontos_ordem) < n:
-            return pontos_ordem
-        return pontos_ordem[:n]
-                        
-    def refinar_pontos(pontos, pontos_ordenados):
-        pontos_refinados = {}
-        for tupla in pontos_ordenados:
-            id_ponto = tupla[0]
-            pontos_refinados[id_ponto] = pontos[id_ponto]
-        return pontos_refinados
-    return refinar_pontos(pontos, pontos_ordenados(pontos, n))
+    return {id_ponto: pontos[id_ponto] for id_ponto in heapq.nsmallest(n, pontos, key=ordem_dist)}
 
 
 def ler_todos_pontos(csv_file="pontos-de-coleta.csv"):
     """
-    Lê todos os pontos do CSV sem filtros.
+    Lê todos os pontos sem filtros (a partir do repositório em memória).
     
     Args:
         csv_file: Caminho do arquivo CSV
@@ -268,20 +1220,9 @@ def ler_todos_pontos(csv_file="pontos-de-coleta.csv"):
     Retorna:
         Dicionário com todos os pontos, chaveado por ID
     """
-    pontos = {}
     try:
-        with open(csv_file, newline='', encoding='utf-8') as arquivo:
-            leitor = csv.DictReader(arquivo, skipinitialspace=True)
-            for row in leitor:
-                if row['tipo_lixo']:
-                    pontos[row['id']] = {
-                        'id': row['id'],
-                        'nome': row['nome'],
-                        'tipo_lixo': row['tipo_lixo'],
-                        'latitude': float(row['latitude']),
-                        'longitude': float(row['longitude']),
-                        'endereco': row['endereco']
-                    }
+        dados = obter_repositorio(csv_file).dados()
+        pontos = {ponto.id: ponto.para_dict() for ponto in dados.pontos(range(len(dados)))}
     except FileNotFoundError:
         raise FileNotFoundError(f"Arquivo CSV não encontrado: {csv_file}")
     except Exception as e:
@@ -0,0 +1,178 @@
+"""
+Teste de carga: caminho síncrono (app.py) x assíncrono (app_async.py) para
+consultas por proximidade, com a Routes API substituída por um servidor
+local lento (ServidorRotasFalso).
+
+O modo síncrono roda o app Flask em um servidor WSGI com um número fixo de
+threads (como um worker do gunicorn com --threads); o assíncrono roda a
+aplicação ASGI no uvicorn, com um único worker. Os clientes trabalham em
+laço fechado (cada um envia a próxima requisição ao receber a resposta) e
+cada requisição usa uma origem diferente, para não medir os caches.
+
+Uso:
+    python comparar_async.py [--latencia 0.5] [--clientes 32] [--duracao 10] [--threads 8] [--json]
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import app
+import app_async
+import coleta_service
+from registro import configurar_registro
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class _HandlerSilencioso(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ServidorWSGILimitado(BaseWSGIServer):
+    """Servidor WSGI do werkzeug que atende as conexões em um pool fixo de threads."""
+
+    def __init__(self, host, port, aplicacao, threads):
+        super().__init__(host, port, aplicacao, handler=_HandlerSilencioso)
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+@contextlib.contextmanager
+def servidor_sincrono(threads):
+    """Sobe app.py em um ServidorWSGILimitado; produz a porta."""
+    servidor = ServidorWSGILimitado('127.0.0.1', 0, app.app, threads)
+    thread = threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield servidor.server_address[1]
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@contextlib.contextmanager
+def servidor_assincrono():
+    """Sobe app_async.py no uvicorn (um worker); produz a porta."""
+    soquete = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    soquete.bind(('127.0.0.1', 0))
+    servidor = uvicorn.Server(uvicorn.Config(app_async.aplicacao, log_level='warning', lifespan='on'))
+    thread = threading.Thread(target=servidor.run, kwargs={'sockets': [soquete]}, daemon=True)
+    thread.start()
+    while not servidor.started:
+        time.sleep(0.01)
+    try:
+        yield soquete.getsockname()[1]
+    finally:
+        servidor.should_exit = True
+        thread.join()
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) de uma lista já ordenada."""
+    if not valores:
+        return None
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def gerar_carga(porta, clientes, duracao):
+    """
+    Executa `clientes` laços fechados durante `duracao` segundos.
+
+    Retorna:
+        Dicionário com requisições, erros, requisições/s e latências p50/p95/p99 (ms)
+    """
+    latencias, erros = [], []
+    fim = time.monotonic() + duracao
+    gerador = random.Random(42)
+    lock = threading.Lock()
+
+    def cliente():
+        while time.monotonic() < fim:
+            with lock:
+                lat, lon = gerador.uniform(-15.9, -15.7), gerador.uniform(-48.0, -47.8)
+            caminho = f'/api/coleta-pontos?tipos=pilhas&lat={lat:.4f}&lon={lon:.4f}&n=3&roteamento=google'
+            inicio = time.monotonic()
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=60)
+            try:
+                conexao.request('GET', caminho)
+                resposta = conexao.getresponse()
+                resposta.read()
+                ok = resposta.status == 200
+            except OSError:
+                ok = False
+            finally:
+                conexao.close()
+            with lock:
+                (latencias if ok else erros).append(time.monotonic() - inicio)
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.monotonic() - inicio
+
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias) + len(erros),
+        'erros': len(erros),
+        'requisicoes_por_s': round(len(latencias) / decorrido, 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1) if latencias else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara os caminhos síncrono e assíncrono sob carga')
+    parser.add_argument('--latencia', type=float, default=0.5, help='latência do upstream de rotas (s)')
+    parser.add_argument('--clientes', type=int, default=32, help='clientes simultâneos')
+    parser.add_argument('--duracao', type=float, default=10, help='duração de cada rodada (s)')
+    parser.add_argument('--threads', type=int, default=8, help='threads do servidor síncrono')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado em JSON')
+    args = parser.parse_args()
+    # Os registros por requisição (app e httpx) não se misturam ao relatório, salvo com LOG_NIVEL
+    configurar_registro(nivel=os.getenv("LOG_NIVEL", "WARNING"))
+
+    resultados = {}
+    with ServidorRotasFalso(latencia=args.latencia) as upstream:
+        coleta_service.GOOGLE_API_KEY = 'chave-carga'
+        coleta_service.GOOGLE_ROUTES_URL = upstream.url
+        with servidor_sincrono(args.threads) as porta:
+            resultados[f'sincrono ({args.threads} threads)'] = gerar_carga(porta, args.clientes, args.duracao)
+        with servidor_assincrono() as porta:
+            resultados['assincrono (uvicorn, 1 worker)'] = gerar_carga(porta, args.clientes, args.duracao)
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+    print(f"Upstream: {args.latencia:.2f} s por requisição | {args.clientes} clientes | {args.duracao:.0f} s por modo")
+    print(f"{'modo':<32}{'req':>7}{'erros':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for modo, r in resultados.items():
+        print(f"{modo:<32}{r['requisicoes']:>7}{r['erros']:>7}{r['requisicoes_por_s']:>8}"
+              f"{r['p50_ms']!s:>9}{r['p95_ms']!s:>9}{r['p99_ms']!s:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Contêiner binário de seções mapeado em memória.
+
+Formato comum ao snapshot dos pontos (snapshot_pontos.py) e à tabela de
+rotas pré-calculada (tabela_rotas.py); cada um escolhe o seu número mágico,
+a versão do formato e as seções.
+
+Formato (little-endian):
+    MAGICO (8 bytes) | versão do formato (uint32) | tamanho dos metadados (uint32)
+    | CRC-32 dos metadados (uint32) | metadados JSON | preenchimento até múltiplo de 8 | seções
+
+Cada seção começa em um deslocamento múltiplo de 8 do corpo. Os metadados
+trazem, além dos campos de quem grava, o CRC-32 do corpo ("crc32") e a
+tabela de seções ("secoes": nome -> [deslocamento, tamanho, código de tipo]).
+
+Ao abrir, o CRC-32 dos metadados e o tamanho do corpo (o fim da última
+seção) são sempre conferidos: custa só o cabeçalho e pega arquivos
+truncados ou com os metadados corrompidos. O CRC-32 do corpo, que lê o
+arquivo inteiro, é opcional.
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+
+ALINHAMENTO = 8
+TAMANHO_MAGICO = 8
+
+
+class ErroConteiner(Exception):
+    """Arquivo que não pode ser usado: outro formato ou versão, metadados inválidos ou corrompido."""
+
+
+def gravar_conteiner(destino, magico, versao, metadados, secoes):
+    """
+    Grava um contêiner.
+
+    O arquivo é escrito ao lado do destino e renomeado no final, de modo que
+    processos lendo o arquivo antigo nunca vejam um arquivo pela metade.
+
+    Args:
+        destino: Caminho do arquivo
+        magico: Número mágico (8 bytes) do tipo de arquivo
+        versao: Versão do formato de quem grava
+        metadados: Dicionário serializável em JSON (recebe "crc32" e "secoes")
+        secoes: Lista de (nome, código de tipo de array/memoryview ou "", bytes)
+    """
+    corpo = bytearray()
+    tabela = {}
+    for nome, codigo, bytes_secao in secoes:
+        corpo += b"\x00" * (-len(corpo) % ALINHAMENTO)
+        tabela[nome] = [len(corpo), len(bytes_secao), codigo]
+        corpo += bytes_secao
+
+    texto = json.dumps({**metadados, "crc32": zlib.crc32(corpo), "secoes": tabela},
+                       ensure_ascii=False).encode("utf-8")
+    cabecalho = magico + struct.pack("<III", versao, len(texto), zlib.crc32(texto)) + texto
+    cabecalho += b"\x00" * (-len(cabecalho) % ALINHAMENTO)
+
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(cabecalho)
+        arquivo.write(corpo)
+    os.replace(temporario, destino)
+
+
+def abrir_conteiner(caminho, magico, versao, verificar_crc=True, mapear=True):
+    """
+    Mapeia um contêiner em memória (mmap somente leitura) e confere o CRC-32.
+
+    Args:
+        caminho: Caminho do arquivo
+        magico: Número mágico esperado
+        versao: Versão do formato esperada
+        verificar_crc: Se deve conferir o CRC-32 (lê o arquivo inteiro; sem
+                       ele, só as páginas das seções usadas são lidas)
+        mapear: Se False, o arquivo é copiado para a memória em vez de
+                mapeado e não fica aberto (no Windows, um arquivo mapeado não
+                pode ser substituído por os.replace)
+
+    Retorna:
+        Tupla (metadados, seções): seções é um dicionário nome -> memoryview
+        sobre o mapa, já convertida (cast) para o código de tipo da seção
+
+    Lança:
+        OSError: se o arquivo não puder ser aberto ou mapeado
+        ErroConteiner: se o arquivo não puder ser usado
+    """
+    with open(caminho, "rb") as arquivo:
+        if not mapear:
+            mapa = arquivo.read()
+        else:
+            try:
+                mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # arquivo vazio
+                raise ErroConteiner(str(e)) from e
+
+    memoria = memoryview(mapa)
+    tamanho_fixo = TAMANHO_MAGICO + 12
+    if len(memoria) < tamanho_fixo or bytes(memoria[:TAMANHO_MAGICO]) != magico:
+        raise ErroConteiner("tipo de arquivo desconhecido")
+    versao_arquivo, tamanho_metadados, crc32_metadados = struct.unpack_from("<III", memoria, TAMANHO_MAGICO)
+    if versao_arquivo != versao:
+        raise ErroConteiner(f"formato {versao_arquivo}, esperado {versao}")
+
+    texto = bytes(memoria[tamanho_fixo:tamanho_fixo + tamanho_metadados])
+    if len(texto) != tamanho_metadados or zlib.crc32(texto) != crc32_metadados:
+        raise ErroConteiner("metadados corrompidos, CRC-32 não confere")
+    inicio = tamanho_fixo + tamanho_metadados
+    inicio += -inicio % ALINHAMENTO
+    corpo = memoria[inicio:]
+    try:
+        metadados = json.loads(texto)
+        crc32 = metadados["crc32"]
+        tabela = metadados["secoes"]
+        fim = max((deslocamento + tamanho for deslocamento, tamanho, _ in tabela.values()), default=0)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ErroConteiner("metadados inválidos") from None
+    if len(corpo) != fim:
+        raise ErroConteiner(f"truncado: corpo com {len(corpo)} bytes, esperados {fim}")
+    if verificar_crc and zlib.crc32(corpo) != crc32:
+        raise ErroConteiner("corrompido, CRC-32 não confere")
+
+    secoes = {}
+    try:
+        for nome, (deslocamento, tamanho, codigo) in tabela.items():
+            trecho = corpo[deslocamento:deslocamento + tamanho]
+            secoes[nome] = trecho.cast(codigo) if codigo else trecho
+    except (ValueError, TypeError):
+        raise ErroConteiner("tabela de seções inválida") from None
+    return metadados, secoes
+
+
+def regravar_metadados(caminho, magico, versao, alteracoes):
+    """
+    Regrava um contêiner com os metadados alterados e as mesmas seções.
+
+    O conteúdo é conferido (CRC-32) antes, para não regravar um arquivo
+    corrompido com um CRC novo.
+
+    Args:
+        caminho: Caminho do arquivo
+        magico: Número mágico esperado
+        versao: Versão do formato esperada
+        alteracoes: Dicionário com os campos de metadados a trocar
+
+    Lança:
+        OSError: se o arquivo não puder ser lido ou substituído
+        ErroConteiner: se o arquivo não puder ser usado
+    """
+    metadados, secoes = abrir_conteiner(caminho, magico, versao, mapear=False)
+    tabela = metadados.pop("secoes")
+    del metadados["crc32"]
+    ordem = sorted(tabela, key=lambda nome: tabela[nome][0])
+    gravar_conteiner(caminho, magico, versao, {**metadados, **alteracoes},
+                     [(nome, tabela[nome][2], secoes[nome].tobytes()) for nome in ordem])
+
+
+def fechar_conteiner(secoes):
+    """
+    Libera as seções de um contêiner aberto e fecha o mapa do arquivo.
+
+    Depois disso as seções não podem mais ser lidas e o arquivo pode ser
+    substituído (no Windows, os.replace falha enquanto ele estiver mapeado).
+
+    Args:
+        secoes: Dicionário de seções retornado por abrir_conteiner
+
+    Lança:
+        BufferError: se ainda houver fatias das seções em uso
+    """
+    mapas = {id(secao.obj): secao.obj for secao in secoes.values()}
+    for secao in secoes.values():
+        secao.release()
+    for mapa in mapas.values():
+        if isinstance(mapa, mmap.mmap):
+            mapa.close()
@@ -0,0 +1,117 @@
+import math
+
+import numpy as np
+
+# Raio médio da Terra (IUGG), em quilômetros
+RAIO_TERRA_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Calcula a distância em linha reta (círculo máximo) entre dois pontos.
+
+    Args:
+        lat1, lon1: Coordenadas do primeiro ponto, em graus
+        lat2, lon2: Coordenadas do segundo ponto, em graus
+
+    Retorna:
+        Distância em quilômetros
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# Máximo de elementos (origens x pontos) calculados de uma vez; limita a memória
+# das matrizes intermediárias em consultas com muitas origens (~16 MB por matriz)
+ELEMENTOS_POR_BLOCO = 2_000_000
+
+
+class DistanciasVetorizadas:
+    """
+    Distâncias de círculo máximo de uma ou várias origens para um conjunto
+    fixo de pontos, calculadas com NumPy em uma única operação por bloco.
+
+    Radianos e cossenos das latitudes dos pontos são calculados uma vez na
+    construção e reaproveitados em todas as consultas.
+
+    Args:
+        latitudes: Sequência de latitudes dos pontos, em graus
+        longitudes: Sequência de longitudes dos pontos, em graus
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+        self.lam = np.radians(np.asarray(longitudes, dtype=np.float64))
+        self.cos_phi = np.cos(self.phi)
+
+    def __len__(self):
+        return len(self.phi)
+
+    def matriz(self, origens_lat, origens_lon, selecao=None):
+        """
+        Calcula a matriz de distâncias origens x pontos.
+
+        Args:
+            origens_lat, origens_lon: Sequências (mesmo tamanho) com as origens, em graus
+            selecao: Posições dos pontos considerados (padrão: todos)
+
+        Retorna:
+            np.ndarray (origens, pontos) com as distâncias em quilômetros
+        """
+        phi1 = np.radians(np.asarray(origens_lat, dtype=np.float64)).reshape(-1, 1)
+        lam1 = np.radians(np.asarray(origens_lon, dtype=np.float64)).reshape(-1, 1)
+        phi2, lam2, cos_phi2 = self.phi, self.lam, self.cos_phi
+        if selecao is not None:
+            phi2, lam2, cos_phi2 = phi2[selecao], lam2[selecao], cos_phi2[selecao]
+
+        a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * cos_phi2 * np.sin((lam2 - lam1) / 2) ** 2
+        return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def da_origem(self, lat, lon, selecao=None):
+        """Atalho para uma única origem: vetor de distâncias (km) para os pontos."""
+        return self.matriz([lat], [lon], selecao)[0]
+
+    def k_mais_proximos(self, origens_lat, origens_lon, k, selecao=None):
+        """
+        Seleciona, para cada origem, os k pontos mais próximos (argpartition
+        + ordenação só dos k escolhidos). Origens são processadas em blocos de
+        até ELEMENTOS_POR_BLOCO distâncias.
+
+        Args:
+            origens_lat, origens_lon: Sequências (mesmo tamanho) com as origens, em graus
+            k: Quantidade de vizinhos por origem
+            selecao: Posições dos pontos considerados (padrão: todos)
+
+        Retorna:
+            Tupla (distancias, posicoes) de np.ndarray (origens, min(k, pontos)),
+            cada linha do mais próximo para o mais distante (empates pela posição)
+        """
+        origens_lat = np.asarray(origens_lat, dtype=np.float64).ravel()
+        origens_lon = np.asarray(origens_lon, dtype=np.float64).ravel()
+        if selecao is not None:
+            selecao = np.asarray(selecao, dtype=np.intp)
+        total = len(self) if selecao is None else len(selecao)
+        k = max(0, min(k, total))
+        distancias = np.empty((len(origens_lat), k))
+        posicoes = np.empty((len(origens_lat), k), dtype=np.intp)
+        if k == 0:
+            return distancias, posicoes
+
+        bloco = max(1, ELEMENTOS_POR_BLOCO // total)
+        for inicio in range(0, len(origens_lat), bloco):
+            fim = inicio + bloco
+            matriz = self.matriz(origens_lat[inicio:fim], origens_lon[inicio:fim], selecao)
+            if k < total:
+                escolhidos = np.argpartition(matriz, k - 1, axis=1)[:, :k]
+            else:
+                escolhidos = np.broadcast_to(np.arange(total), matriz.shape)
+            valores = np.take_along_axis(matriz, escolhidos, axis=1)
+            ordem = np.lexsort((escolhidos, valores), axis=1)
+            escolhidos = np.take_along_axis(escolhidos, ordem, axis=1)
+            distancias[inicio:fim] = np.take_along_axis(valores, ordem, axis=1)
+            posicoes[inicio:fim] = escolhidos if selecao is None else selecao[escolhidos]
+        return distancias, posicoes
@@ -0,0 +1,119 @@
+import zlib
+from lru import LRU
+
+# Brotli é opcional (pip install brotli); sem ele, só gzip é oferecido
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Nível de compressão: rápido o bastante para comprimir enquanto transmite
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+def codificacoes_disponiveis():
+    """Content-Encodings suportados, em ordem de preferência do servidor."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def escolher_codificacao(accept_encoding):
+    """
+    Escolhe a compressão da resposta a partir do cabeçalho Accept-Encoding.
+
+    Args:
+        accept_encoding: Valor do cabeçalho (ex.: "gzip, deflate, br;q=0.9")
+
+    Retorna:
+        "br", "gzip" ou None (sem compressão)
+    """
+    aceitas = {}
+    for item in (accept_encoding or "").split(","):
+        partes = [p.strip() for p in item.split(";")]
+        if not partes[0]:
+            continue
+        qualidade = 1.0
+        for parametro in partes[1:]:
+            if parametro.startswith("q="):
+                try:
+                    qualidade = float(parametro[2:])
+                except ValueError:
+                    qualidade = 0.0
+        aceitas[partes[0].lower()] = qualidade
+
+    candidatas = [c for c in codificacoes_disponiveis() if aceitas.get(c, aceitas.get("*", 0)) > 0]
+    if not candidatas:
+        return None
+    # Maior q do cliente; empate decidido pela preferência do servidor
+    return max(candidatas, key=lambda c: (aceitas.get(c, aceitas.get("*", 0)), -codificacoes_disponiveis().index(c)))
+
+
+def _compressor(codificacao):
+    if codificacao == "gzip":
+        return zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+    if codificacao == "br" and brotli is not None:
+        return brotli.Compressor(quality=QUALIDADE_BROTLI)
+    raise ValueError(f"Compressão não suportada: {codificacao}")
+
+
+def comprimir_fluxo(partes, codificacao):
+    """
+    Comprime um fluxo de bytes parte a parte, sem juntar tudo em memória.
+
+    Args:
+        partes: Iterável de bytes
+        codificacao: "gzip" ou "br"
+
+    Retorna:
+        Gerador de bytes comprimidos
+    """
+    compressor = _compressor(codificacao)
+    processar = compressor.compress if codificacao == "gzip" else compressor.process
+    for parte in partes:
+        comprimido = processar(parte)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush() if codificacao == "gzip" else compressor.finish()
+
+
+class CorposPreCalculados:
+    """
+    LRU de corpos de exportação já serializados (e comprimidos), para as
+    consultas sem filtro que parceiros repetem a cada poucos minutos.
+
+    A chave deve incluir a assinatura dos dados: quando o CSV é recarregado
+    os corpos antigos deixam de ser usados e saem do LRU.
+
+    Args:
+        capacidade: Máximo de corpos mantidos em memória
+    """
+
+    def __init__(self, capacidade=8):
+        self.capacidade = capacidade
+        self._corpos = LRU(capacidade)
+
+    def obter(self, chave, gerar):
+        """
+        Retorna o corpo da chave, gerando-o com gerar() se não estiver no LRU.
+
+        Args:
+            chave: Chave hashable (ex.: (assinatura, formato, codificacao))
+            gerar: Função sem argumentos que retorna um iterável de bytes
+
+        Retorna:
+            bytes
+        """
+        corpo = self._corpos.obter(chave)
+        if corpo is None:
+            corpo = self._corpos.gravar(chave, b"".join(gerar()))
+        return corpo
+
+    def resumo(self):
+        """Retorna contadores de acertos/faltas, corpos e bytes em memória."""
+        resumo = self._corpos.resumo()
+        return {
+            'acertos': resumo['acertos'],
+            'faltas': resumo['faltas'],
+            'corpos': resumo['entradas'],
+            'bytes': sum(len(corpo) for corpo in self._corpos.valores())
+        }
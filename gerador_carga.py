@@ -0,0 +1,417 @@
+"""
+Gerador de carga em laço fechado para o app, guiado por arquivos de cenário.
+
+Um cenário (JSON, ver cenarios_carga/) descreve a mistura de requisições
+(listagens de /api/coleta-pontos, consultas por proximidade com rotas, near,
+lotes e /mapa, com pesos), a área de onde saem as origens, o número de
+clientes, a duração e as configurações de servidor a comparar (app.py em um
+servidor WSGI com N threads, ou app_async.py no uvicorn). A Routes API é
+substituída por um ServidorRotasFalso com a latência do cenário.
+
+Cada cliente envia a próxima requisição ao receber a resposta (mais uma
+pausa opcional) e sorteia as requisições com um gerador próprio, semeado
+pela semente do cenário e pelo índice do cliente: rodar o mesmo cenário
+depois de uma otimização repete as mesmas sequências de requisições. Antes
+de cada configuração os caches do app são esvaziados, e as requisições
+concluídas durante o aquecimento ficam fora das estatísticas.
+
+Para cada configuração e endpoint são reportados requisições, erros (status
+>= 400 ou falha de conexão), taxa de erros, requisições/s e latências
+p50/p95/p99.
+
+Com --url, a carga vai para um app já em execução (as configurações do
+cenário são ignoradas); o servidor de rotas falso sobe em --porta-rotas, e o
+app deve ser iniciado apontando para ele:
+
+    GOOGLE_API_KEY=carga GOOGLE_ROUTES_URL=http://127.0.0.1:8089/distanceMatrix/v2:computeRouteMatrix \\
+        python app.py
+    python gerador_carga.py cenarios_carga/misto.json --url http://127.0.0.1:5000 --porta-rotas 8089
+
+Uso:
+    python gerador_carga.py CENARIO [--clientes N] [--duracao S] [--url URL]
+                            [--porta-rotas PORTA] [--saida ARQUIVO] [--json]
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+import app
+import coleta_service
+from comparar_async import percentil, servidor_assincrono, servidor_sincrono
+from registro import configurar_registro
+from servidor_rotas_falso import ServidorRotasFalso
+
+CENARIO_PADRAO = {
+    "descricao": "",
+    "semente": 42,
+    "clientes": 16,
+    "duracao": 10,
+    "aquecimento": 1,
+    "pausa": 0,
+    "latencia_rotas": 0.2,
+    # Área de onde saem as origens: [mínimo, máximo] de latitude e longitude
+    "area": {"lat": [-15.9, -15.7], "lon": [-48.0, -47.8]},
+    # Número de origens distintas sorteadas no início (null: uma origem nova por requisição)
+    "origens_distintas": None,
+    "tipos": ["pilhas", "lampadas", "eletroeletronicos", "eletrodomesticos"],
+    "configuracoes": [{"servidor": "sincrono", "threads": 8}],
+    "mistura": [{"endpoint": "proximidade", "peso": 1}],
+}
+
+SERVIDORES = ("sincrono", "assincrono")
+
+
+def _sortear_tipos(gerador, cenario, quantidade=1):
+    return ",".join(gerador.sample(cenario["tipos"], min(quantidade, len(cenario["tipos"]))))
+
+
+def _requisicao_lista(gerador, cenario, origem, parametros):
+    consulta = {"tipos": _sortear_tipos(gerador, cenario), "page_size": parametros.get("page_size", 50)}
+    lado = parametros.get("bbox_graus")
+    if lado:
+        lat, lon = origem
+        consulta["bbox"] = f"{lon - lado / 2:.4f},{lat - lado / 2:.4f},{lon + lado / 2:.4f},{lat + lado / 2:.4f}"
+    return "GET", "/api/coleta-pontos?" + urlencode(consulta), None
+
+
+def _requisicao_proximidade(gerador, cenario, origem, parametros):
+    consulta = {"tipos": _sortear_tipos(gerador, cenario, parametros.get("tipos_por_consulta", 1)),
+                "lat": f"{origem[0]:.4f}", "lon": f"{origem[1]:.4f}", "n": parametros.get("n", 3),
+                "roteamento": parametros.get("roteamento", "google")}
+    return "GET", "/api/coleta-pontos?" + urlencode(consulta), None
+
+
+def _requisicao_near(gerador, cenario, origem, parametros):
+    consulta = {"near": f"{origem[0]:.4f},{origem[1]:.4f}", "k": parametros.get("k", 5)}
+    return "GET", "/api/coleta-pontos?" + urlencode(consulta), None
+
+
+def _requisicao_lote(gerador, cenario, origem, parametros):
+    # As demais consultas do lote saem perto da primeira, como um lote de endereços de um bairro
+    dispersao = parametros.get("dispersao_graus", 0.01)
+    consultas = [{"lat": round(origem[0] + gerador.uniform(-dispersao, dispersao), 4),
+                  "lon": round(origem[1] + gerador.uniform(-dispersao, dispersao), 4),
+                  "tipos": _sortear_tipos(gerador, cenario), "n": parametros.get("n", 3)}
+                 for _ in range(parametros.get("consultas", 10))]
+    corpo = {"consultas": consultas, "roteamento": parametros.get("roteamento", "google")}
+    return "POST", "/api/coleta-pontos/lote", corpo
+
+
+def _requisicao_mapa(gerador, cenario, origem, parametros):
+    consulta = {"tipos": _sortear_tipos(gerador, cenario)}
+    if parametros.get("com_localizacao", False):
+        consulta.update({"lat": f"{origem[0]:.4f}", "lon": f"{origem[1]:.4f}", "n": parametros.get("n", 5),
+                         "roteamento": parametros.get("roteamento", "google")})
+    return "GET", "/mapa?" + urlencode(consulta), None
+
+
+ENDPOINTS = {
+    "lista": _requisicao_lista,
+    "proximidade": _requisicao_proximidade,
+    "near": _requisicao_near,
+    "lote": _requisicao_lote,
+    "mapa": _requisicao_mapa,
+}
+
+
+def validar_cenario(cenario):
+    """
+    Completa um cenário com os valores padrão e valida a mistura e as configurações.
+
+    Args:
+        cenario: Dicionário lido do arquivo de cenário
+
+    Retorna:
+        Novo dicionário com todos os campos preenchidos
+
+    Lança:
+        ValueError: se algum campo for inválido
+    """
+    completo = {**CENARIO_PADRAO, **cenario}
+    completo.setdefault("nome", "cenario")
+    if not completo["mistura"]:
+        raise ValueError("A mistura do cenário está vazia")
+    nomes = set()
+    for item in completo["mistura"]:
+        if item.get("endpoint") not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconhecido na mistura: {item.get('endpoint')} "
+                             f"(use um de: {', '.join(ENDPOINTS)})")
+        if not item.get("peso", 1) > 0:
+            raise ValueError(f"Peso deve ser positivo: {item}")
+        nome = item.get("nome", item["endpoint"])
+        if nome in nomes:
+            raise ValueError(f"Nome repetido na mistura: {nome} (use 'nome' para distinguir)")
+        nomes.add(nome)
+    for configuracao in completo["configuracoes"]:
+        if configuracao.get("servidor") not in SERVIDORES:
+            raise ValueError(f"Servidor desconhecido: {configuracao.get('servidor')} "
+                             f"(use um de: {', '.join(SERVIDORES)})")
+    if completo["clientes"] < 1 or completo["duracao"] <= 0:
+        raise ValueError("clientes deve ser >= 1 e duracao maior que zero")
+    return completo
+
+
+def carregar_cenario(caminho):
+    """
+    Lê um arquivo de cenário (JSON).
+
+    Args:
+        caminho: Caminho do arquivo
+
+    Retorna:
+        Cenário validado e completo (ver validar_cenario)
+
+    Lança:
+        ValueError: se o arquivo não for um cenário válido
+    """
+    with open(caminho, encoding="utf-8") as arquivo:
+        try:
+            cenario = json.load(arquivo)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Cenário {caminho} não é um JSON válido: {e}") from e
+    if not isinstance(cenario, dict):
+        raise ValueError(f"Cenário {caminho} deve ser um objeto JSON")
+    return validar_cenario(cenario)
+
+
+def _origens(cenario):
+    """Função que sorteia uma origem; com origens_distintas, sorteia de um conjunto fixo."""
+    area = cenario["area"]
+
+    def nova(gerador):
+        return gerador.uniform(*area["lat"]), gerador.uniform(*area["lon"])
+
+    if not cenario["origens_distintas"]:
+        return nova
+    gerador = random.Random(f"{cenario['semente']}-origens")
+    conjunto = [nova(gerador) for _ in range(cenario["origens_distintas"])]
+    return lambda gerador: gerador.choice(conjunto)
+
+
+def sequencia_requisicoes(cenario, cliente):
+    """
+    Gerador infinito das requisições de um cliente.
+
+    A sequência depende só do cenário e do índice do cliente, não do tempo de
+    resposta do servidor.
+
+    Args:
+        cenario: Cenário validado
+        cliente: Índice do cliente (0, 1, ...)
+
+    Retorna:
+        Iterador de tuplas (nome, método, caminho, corpo JSON ou None)
+    """
+    gerador = random.Random(f"{cenario['semente']}-{cliente}")
+    sortear_origem = _origens(cenario)
+    mistura = cenario["mistura"]
+    pesos = [item.get("peso", 1) for item in mistura]
+    while True:
+        item = gerador.choices(mistura, weights=pesos)[0]
+        metodo, caminho, corpo = ENDPOINTS[item["endpoint"]](gerador, cenario, sortear_origem(gerador), item)
+        yield item.get("nome", item["endpoint"]), metodo, caminho, corpo
+
+
+def _enviar(host, porta, metodo, caminho, corpo):
+    """Envia uma requisição em uma conexão nova; retorna o status (ou "conexao" em falha de rede)."""
+    conexao = http.client.HTTPConnection(host, porta, timeout=60)
+    try:
+        if corpo is None:
+            conexao.request(metodo, caminho)
+        else:
+            conexao.request(metodo, caminho, body=json.dumps(corpo),
+                            headers={"Content-Type": "application/json"})
+        resposta = conexao.getresponse()
+        resposta.read()
+        return resposta.status
+    except OSError:
+        return "conexao"
+    finally:
+        conexao.close()
+
+
+def resumir(amostras, decorrido):
+    """
+    Resume as amostras de um endpoint (ou de todos).
+
+    Args:
+        amostras: Lista de tuplas (latência em segundos, status)
+        decorrido: Duração da janela medida (segundos)
+
+    Retorna:
+        Dicionário com requisições, erros, taxa de erros, requisições/s
+        (respostas sem erro), latências p50/p95/p99 (ms) e contagem por status
+    """
+    latencias = sorted(latencia for latencia, _ in amostras)
+    erros = sum(1 for _, status in amostras if status == "conexao" or status >= 400)
+
+    def ms(p):
+        return round(percentil(latencias, p) * 1000, 1) if latencias else None
+
+    return {
+        "requisicoes": len(amostras),
+        "erros": erros,
+        "taxa_erros": round(erros / len(amostras), 4) if amostras else 0.0,
+        "requisicoes_por_s": round((len(amostras) - erros) / decorrido, 1) if decorrido > 0 else 0.0,
+        "p50_ms": ms(50),
+        "p95_ms": ms(95),
+        "p99_ms": ms(99),
+        "status": {str(status): total for status, total in Counter(s for _, s in amostras).most_common()},
+    }
+
+
+def gerar_carga(cenario, host, porta, clientes=None, duracao=None):
+    """
+    Executa os clientes do cenário em laço fechado contra um servidor.
+
+    Args:
+        cenario: Cenário validado
+        host, porta: Endereço do app
+        clientes: Número de clientes (padrão: o do cenário)
+        duracao: Duração da janela medida em segundos, após o aquecimento (padrão: a do cenário)
+
+    Retorna:
+        Dicionário com o resumo total e por endpoint (ver resumir)
+    """
+    clientes = clientes or cenario["clientes"]
+    duracao = duracao or cenario["duracao"]
+    inicio_medicao = time.monotonic() + cenario["aquecimento"]
+    fim = inicio_medicao + duracao
+    amostras = {item.get("nome", item["endpoint"]): [] for item in cenario["mistura"]}
+    lock = threading.Lock()
+
+    def cliente(indice):
+        requisicoes = sequencia_requisicoes(cenario, indice)
+        while time.monotonic() < fim:
+            nome, metodo, caminho, corpo = next(requisicoes)
+            inicio = time.monotonic()
+            status = _enviar(host, porta, metodo, caminho, corpo)
+            concluida = time.monotonic()
+            if concluida >= inicio_medicao:
+                with lock:
+                    amostras[nome].append((concluida - inicio, status))
+            if cenario["pausa"]:
+                time.sleep(cenario["pausa"])
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requisições iniciadas perto do fim terminam depois dele: a janela vai até a última resposta
+    decorrido = max(time.monotonic(), fim) - inicio_medicao
+
+    return {
+        "clientes": clientes,
+        "duracao_s": round(decorrido, 2),
+        "total": resumir([a for lista in amostras.values() for a in lista], decorrido),
+        "endpoints": {nome: resumir(lista, decorrido) for nome, lista in amostras.items()},
+    }
+
+
+def nome_configuracao(configuracao):
+    """Rótulo legível de uma configuração de servidor."""
+    if configuracao["servidor"] == "sincrono":
+        return f"sincrono ({configuracao.get('threads', 8)} threads)"
+    return "assincrono (uvicorn, 1 worker)"
+
+
+def _limpar_caches():
+    app.cache_respostas.limpar()
+    app.cache_mapas.limpar()
+    coleta_service.cache_rotas.limpar()
+
+
+def executar_cenario(cenario, clientes=None, duracao=None, url=None, porta_rotas=0):
+    """
+    Executa um cenário em cada configuração de servidor (ou contra um app em execução).
+
+    Args:
+        cenario: Cenário validado
+        clientes, duracao: Substituem os valores do cenário, se informados
+        url: URL de um app já em execução; se informada, as configurações do cenário são ignoradas
+        porta_rotas: Porta do servidor de rotas falso (0: uma porta livre)
+
+    Retorna:
+        Dicionário {configuração: resultado de gerar_carga}
+    """
+    resultados = {}
+    with ServidorRotasFalso(latencia=cenario["latencia_rotas"], porta=porta_rotas) as upstream:
+        if url:
+            partes = urlsplit(url)
+            resultados[url] = gerar_carga(cenario, partes.hostname, partes.port or 80, clientes, duracao)
+            return resultados
+
+        anteriores = coleta_service.GOOGLE_API_KEY, coleta_service.GOOGLE_ROUTES_URL
+        coleta_service.GOOGLE_API_KEY = "chave-carga"
+        coleta_service.GOOGLE_ROUTES_URL = upstream.url
+        try:
+            for configuracao in cenario["configuracoes"]:
+                _limpar_caches()
+                if configuracao["servidor"] == "sincrono":
+                    servidor = servidor_sincrono(configuracao.get("threads", 8))
+                else:
+                    servidor = servidor_assincrono()
+                with servidor as porta:
+                    resultados[nome_configuracao(configuracao)] = gerar_carga(cenario, "127.0.0.1", porta,
+                                                                              clientes, duracao)
+        finally:
+            coleta_service.GOOGLE_API_KEY, coleta_service.GOOGLE_ROUTES_URL = anteriores
+            _limpar_caches()
+    return resultados
+
+
+def _imprimir(cenario, resultados):
+    print(f"Cenário: {cenario['nome']} | upstream de rotas: {cenario['latencia_rotas']:.2f} s")
+    print(f"{'configuração':<32}{'endpoint':<16}{'req':>7}{'erros':>7}{'req/s':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for configuracao, resultado in resultados.items():
+        linhas = list(resultado["endpoints"].items()) + [("(total)", resultado["total"])]
+        for nome, r in linhas:
+            print(f"{configuracao:<32}{nome:<16}{r['requisicoes']:>7}{r['erros']:>7}{r['requisicoes_por_s']:>8}"
+                  f"{r['p50_ms']!s:>9}{r['p95_ms']!s:>9}{r['p99_ms']!s:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga em laço fechado guiado por um cenário")
+    parser.add_argument("cenario", help="arquivo JSON do cenário (ver cenarios_carga/)")
+    parser.add_argument("--clientes", type=int, help="clientes simultâneos (substitui o cenário)")
+    parser.add_argument("--duracao", type=float, help="duração medida de cada configuração em s (substitui o cenário)")
+    parser.add_argument("--url", help="URL de um app já em execução (ignora as configurações do cenário)")
+    parser.add_argument("--porta-rotas", type=int, default=0, help="porta do servidor de rotas falso")
+    parser.add_argument("--saida", help="grava o resultado em JSON neste arquivo")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    # Os registros por requisição (app e httpx) não se misturam ao relatório, salvo com LOG_NIVEL
+    configurar_registro(nivel=os.getenv("LOG_NIVEL", "WARNING"))
+    cenario = carregar_cenario(args.cenario)
+    resultados = executar_cenario(cenario, args.clientes, args.duracao, args.url, args.porta_rotas)
+    saida = {
+        "metadados": {
+            "cenario": cenario,
+            "data": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+        },
+        "resultados": resultados,
+    }
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(saida, indent=2, ensure_ascii=False) + "\n")
+    if args.json:
+        print(json.dumps(saida, indent=2, ensure_ascii=False))
+    else:
+        _imprimir(cenario, resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import heapq
+import math
+from array import array
+from distancias import RAIO_TERRA_KM, haversine_km
+
+# Lado padrão das células da grade, em graus (~5,5 km de latitude)
+TAMANHO_CELULA_PADRAO = 0.05
+
+# Lado (em pixels de tela) da célula usada para agrupar pontos por nível de zoom
+TAMANHO_GRUPO_PX = 60
+
+# Latitude máxima representável na projeção Web Mercator
+LATITUDE_MAXIMA_MERCATOR = 85.05112878
+
+
+def pixel_mercator(lat, lon, zoom):
+    """
+    Converte coordenadas em pixels globais da projeção Web Mercator
+    (a mesma dos mapas de tiles) no nível de zoom informado.
+
+    Retorna:
+        Tupla (x, y) em pixels, com o mundo medindo 256 * 2**zoom de lado
+    """
+    escala = 256 * 2 ** zoom
+    lat = max(-LATITUDE_MAXIMA_MERCATOR, min(LATITUDE_MAXIMA_MERCATOR, lat))
+    seno = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0 * escala
+    y = (0.5 - math.log((1 + seno) / (1 - seno)) / (4 * math.pi)) * escala
+    return x, y
+
+
+def agrupar_por_pixels(coordenadas, posicoes, zoom, tamanho_px=TAMANHO_GRUPO_PX):
+    """
+    Agrupa pontos que caem na mesma célula de tamanho_px x tamanho_px pixels
+    de tela no nível de zoom informado (agrupamento em grade, O(n)).
+
+    Args:
+        coordenadas: Sequência de tuplas (latitude, longitude), uma por posição
+        posicoes: Posições a agrupar
+        zoom: Nível de zoom do mapa
+        tamanho_px: Lado da célula em pixels
+
+    Retorna:
+        Lista de listas de posições, na ordem em que cada grupo aparece pela primeira vez
+    """
+    grupos = {}
+    for posicao in posicoes:
+        x, y = pixel_mercator(*coordenadas[posicao], zoom)
+        grupos.setdefault((int(x // tamanho_px), int(y // tamanho_px)), []).append(posicao)
+    return list(grupos.values())
+
+
+class Coordenadas:
+    """
+    Sequência de pares (latitude, longitude) sobre duas colunas (ex.: array('d')),
+    sem manter uma tupla por ponto em memória.
+    """
+
+    __slots__ = ('latitudes', 'longitudes')
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __getitem__(self, posicao):
+        return self.latitudes[posicao], self.longitudes[posicao]
+
+
+class GradeEspacial:
+    """
+    Índice espacial em grade regular de latitude/longitude.
+
+    Cada célula guarda as posições (no repositório) dos pontos que caem nela.
+    Suporta consulta por retângulo (bounding box) e k vizinhos mais próximos
+    por distância de círculo máximo, com filtro opcional por posição.
+
+    Args:
+        coordenadas: Sequência de tuplas (latitude, longitude), uma por posição
+        tamanho_celula: Lado da célula em graus
+    """
+
+    def __init__(self, coordenadas, tamanho_celula=TAMANHO_CELULA_PADRAO):
+        self.tamanho_celula = tamanho_celula
+        celulas = {}
+        for posicao, (lat, lon) in enumerate(coordenadas):
+            celulas.setdefault(self._celula(lat, lon), []).append(posicao)
+        # Posições em array compacto (4 bytes cada) em vez de listas de int
+        self._definir(coordenadas, {celula: array('I', posicoes) for celula, posicoes in celulas.items()})
+
+    @classmethod
+    def de_celulas(cls, coordenadas, celulas, tamanho_celula=TAMANHO_CELULA_PADRAO):
+        """
+        Monta a grade a partir de células já calculadas (ex.: lidas de um snapshot).
+
+        Args:
+            coordenadas: Sequência de tuplas (latitude, longitude), uma por posição
+            celulas: Dicionário (linha, coluna) -> sequência crescente de posições
+            tamanho_celula: Lado da célula em graus usado ao calcular as células
+        """
+        grade = cls.__new__(cls)
+        grade.tamanho_celula = tamanho_celula
+        grade._definir(coordenadas, celulas)
+        return grade
+
+    def _definir(self, coordenadas, celulas):
+        self.coordenadas = coordenadas
+        self.celulas = celulas
+        if celulas:
+            linhas = [c[0] for c in celulas]
+            colunas = [c[1] for c in celulas]
+            self._extensao = (min(linhas), min(colunas), max(linhas), max(colunas))
+        else:
+            self._extensao = None
+
+    def __len__(self):
+        return len(self.coordenadas)
+
+    def _celula(self, lat, lon):
+        return (math.floor(lat / self.tamanho_celula), math.floor(lon / self.tamanho_celula))
+
+    def na_caixa(self, min_lat, min_lon, max_lat, max_lon, permitido=None):
+        """
+        Retorna as posições dos pontos dentro do retângulo informado.
+
+        Args:
+            min_lat, min_lon, max_lat, max_lon: Limites do retângulo, em graus
+            permitido: Função opcional posicao -> bool (ex.: filtro de tipos)
+
+        Retorna:
+            Lista crescente de posições
+        """
+        if self._extensao is None or min_lat > max_lat or min_lon > max_lon:
+            return []
+
+        lin_min, col_min = self._celula(min_lat, min_lon)
+        lin_max, col_max = self._celula(max_lat, max_lon)
+        e_lin_min, e_col_min, e_lin_max, e_col_max = self._extensao
+        lin_min, col_min = max(lin_min, e_lin_min), max(col_min, e_col_min)
+        lin_max, col_max = min(lin_max, e_lin_max), min(col_max, e_col_max)
+        if lin_min > lin_max or col_min > col_max:
+            return []
+
+        # Caixas grandes: percorrer só as células ocupadas em vez de todo o intervalo
+        if (lin_max - lin_min + 1) * (col_max - col_min + 1) > len(self.celulas):
+            celulas = [posicoes for (lin, col), posicoes in self.celulas.items()
+                       if lin_min <= lin <= lin_max and col_min <= col <= col_max]
+        else:
+            celulas = [self.celulas[(lin, col)]
+                       for lin in range(lin_min, lin_max + 1)
+                       for col in range(col_min, col_max + 1)
+                       if (lin, col) in self.celulas]
+
+        coordenadas = self.coordenadas
+        resultado = []
+        for posicoes in celulas:
+            for posicao in posicoes:
+                lat, lon = coordenadas[posicao]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    if permitido is None or permitido(posicao):
+                        resultado.append(posicao)
+        resultado.sort()
+        return resultado
+
+    def _distancia_minima_anel(self, lat, anel):
+        """
+        Limite inferior (km) da distância da origem a qualquer ponto fora dos
+        anéis já visitados, ou seja, a pelo menos `anel` células de distância.
+        """
+        delta = math.radians(anel * self.tamanho_celula)
+        por_latitude = RAIO_TERRA_KM * delta
+        if delta >= math.pi / 2:
+            return por_latitude
+        # Menor distância entre a origem e um meridiano deslocado de delta
+        por_longitude = RAIO_TERRA_KM * math.asin(math.cos(math.radians(lat)) * math.sin(delta))
+        return min(por_latitude, por_longitude)
+
+    def k_mais_proximos(self, lat, lon, k, permitido=None):
+        """
+        Busca os k pontos mais próximos da origem em distância de círculo máximo.
+
+        Args:
+            lat, lon: Coordenadas da origem
+            k: Quantidade de vizinhos
+            permitido: Função opcional posicao -> bool (ex.: filtro de tipos)
+
+        Retorna:
+            Lista de tuplas (distancia_km, posicao), da mais próxima para a mais distante
+        """
+        if k <= 0 or self._extensao is None:
+            return []
+
+        lin0, col0 = self._celula(lat, lon)
+        e_lin_min, e_col_min, e_lin_max, e_col_max = self._extensao
+        anel_maximo = max(lin0 - e_lin_min, e_lin_max - lin0, col0 - e_col_min, e_col_max - col0)
+
+        coordenadas = self.coordenadas
+        melhores = []  # heap máximo via distância negativa
+
+        def considerar(posicoes):
+            for posicao in posicoes:
+                if permitido is not None and not permitido(posicao):
+                    continue
+                p_lat, p_lon = coordenadas[posicao]
+                distancia = haversine_km(lat, lon, p_lat, p_lon)
+                if len(melhores) < k:
+                    heapq.heappush(melhores, (-distancia, -posicao))
+                elif distancia < -melhores[0][0]:
+                    heapq.heapreplace(melhores, (-distancia, -posicao))
+
+        for anel in range(0, anel_maximo + 1):
+            # Anéis muito grandes: mais barato varrer as células ocupadas restantes de uma vez
+            if 8 * anel > len(self.celulas):
+                for (lin, col), posicoes in self.celulas.items():
+                    if max(abs(lin - lin0), abs(col - col0)) >= anel:
+                        considerar(posicoes)
+                break
+
+            if anel == 0:
+                considerar(self.celulas.get((lin0, col0), ()))
+            else:
+                for col in range(col0 - anel, col0 + anel + 1):
+                    considerar(self.celulas.get((lin0 - anel, col), ()))
+                    considerar(self.celulas.get((lin0 + anel, col), ()))
+                for lin in range(lin0 - anel + 1, lin0 + anel):
+                    considerar(self.celulas.get((lin, col0 - anel), ()))
+                    considerar(self.celulas.get((lin, col0 + anel), ()))
+
+            if len(melhores) == k and -melhores[0][0] <= self._distancia_minima_anel(lat, anel):
+                break
+
+        return sorted((-d, -p) for d, p in melhores)
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+
+class LRU:
+    """
+    Dicionário limitado com descarte do item menos usado recentemente,
+    seguro para threads e com contadores de acertos e faltas.
+
+    É a camada em memória dos caches da aplicação (CacheMapas,
+    CacheRespostas, CorposPreCalculados e CacheRotas), que acrescentam a
+    geração do valor, expiração e a camada em disco.
+
+    Args:
+        capacidade: Máximo de entradas mantidas
+    """
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, valido=None):
+        """
+        Retorna o valor da chave (e o marca como usado), ou None se não houver.
+
+        Args:
+            chave: Chave hashable
+            valido: Função opcional valor -> bool; valores inválidos (ex.:
+                    expirados) são removidos e contam como falta
+        """
+        return self.obter_muitos([chave], valido).get(chave)
+
+    def obter_muitos(self, chaves, valido=None):
+        """
+        Como obter(), para várias chaves de uma vez (um único lock).
+
+        Retorna:
+            Dicionário {chave: valor} só com os acertos
+        """
+        encontrados = {}
+        with self._lock:
+            for chave in chaves:
+                valor = self._itens.get(chave)
+                if valor is not None and (valido is None or valido(valor)):
+                    self._itens.move_to_end(chave)
+                    encontrados[chave] = valor
+                    continue
+                if valor is not None:
+                    del self._itens[chave]
+            self.acertos += len(encontrados)
+            self.faltas += len(chaves) - len(encontrados)
+        return encontrados
+
+    def gravar(self, chave, valor):
+        """Grava um valor, descartando os menos usados acima da capacidade; retorna o valor."""
+        self.gravar_muitos([(chave, valor)])
+        return valor
+
+    def gravar_muitos(self, itens):
+        """Grava vários pares (chave, valor) de uma vez (um único lock)."""
+        with self._lock:
+            for chave, valor in itens:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def valores(self):
+        """Cópia da lista de valores atuais."""
+        with self._lock:
+            return list(self._itens.values())
+
+    def limpar(self, zerar_contadores=False):
+        """Remove todas as entradas (e, opcionalmente, zera os contadores)."""
+        with self._lock:
+            self._itens.clear()
+            if zerar_contadores:
+                self.acertos = self.faltas = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._itens)
+
+    def resumo(self):
+        """Retorna contadores de acertos/faltas e o número de entradas."""
+        with self._lock:
+            return {
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'entradas': len(self._itens)
+            }
@@ -0,0 +1,222 @@
+"""
+Métricas do serviço no formato de texto do Prometheus (exposto em /metrics).
+
+Contadores, medidores e histogramas com rótulos, mantidos em memória por
+processo (com vários workers, cada um expõe os próprios valores e o
+Prometheus agrega). As métricas do pipeline de /api/coleta-pontos e /mapa
+ficam definidas no fim do módulo, para os demais módulos importarem.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites padrão dos histogramas de duração (segundos)
+LIMITES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    """Base das métricas: nome, ajuda, rótulos e valores por combinação de rótulos."""
+
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}")
+        return tuple(rotulos[nome] for nome in self.rotulos)
+
+    def valor(self, **rotulos):
+        """Valor atual para os rótulos (0 se ainda não houve registro); usado em testes e diagnóstico."""
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def linhas(self):
+        """Linhas do formato de texto do Prometheus para esta métrica."""
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} {self.tipo}"
+        with self._lock:
+            valores = list(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+
+
+class Contador(_Metrica):
+    """Contador monotônico (ex.: chamadas, erros, acertos de cache)."""
+
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        """
+        Soma valor ao contador dos rótulos dados.
+
+        Lança:
+            ValueError: se valor for negativo ou os rótulos não forem os da métrica
+        """
+        if valor < 0:
+            raise ValueError("Contadores só podem aumentar")
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce (ex.: tamanho do conjunto de dados)."""
+
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        """Define o valor atual para os rótulos dados."""
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+
+class Histograma(_Metrica):
+    """
+    Distribuição de observações em faixas cumulativas (ex.: durações).
+
+    Args:
+        limites: Limites superiores das faixas, em ordem crescente (+Inf é implícito)
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **rotulos):
+        """Registra uma observação."""
+        chave = self._chave(rotulos)
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                # Contagem por faixa (não cumulativa; a última é +Inf), soma e total
+                estado = self._valores[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            estado[0][faixa] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """Observa a duração (segundos) do bloco with."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def valor(self, **rotulos):
+        """Quantidade de observações para os rótulos dados."""
+        with self._lock:
+            estado = self._valores.get(self._chave(rotulos))
+            return estado[2] if estado else 0
+
+    def linhas(self):
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} {self.tipo}"
+        with self._lock:
+            valores = [(chave, (list(faixas), soma, total)) for chave, (faixas, soma, total) in self._valores.items()]
+        for chave, (faixas, soma, total) in valores:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), faixas):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, ("le", _formatar_numero(limite)))
+                yield f"{self.nome}_bucket{rotulos} {acumulado}"
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            yield f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}"
+            yield f"{self.nome}_count{rotulos} {total}"
+
+
+class RegistroMetricas:
+    """Conjunto de métricas expostas juntas."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            if metrica.nome in self._metricas:
+                raise ValueError(f"Métrica já registrada: {metrica.nome}")
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        """Cria e registra um Contador."""
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        """Cria e registra um Medidor."""
+        return self._registrar(Medidor(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        """Cria e registra um Histograma."""
+        return self._registrar(Histograma(nome, ajuda, rotulos, limites))
+
+    def expor(self):
+        """
+        Retorna o texto de todas as métricas no formato de exposição do Prometheus.
+        """
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "".join(f"{linha}\n" for metrica in metricas for linha in metrica.linhas())
+
+
+metricas = RegistroMetricas()
+
+# Etapas de /api/coleta-pontos e /mapa: carga (dados em memória, recarregando o
+# CSV se mudou), filtro (tipos e pré-filtro geométrico), roteamento, ordenacao
+# (top-n), serializacao (JSON da resposta) e mapa_base/mapa_sobreposicao (HTML)
+duracao_etapas = metricas.histograma(
+    "pontos_etapa_duracao_segundos", "Duração de cada etapa do atendimento de uma consulta", ("etapa",)
+)
+duracao_lotes_rotas = metricas.histograma(
+    "pontos_rotas_lote_duracao_segundos",
+    "Tempo de ida e volta de cada requisição de lote à API de rotas", ("cliente",)
+)
+chamadas_rotas = metricas.contador(
+    "pontos_rotas_chamadas_total", "Chamadas a provedores de rotas", ("provedor",)
+)
+erros_rotas = metricas.contador(
+    "pontos_rotas_erros_total", "Falhas ao obter rotas, por provedor e tipo de erro", ("provedor", "tipo")
+)
+cache_rotas_consultas = metricas.contador(
+    "pontos_cache_rotas_consultas_total",
+    "Destinos procurados na tabela pré-calculada e no cache de rotas (resultado: tabela, acerto ou falta)",
+    ("resultado",)
+)
+pontos_carregados = metricas.medidor(
+    "pontos_dataset_pontos", "Pontos de coleta no conjunto de dados carregado"
+)
+duracao_indice = metricas.medidor(
+    "pontos_indice_construcao_segundos",
+    "Duração da última construção das colunas e índices (CSV ou snapshot)", ("fonte",)
+)
@@ -0,0 +1,231 @@
+import asyncio
+
+import requests
+from cliente_rotas import resultado_vazio
+from distancias import haversine_km
+from registro import Adiado, logger_payloads
+from transporte_rotas import AdaptadorRotas, ResolvedorDNS
+
+# Respostas do OSRM (DEBUG, amostradas; ver registro.py)
+payloads = logger_payloads(__name__)
+
+
+class ErroRoteamento(Exception):
+    """Falha de um provedor de rotas ao calcular distâncias."""
+
+
+class ProvedorRotas:
+    """
+    Interface dos provedores de distância/tempo de direção.
+
+    Subclasses implementam calcular_distancias(); destinos sem resultado
+    devem voltar como {distance_km: None, duration_min: None}, para que o
+    próximo provedor da cadeia tente calculá-los. Falhas totais podem ser
+    sinalizadas com ErroRoteamento.
+
+    Atributos:
+        nome: Identificador usado no parâmetro roteamento e em fonte_distancia
+        usa_cache: Se os resultados devem passar pelo cache de rotas
+    """
+
+    nome = None
+    usa_cache = True
+
+    def disponivel(self):
+        """Indica se o provedor está configurado para uso."""
+        return True
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        """
+        Calcula distância e duração da origem para cada destino.
+
+        Args:
+            origem_lat: Latitude da origem
+            origem_lon: Longitude da origem
+            destinos: Lista de tuplas (lat, lon)
+
+        Retorna:
+            Lista de {distance_km, duration_min}, na mesma ordem de destinos
+        """
+        raise NotImplementedError
+
+    async def calcular_distancias_async(self, origem_lat, origem_lon, destinos):
+        """
+        Versão assíncrona de calcular_distancias, usada pelo servidor ASGI.
+
+        Por padrão executa calcular_distancias em uma thread; provedores com
+        cliente assíncrono próprio sobrescrevem este método.
+        """
+        return await asyncio.to_thread(self.calcular_distancias, origem_lat, origem_lon, destinos)
+
+    def calcular_matriz(self, origens, destinos):
+        """
+        Calcula distância e duração de cada origem para cada destino.
+
+        Por padrão faz uma chamada de calcular_distancias por origem; provedores
+        com API de matriz (muitas origens x muitos destinos) sobrescrevem este método.
+
+        Args:
+            origens: Lista de tuplas (lat, lon)
+            destinos: Lista de tuplas (lat, lon)
+
+        Retorna:
+            Matriz (lista de listas) [origem][destino] de {distance_km, duration_min}
+        """
+        return [self.calcular_distancias(lat, lon, destinos) for lat, lon in origens]
+
+
+class ProvedorGoogle(ProvedorRotas):
+    """
+    Google Routes API v2 (computeRouteMatrix).
+
+    Args:
+        funcao_distancias: Função (lat, lon, destinos) -> lista de resultados
+        disponivel: Função sem argumentos que indica se há chave configurada
+        funcao_distancias_async: Função assíncrona equivalente (opcional; sem ela,
+                                 funcao_distancias roda em uma thread)
+        funcao_matriz: Função (origens, destinos) -> matriz de resultados (opcional;
+                       sem ela, uma chamada de funcao_distancias por origem)
+    """
+
+    nome = "google"
+
+    def __init__(self, funcao_distancias, disponivel, funcao_distancias_async=None, funcao_matriz=None):
+        self._funcao_distancias = funcao_distancias
+        self._disponivel = disponivel
+        self._funcao_distancias_async = funcao_distancias_async
+        self._funcao_matriz = funcao_matriz
+
+    def disponivel(self):
+        return self._disponivel()
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        return self._funcao_distancias(origem_lat, origem_lon, destinos)
+
+    async def calcular_distancias_async(self, origem_lat, origem_lon, destinos):
+        if self._funcao_distancias_async is None:
+            return await super().calcular_distancias_async(origem_lat, origem_lon, destinos)
+        return await self._funcao_distancias_async(origem_lat, origem_lon, destinos)
+
+    def calcular_matriz(self, origens, destinos):
+        if self._funcao_matriz is None:
+            return super().calcular_matriz(origens, destinos)
+        return self._funcao_matriz(origens, destinos)
+
+
+class ProvedorOSRM(ProvedorRotas):
+    """
+    Servidor de rotas local compatível com o serviço table do OSRM
+    (GET /table/v1/{perfil}/{lon,lat;...}?sources=0&annotations=duration,distance).
+
+    Args:
+        url_base: URL do servidor (ex.: http://localhost:5001); None desativa o provedor
+        perfil: Perfil de roteamento do OSRM
+        timeout: Timeout (segundos) de cada requisição
+        destinos_por_requisicao: Máximo de destinos por chamada (limita o tamanho da URL)
+        resolvedor: ResolvedorDNS das conexões (padrão: ResolvedorDNS.da_configuracao())
+    """
+
+    nome = "osrm"
+
+    def __init__(self, url_base, perfil="driving", timeout=5.0, destinos_por_requisicao=100, resolvedor=None):
+        self.url_base = url_base.rstrip("/") if url_base else None
+        self.perfil = perfil
+        self.timeout = timeout
+        self.destinos_por_requisicao = destinos_por_requisicao
+        self.sessao = requests.Session()
+        self.sessao.trust_env = False
+        adaptador = AdaptadorRotas(resolvedor or ResolvedorDNS.da_configuracao(), pool_maxsize=4)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def disponivel(self):
+        return self.url_base is not None
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        resultados = []
+        for inicio in range(0, len(destinos), self.destinos_por_requisicao):
+            lote = destinos[inicio:inicio + self.destinos_por_requisicao]
+            coordenadas = ";".join(f"{lon},{lat}" for lat, lon in [(origem_lat, origem_lon)] + list(lote))
+            url = f"{self.url_base}/table/v1/{self.perfil}/{coordenadas}"
+            try:
+                resposta = self.sessao.get(
+                    url,
+                    params={"sources": "0", "annotations": "duration,distance"},
+                    timeout=self.timeout
+                )
+                payloads.debug("Resposta OSRM HTTP %d para %s: %s", resposta.status_code, url,
+                               Adiado(lambda: resposta.text))
+                corpo = resposta.json()
+            except (requests.RequestException, ValueError) as e:
+                raise ErroRoteamento(f"Erro ao chamar servidor OSRM: {str(e)}")
+            if not isinstance(corpo, dict):
+                raise ErroRoteamento("Resposta inválida do servidor OSRM: corpo não é um objeto JSON")
+            if corpo.get("code") != "Ok":
+                raise ErroRoteamento(f"Servidor OSRM respondeu {corpo.get('code')}: {corpo.get('message')}")
+
+            try:
+                duracoes = corpo["durations"][0][1:]
+                distancias = corpo.get("distances", [[None] * (len(lote) + 1)])[0][1:]
+                if len(duracoes) != len(lote) or len(distancias) != len(lote):
+                    raise IndexError(f"{len(duracoes)} durações para {len(lote)} destinos")
+                for duracao, distancia in zip(duracoes, distancias):
+                    if duracao is None or distancia is None:
+                        resultados.append(resultado_vazio())
+                    else:
+                        resultados.append({"distance_km": distancia / 1000, "duration_min": duracao / 60})
+            except (KeyError, IndexError, TypeError) as e:
+                raise ErroRoteamento(f"Resposta inválida do servidor OSRM: {str(e)}")
+        return resultados
+
+
+# Fatores por região: retângulo (min_lat, min_lon, max_lat, max_lon), fator de desvio
+# (distância por estrada / linha reta) e velocidade média em km/h
+REGIOES_PADRAO = [
+    {"nome": "Plano Piloto", "caixa": (-15.86, -47.96, -15.70, -47.82), "fator_desvio": 1.35, "velocidade_kmh": 32},
+    {"nome": "Distrito Federal", "caixa": (-16.06, -48.29, -15.50, -47.31), "fator_desvio": 1.30, "velocidade_kmh": 42},
+]
+REGIAO_PADRAO = {"nome": "Padrão", "fator_desvio": 1.40, "velocidade_kmh": 40}
+
+
+class ProvedorEstimativa(ProvedorRotas):
+    """
+    Estimativa local, sem chamadas externas: distância em linha reta
+    multiplicada pelo fator de desvio da região da origem, e duração pela
+    velocidade média da região. A primeira região cuja caixa contém a
+    origem é usada; fora de todas, vale a região padrão.
+
+    Args:
+        regioes: Lista de regiões no formato de REGIOES_PADRAO
+        padrao: Fatores usados fora das regiões
+    """
+
+    nome = "estimativa"
+    usa_cache = False
+
+    def __init__(self, regioes=None, padrao=None):
+        self.regioes = REGIOES_PADRAO if regioes is None else regioes
+        self.padrao = REGIAO_PADRAO if padrao is None else padrao
+
+    def regiao(self, lat, lon):
+        """Retorna a região (dicionário de fatores) que contém as coordenadas."""
+        for regiao in self.regioes:
+            min_lat, min_lon, max_lat, max_lon = regiao["caixa"]
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                return regiao
+        return self.padrao
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        regiao = self.regiao(origem_lat, origem_lon)
+        resultados = []
+        for lat, lon in destinos:
+            distancia = haversine_km(origem_lat, origem_lon, lat, lon) * regiao["fator_desvio"]
+            resultados.append({
+                "distance_km": distancia,
+                "duration_min": distancia / regiao["velocidade_kmh"] * 60
+            })
+        return resultados
+
+    async def calcular_distancias_async(self, origem_lat, origem_lon, destinos):
+        # Cálculo local e rápido: não vale o custo de uma thread
+        return self.calcular_distancias(origem_lat, origem_lon, destinos)
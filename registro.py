@@ -0,0 +1,175 @@
+"""
+Configuração do registro (logging) da aplicação.
+
+Cada módulo usa logging.getLogger(__name__) com formatação preguiçosa
+(logger.info("... %s", valor)): a mensagem só é montada se o registro
+passar pelo nível. Os handlers de saída rodam em uma thread própria
+(QueueHandler/QueueListener), de modo que as requisições não esperam pela
+escrita no stderr. A mensagem em si (msg % args) e o texto de exceções
+ainda são montados na thread que registra (QueueHandler.prepare); só a
+formatação final (data, JSON) e a escrita saem dela.
+
+A configuração é feita por quem inicia o processo (app.py/app_async.py e
+os scripts), não ao importar os módulos.
+
+Payloads de depuração (corpos enviados e recebidos dos provedores de rotas)
+vão para loggers "<módulo>.payloads", com amostragem: mesmo com DEBUG
+ligado, só uma fração deles é formatada. Na configuração padrão (INFO)
+nenhum payload é serializado.
+
+Variáveis de ambiente:
+    LOG_NIVEL: Nível padrão (padrão: INFO)
+    LOG_NIVEIS: Níveis por módulo, ex.: "cliente_rotas=DEBUG,coleta_service=WARNING"
+    LOG_FORMATO: "texto" (padrão) ou "json" (uma linha JSON por registro)
+    LOG_AMOSTRAGEM_PAYLOADS: Fração dos payloads de depuração registrados (padrão: 0.01)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+FORMATO_TEXTO = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Atributos padrão de LogRecord; os demais vêm de extra= e viram campos no JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class _SaidaAssincrona(logging.handlers.QueueListener):
+    """QueueListener que sabe se está rodando: stop() pode ser chamado mais de uma vez."""
+
+    ativo = False
+
+    def start(self):
+        super().start()
+        self.ativo = True
+
+    def stop(self):
+        if self.ativo:
+            self.ativo = False
+            super().stop()
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada registro como uma linha JSON, com os campos passados em extra=."""
+
+    def format(self, record):
+        dados = {
+            "momento": self.formatTime(record),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "mensagem": record.getMessage(),
+        }
+        for nome, valor in vars(record).items():
+            if nome not in _ATRIBUTOS_PADRAO:
+                dados[nome] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar só uma fração dos registros.
+
+    Args:
+        taxa: Fração entre 0 e 1
+    """
+
+    def __init__(self, taxa):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        return self.taxa >= 1 or random.random() < self.taxa
+
+
+class Adiado:
+    """
+    Valor de mensagem calculado só na formatação, ex.:
+    logger.debug("Resposta: %s", Adiado(lambda: resposta.text)).
+    """
+
+    __slots__ = ("funcao",)
+
+    def __init__(self, funcao):
+        self.funcao = funcao
+
+    def __str__(self):
+        return str(self.funcao())
+
+
+def logger_payloads(modulo):
+    """Logger dos payloads de depuração de um módulo (amostrado por configurar_registro)."""
+    return logging.getLogger(f"{modulo}.payloads")
+
+
+def _ler_niveis(texto):
+    niveis = {}
+    for item in (texto or "").split(","):
+        if "=" in item:
+            nome, nivel = item.split("=", 1)
+            niveis[nome.strip()] = nivel.strip().upper()
+    return niveis
+
+
+def configurar_registro(nivel=None, niveis=None, formato=None, amostragem_payloads=None, destino=None):
+    """
+    Configura o logger raiz com saída assíncrona por fila. Pode ser chamada de
+    novo (ex.: em testes); a configuração anterior é substituída.
+
+    Args:
+        nivel: Nível padrão (padrão: LOG_NIVEL ou INFO)
+        niveis: Dicionário {módulo: nível} (padrão: LOG_NIVEIS)
+        formato: "texto" ou "json" (padrão: LOG_FORMATO ou texto)
+        amostragem_payloads: Fração dos payloads registrados (padrão: LOG_AMOSTRAGEM_PAYLOADS ou 0.01)
+        destino: Stream de saída (padrão: sys.stderr)
+
+    Lança:
+        ValueError: se o formato for desconhecido
+    """
+    global _listener
+    nivel = (nivel or os.getenv("LOG_NIVEL", "INFO")).upper()
+    niveis = _ler_niveis(os.getenv("LOG_NIVEIS")) if niveis is None else niveis
+    formato = formato or os.getenv("LOG_FORMATO", "texto")
+    if amostragem_payloads is None:
+        amostragem_payloads = float(os.getenv("LOG_AMOSTRAGEM_PAYLOADS", "0.01"))
+    if formato not in ("texto", "json"):
+        raise ValueError(f"Formato de registro inválido: {formato}")
+
+    saida = logging.StreamHandler(destino or sys.stderr)
+    saida.setFormatter(FormatadorJSON() if formato == "json" else logging.Formatter(FORMATO_TEXTO))
+
+    _encerrar()
+    fila = queue.SimpleQueue()
+    _listener = _SaidaAssincrona(fila, saida, respect_handler_level=True)
+    _listener.start()
+
+    raiz = logging.getLogger()
+    for handler in [h for h in raiz.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        raiz.removeHandler(handler)
+    raiz.addHandler(logging.handlers.QueueHandler(fila))
+    raiz.setLevel(nivel)
+
+    for modulo, nivel_modulo in niveis.items():
+        logging.getLogger(modulo).setLevel(nivel_modulo)
+
+    # Payloads: mesmo nível do módulo (herdado), mas só uma fração passa
+    for modulo in ("cliente_rotas", "provedores_rotas"):
+        payloads = logger_payloads(modulo)
+        for filtro in [f for f in payloads.filters if isinstance(f, FiltroAmostragem)]:
+            payloads.removeFilter(filtro)
+        payloads.addFilter(FiltroAmostragem(amostragem_payloads))
+    return _listener
+
+
+@atexit.register
+def _encerrar():
+    # Esvazia a fila e para a thread de saída (se ainda não foi parada)
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,457 @@
+import csv
+import os
+import threading
+import time
+from array import array
+import numpy as np
+from distancias import DistanciasVetorizadas
+from indice_espacial import Coordenadas, GradeEspacial
+from metricas import duracao_indice, pontos_carregados
+from snapshot_pontos import caminho_snapshot, ler_snapshot
+
+CSV_PADRAO = "pontos-de-coleta.csv"
+
+# Modos de combinação dos tipos de lixo no filtro
+MODO_TODOS = "todos"
+MODO_QUALQUER = "qualquer"
+
+
+def normalizar_tipos(tipo_lixo):
+    """
+    Divide a coluna tipo_lixo (separada por \\,) em tipos normalizados.
+
+    Args:
+        tipo_lixo: Valor bruto da coluna tipo_lixo do CSV
+
+    Retorna:
+        Tupla de tipos em minúsculas e sem espaços
+    """
+    return tuple(t.strip().lower() for t in tipo_lixo.split(r"\,") if t.strip())
+
+
+def posicoes_da_mascara(mascara):
+    """
+    Converte um bitset (int) nas posições dos bits ligados.
+
+    Args:
+        mascara: Inteiro usado como bitset de posições de registros
+
+    Retorna:
+        Lista crescente de posições
+    """
+    bits = bin(mascara)[:1:-1]
+    posicoes = []
+    posicao = bits.find('1')
+    while posicao != -1:
+        posicoes.append(posicao)
+        posicao = bits.find('1', posicao + 1)
+    return posicoes
+
+
+def mascara_de_posicoes(posicoes, tamanho):
+    """
+    Monta um bitset (int) com os bits das posições informadas ligados.
+
+    Args:
+        posicoes: Posições de registros
+        tamanho: Número total de registros
+
+    Retorna:
+        Inteiro usado como bitset
+    """
+    buffer = bytearray((tamanho + 7) // 8)
+    for posicao in posicoes:
+        buffer[posicao >> 3] |= 1 << (posicao & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class TabelaTextos:
+    """
+    Tabela de textos sem repetição: cada texto distinto é guardado uma única
+    vez e referenciado pelas colunas por um índice inteiro.
+    """
+
+    __slots__ = ('textos', '_indices')
+
+    def __init__(self):
+        self.textos = []
+        self._indices = {}
+
+    def adicionar(self, texto):
+        """Retorna o índice do texto, incluindo-o na tabela se for novo."""
+        indice = self._indices.get(texto)
+        if indice is None:
+            indice = self._indices[texto] = len(self.textos)
+            self.textos.append(texto)
+        return indice
+
+    def congelar(self):
+        """Encerra a carga: descarta o dicionário de busca e fixa os textos."""
+        self.textos = tuple(self.textos)
+        self._indices = None
+
+    def __getitem__(self, indice):
+        return self.textos[indice]
+
+    def __len__(self):
+        return len(self.textos)
+
+
+class Ponto:
+    """
+    Visão de um ponto dentro de um DadosPontos, sem cópia dos dados.
+
+    Os campos são lidos das colunas sob demanda; o dicionário da API só é
+    montado por para_dict(), na hora de serializar a resposta.
+    """
+
+    __slots__ = ('dados', 'posicao')
+
+    def __init__(self, dados, posicao):
+        self.dados = dados
+        self.posicao = posicao
+
+    @property
+    def id(self):
+        return self.dados.textos[self.dados.ids[self.posicao]]
+
+    @property
+    def nome(self):
+        return self.dados.textos[self.dados.nomes[self.posicao]]
+
+    @property
+    def tipo_lixo(self):
+        return self.dados.textos[self.dados.tipos_lixo[self.posicao]]
+
+    @property
+    def endereco(self):
+        return self.dados.textos[self.dados.enderecos[self.posicao]]
+
+    @property
+    def latitude(self):
+        return self.dados.latitudes[self.posicao]
+
+    @property
+    def longitude(self):
+        return self.dados.longitudes[self.posicao]
+
+    @property
+    def tipos(self):
+        """Tupla dos tipos normalizados aceitos pelo ponto."""
+        mascara = self.dados.mascaras[self.posicao]
+        return tuple(tipo for tipo, bit in self.dados.bits_tipos.items() if mascara & bit)
+
+    def para_dict(self):
+        """
+        Materializa o ponto como o dicionário usado pela API.
+
+        Retorna:
+            Dicionário novo com id, nome, tipo_lixo, latitude, longitude e endereco
+        """
+        dados, posicao = self.dados, self.posicao
+        textos = dados.textos
+        return {
+            'id': textos[dados.ids[posicao]],
+            'nome': textos[dados.nomes[posicao]],
+            'tipo_lixo': textos[dados.tipos_lixo[posicao]],
+            'latitude': dados.latitudes[posicao],
+            'longitude': dados.longitudes[posicao],
+            'endereco': textos[dados.enderecos[posicao]]
+        }
+
+
+class DadosPontos:
+    """
+    Conjunto imutável de dados de uma carga do CSV, em colunas.
+
+    Coordenadas ficam em array('d'); id, nome, tipo_lixo e endereco são
+    índices (array('I')) em uma única TabelaTextos, de modo que textos
+    repetidos (redes de lojas, combinações de tipos) são guardados uma vez.
+    Cada tipo de lixo recebe um bit, e cada ponto guarda a máscara dos seus
+    tipos. Há ainda o índice invertido tipo -> bitset (int) com as posições
+    dos pontos que aceitam aquele tipo e a grade espacial sobre as coordenadas.
+    A assinatura identifica a carga (igual em todos os processos que leram
+    o mesmo arquivo) e é usada em cursores de paginação.
+
+    Args:
+        linhas: Iterável de tuplas (id, nome, tipo_lixo, latitude, longitude, endereco)
+        assinatura: Identificador da carga
+    """
+
+    __slots__ = ('latitudes', 'longitudes', 'textos', 'ids', 'nomes', 'tipos_lixo', 'enderecos',
+                 'bits_tipos', 'mascaras', 'indice_tipos', 'todos', 'grade', 'assinatura', '_distancias')
+
+    def __init__(self, linhas=(), assinatura=""):
+        self.assinatura = assinatura
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.textos = TabelaTextos()
+        self.ids, self.nomes, self.tipos_lixo, self.enderecos = (array('I') for _ in range(4))
+        self.bits_tipos = {}
+
+        # tipo_lixo se repete muito: cada texto distinto é dividido em tipos uma vez só
+        mascara_por_texto = {}
+        mascaras = []
+        for id_ponto, nome, tipo_lixo, lat, lon, endereco in linhas:
+            self.latitudes.append(lat)
+            self.longitudes.append(lon)
+            self.ids.append(self.textos.adicionar(id_ponto))
+            self.nomes.append(self.textos.adicionar(nome))
+            self.enderecos.append(self.textos.adicionar(endereco))
+            indice = self.textos.adicionar(tipo_lixo)
+            self.tipos_lixo.append(indice)
+            mascara = mascara_por_texto.get(indice)
+            if mascara is None:
+                mascara = 0
+                for tipo in normalizar_tipos(tipo_lixo):
+                    mascara |= self.bits_tipos.setdefault(tipo, 1 << len(self.bits_tipos))
+                mascara_por_texto[indice] = mascara
+            mascaras.append(mascara)
+        self.textos.congelar()
+        # Até 64 tipos cabem em inteiros de 64 bits sem sinal
+        self.mascaras = array('Q', mascaras) if len(self.bits_tipos) <= 64 else tuple(mascaras)
+
+        total = len(mascaras)
+        self.todos = (1 << total) - 1
+        self.indice_tipos = {
+            tipo: mascara_de_posicoes([p for p, m in enumerate(mascaras) if m & bit], total)
+            for tipo, bit in self.bits_tipos.items()
+        }
+        self.grade = GradeEspacial(Coordenadas(self.latitudes, self.longitudes))
+        self._distancias = None
+
+    @classmethod
+    def de_colunas(cls, latitudes, longitudes, textos, ids, nomes, tipos_lixo, enderecos,
+                   bits_tipos, mascaras, indice_tipos, grade, assinatura=""):
+        """
+        Monta os dados a partir de colunas e índices prontos (ex.: mapeados de
+        um snapshot binário), sem reprocessar o CSV.
+
+        As colunas podem ser array ou memoryview; textos precisa apenas de
+        acesso por índice.
+        """
+        dados = cls.__new__(cls)
+        dados.latitudes, dados.longitudes = latitudes, longitudes
+        dados.textos = textos
+        dados.ids, dados.nomes, dados.tipos_lixo, dados.enderecos = ids, nomes, tipos_lixo, enderecos
+        dados.bits_tipos = bits_tipos
+        dados.mascaras = mascaras
+        dados.indice_tipos = indice_tipos
+        dados.grade = grade
+        dados.assinatura = assinatura
+        dados.todos = (1 << len(latitudes)) - 1
+        dados._distancias = None
+        return dados
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def ponto(self, posicao):
+        """Retorna a visão (Ponto) da posição informada."""
+        return Ponto(self, posicao)
+
+    def pontos(self, posicoes):
+        """Retorna a lista de visões (Ponto) das posições informadas."""
+        return [Ponto(self, posicao) for posicao in posicoes]
+
+    def distancias(self):
+        """
+        Retorna o cálculo vetorizado de distâncias sobre as coordenadas
+        (criado na primeira chamada e reaproveitado depois).
+
+        Retorna:
+            Instância de DistanciasVetorizadas
+        """
+        if self._distancias is None:
+            self._distancias = DistanciasVetorizadas(
+                np.frombuffer(self.latitudes, dtype=np.float64),
+                np.frombuffer(self.longitudes, dtype=np.float64)
+            )
+        return self._distancias
+
+    def selecao_tipos(self, tipos, modo=MODO_TODOS):
+        """
+        Calcula, de forma vetorizada sobre as máscaras de tipos dos pontos,
+        as posições que aceitam os tipos informados.
+
+        Retorna:
+            None quando não há tipos (sem filtro); caso contrário, np.ndarray
+            crescente de posições
+        """
+        if not tipos:
+            return None
+        if modo not in (MODO_TODOS, MODO_QUALQUER):
+            raise ValueError(f"Modo de filtro inválido: {modo}")
+        if len(self.bits_tipos) > 64:
+            return np.asarray(self.posicoes(tipos, modo), dtype=np.intp)
+        bits = 0
+        for tipo in tipos:
+            bit = self.bits_tipos.get(tipo)
+            if bit is None:
+                if modo == MODO_TODOS:
+                    return np.empty(0, dtype=np.intp)
+                continue
+            bits |= bit
+        mascaras = np.frombuffer(self.mascaras, dtype=np.uint64)
+        if modo == MODO_QUALQUER:
+            return np.flatnonzero(mascaras & np.uint64(bits))
+        return np.flatnonzero((mascaras & np.uint64(bits)) == bits)
+
+    def mascara_tipos(self, tipos, modo=MODO_TODOS):
+        """
+        Calcula o bitset dos registros que atendem aos tipos informados.
+
+        Args:
+            tipos: Tipos de lixo já normalizados
+            modo: MODO_TODOS (interseção) ou MODO_QUALQUER (união)
+
+        Retorna:
+            Inteiro com um bit ligado por registro selecionado
+        """
+        if not tipos:
+            return 0
+        if modo == MODO_QUALQUER:
+            mascara = 0
+            for tipo in tipos:
+                mascara |= self.indice_tipos.get(tipo, 0)
+            return mascara
+        if modo != MODO_TODOS:
+            raise ValueError(f"Modo de filtro inválido: {modo}")
+        mascara = self.todos
+        for tipo in tipos:
+            mascara &= self.indice_tipos.get(tipo, 0)
+            if not mascara:
+                break
+        return mascara
+
+    def filtro_tipos(self, tipos, modo=MODO_TODOS):
+        """
+        Cria um predicado posicao -> bool para os tipos informados.
+
+        Retorna:
+            None quando não há tipos (sem filtro); caso contrário, a função
+            que compara a máscara de tipos do ponto com os bits pedidos
+        """
+        if not tipos:
+            return None
+        if modo not in (MODO_TODOS, MODO_QUALQUER):
+            raise ValueError(f"Modo de filtro inválido: {modo}")
+        bits = 0
+        for tipo in tipos:
+            bit = self.bits_tipos.get(tipo)
+            if bit is None:
+                if modo == MODO_TODOS:
+                    return lambda posicao: False
+                continue
+            bits |= bit
+        mascaras = self.mascaras
+        if modo == MODO_QUALQUER:
+            return lambda posicao: mascaras[posicao] & bits != 0
+        return lambda posicao: mascaras[posicao] & bits == bits
+
+    def posicoes(self, tipos=None, modo=MODO_TODOS):
+        """
+        Retorna as posições (crescentes) dos registros que aceitam os tipos;
+        sem tipos, retorna todas as posições.
+        """
+        if not tipos:
+            return range(len(self))
+        return posicoes_da_mascara(self.mascara_tipos(tipos, modo))
+
+    def filtrar_por_tipos(self, tipos, modo=MODO_TODOS):
+        """
+        Retorna as visões (Ponto) dos registros que aceitam os tipos informados,
+        na ordem do CSV.
+        """
+        return self.pontos(posicoes_da_mascara(self.mascara_tipos(tipos, modo)))
+
+
+class RepositorioPontos:
+    """
+    Repositório em memória dos pontos de coleta.
+
+    O CSV é lido uma única vez e mantido como um DadosPontos (colunas e
+    índices). Toda leitura confere o mtime do arquivo e recarrega os
+    dados quando ele muda, de modo que editar o CSV não exige reiniciar o
+    servidor.
+
+    Se existir um snapshot binário do CSV (ver snapshot_pontos.py) gerado
+    a partir do conteúdo atual, ele é mapeado em memória em vez de o CSV
+    ser processado; snapshots desatualizados ou inválidos são ignorados.
+
+    Args:
+        csv_file: Caminho do arquivo CSV
+        usar_snapshot: Se deve tentar o snapshot antes do CSV
+    """
+
+    def __init__(self, csv_file=CSV_PADRAO, usar_snapshot=True):
+        self.csv_file = csv_file
+        self.usar_snapshot = usar_snapshot
+        self.versao = 0
+        self._mtime = None
+        self._dados = DadosPontos()
+        self._lock = threading.Lock()
+
+    def _carregar(self, mtime):
+        inicio = time.perf_counter()
+        dados, fonte = self._construir(mtime)
+        duracao_indice.definir(time.perf_counter() - inicio, fonte=fonte)
+        pontos_carregados.definir(len(dados))
+        return dados
+
+    def _construir(self, mtime):
+        assinatura = f"{mtime:x}"
+        if self.usar_snapshot:
+            partes = ler_snapshot(caminho_snapshot(self.csv_file), self.csv_file)
+            if partes is not None:
+                return DadosPontos.de_colunas(assinatura=assinatura, **partes), "snapshot"
+
+        with open(self.csv_file, newline='', encoding='utf-8') as arquivo:
+            leitor = csv.DictReader(arquivo, skipinitialspace=True)
+            linhas = (
+                (row['id'], row['nome'], row['tipo_lixo'],
+                 float(row['latitude']), float(row['longitude']), row['endereco'])
+                for row in leitor if row['tipo_lixo']
+            )
+            return DadosPontos(linhas, assinatura=assinatura), "csv"
+
+    def dados(self):
+        """
+        Retorna os dados atuais, recarregando o CSV se ele foi alterado.
+
+        Retorna:
+            Instância de DadosPontos
+        """
+        mtime = os.stat(self.csv_file).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._dados = self._carregar(mtime)
+                    self._mtime = mtime
+                    self.versao += 1
+        return self._dados
+
+    def __len__(self):
+        return len(self.dados())
+
+
+_repositorios = {}
+_repositorios_lock = threading.Lock()
+
+
+def obter_repositorio(csv_file=CSV_PADRAO):
+    """
+    Retorna o repositório compartilhado pelo processo para o CSV informado.
+
+    Args:
+        csv_file: Caminho do arquivo CSV
+
+    Retorna:
+        Instância de RepositorioPontos (uma por caminho absoluto)
+    """
+    chave = os.path.abspath(csv_file)
+    repositorio = _repositorios.get(chave)
+    if repositorio is None:
+        with _repositorios_lock:
+            repositorio = _repositorios.setdefault(chave, RepositorioPontos(chave))
+    return repositorio
@@ -0,0 +1,201 @@
+"""
+Servidor HTTP local que imita o endpoint computeRouteMatrix da Google Routes API v2
+(POST) e o serviço table do OSRM (GET /table/v1/{perfil}/{lon,lat;...}).
+
+Usado pelos testes (e por scripts de medição) para exercitar o cliente de
+rotas sem acessar a rede nem gastar cota da API. A distância retornada é a
+distância em linha reta multiplicada por um fator de desvio, e a duração
+assume uma velocidade média constante.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from distancias import haversine_km
+
+
+def _lat_lng(waypoint):
+    lat_lng = waypoint['waypoint']['location']['latLng']
+    return lat_lng['latitude'], lat_lng['longitude']
+
+
+class ServidorRotasFalso:
+    """
+    Servidor computeRouteMatrix falso, executado em uma thread própria.
+
+    Args:
+        latencia: Atraso (segundos) aplicado antes de cada resposta
+        fator_desvio: Multiplicador da distância em linha reta
+        velocidade_kmh: Velocidade média usada para calcular a duração
+        limite_elementos: Máximo de origens x destinos aceito por requisição
+        porta: Porta de 127.0.0.1 onde o servidor escuta (0: uma porta livre)
+
+    Atributos:
+        requisicoes: Lista com o corpo JSON de cada requisição recebida
+        falhas: Lista de códigos HTTP a devolver, em ordem, antes de responder normalmente
+        pico_concorrencia: Maior número de requisições atendidas simultaneamente
+        conexoes: Número de conexões TCP aceitas (keep-alive reaproveita conexões)
+    """
+
+    def __init__(self, latencia=0.0, fator_desvio=1.3, velocidade_kmh=40.0, limite_elementos=625, porta=0):
+        self.latencia = latencia
+        self.fator_desvio = fator_desvio
+        self.velocidade_kmh = velocidade_kmh
+        self.limite_elementos = limite_elementos
+        self.porta = porta
+        self.requisicoes = []
+        self.falhas = []
+        self.pico_concorrencia = 0
+        self.conexoes = 0
+        self._em_andamento = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url_base(self):
+        host, porta = self._httpd.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    @property
+    def url(self):
+        return f"{self.url_base}/distanceMatrix/v2:computeRouteMatrix"
+
+    def _metros_e_segundos(self, o_lat, o_lon, d_lat, d_lon):
+        metros = int(haversine_km(o_lat, o_lon, d_lat, d_lon) * 1000 * self.fator_desvio)
+        return metros, int(metros / (self.velocidade_kmh / 3.6))
+
+    def calcular_tabela_osrm(self, caminho):
+        """
+        Calcula a resposta do serviço table do OSRM para um caminho
+        /table/v1/{perfil}/{lon,lat;...}?sources=...
+        """
+        partes = urlsplit(caminho)
+        coordenadas = [tuple(map(float, c.split(','))) for c in partes.path.rsplit('/', 1)[1].split(';')]
+        consulta = parse_qs(partes.query)
+        fontes = consulta.get('sources', ['all'])[0]
+        fontes = range(len(coordenadas)) if fontes == 'all' else [int(i) for i in fontes.split(';')]
+        duracoes, distancias = [], []
+        for i in fontes:
+            o_lon, o_lat = coordenadas[i]
+            linha = [self._metros_e_segundos(o_lat, o_lon, d_lat, d_lon) for d_lon, d_lat in coordenadas]
+            distancias.append([m for m, _ in linha])
+            duracoes.append([seg for _, seg in linha])
+        return {'code': 'Ok', 'durations': duracoes, 'distances': distancias}
+
+    def calcular_matriz(self, corpo):
+        """
+        Calcula os elementos da matriz para o corpo de uma requisição.
+
+        Retorna:
+            Lista de elementos no formato da Routes API
+        """
+        elementos = []
+        for i, origem in enumerate(corpo.get('origins', [])):
+            o_lat, o_lon = _lat_lng(origem)
+            for j, destino in enumerate(corpo.get('destinations', [])):
+                metros, segundos = self._metros_e_segundos(o_lat, o_lon, *_lat_lng(destino))
+                elementos.append({
+                    'originIndex': i,
+                    'destinationIndex': j,
+                    'distanceMeters': metros,
+                    'duration': f"{segundos}s",
+                })
+        return elementos
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Cabeçalhos e corpo saem em escritas separadas: sem TCP_NODELAY, cada
+            # resposta em conexão reaproveitada esperaria o ACK atrasado do cliente (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with servidor._lock:
+                    servidor.conexoes += 1
+
+            def _responder(self, status, corpo):
+                dados = json.dumps(corpo).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def do_GET(self):
+                with servidor._lock:
+                    servidor.requisicoes.append({'GET': self.path})
+                    falha = servidor.falhas.pop(0) if servidor.falhas else None
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if falha is not None:
+                    self._responder(falha, {'code': 'Error', 'message': 'falha simulada'})
+                elif not self.path.startswith('/table/v1/'):
+                    self._responder(404, {'code': 'InvalidUrl', 'message': self.path})
+                else:
+                    self._responder(200, servidor.calcular_tabela_osrm(self.path))
+
+            def do_POST(self):
+                tamanho = int(self.headers.get('Content-Length', 0))
+                corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+                with servidor._lock:
+                    servidor.requisicoes.append(corpo)
+                    falha = servidor.falhas.pop(0) if servidor.falhas else None
+                    servidor._em_andamento += 1
+                    servidor.pico_concorrencia = max(servidor.pico_concorrencia, servidor._em_andamento)
+
+                try:
+                    self._processar(corpo, falha)
+                finally:
+                    with servidor._lock:
+                        servidor._em_andamento -= 1
+
+            def _processar(self, corpo, falha):
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+
+                if falha is not None:
+                    self._responder(falha, {'error': {'code': falha, 'message': 'falha simulada'}})
+                    return
+
+                n_elementos = len(corpo.get('origins', [])) * len(corpo.get('destinations', []))
+                if n_elementos > servidor.limite_elementos:
+                    self._responder(400, {'error': {'code': 400, 'message': 'Too many elements'}})
+                    return
+
+                self._responder(200, servidor.calcular_matriz(corpo))
+
+        return Handler
+
+    def iniciar(self):
+        """Inicia o servidor em 127.0.0.1 (na porta configurada ou em uma porta livre)."""
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', self.porta), self._criar_handler(), bind_and_activate=False)
+        # Fila de conexões maior que o padrão (5): rajadas de clientes simultâneos não esperam SYN repetido
+        self._httpd.request_queue_size = 128
+        self._httpd.server_bind()
+        self._httpd.server_activate()
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        """Encerra o servidor."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
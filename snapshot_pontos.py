@@ -0,0 +1,316 @@
+"""
+Snapshot binário dos pontos de coleta.
+
+Compila o CSV (colunas, tabela de textos, índice de tipos e grade espacial)
+em um arquivo que os processos do servidor mapeiam em memória com mmap: as
+páginas são compartilhadas entre workers pelo cache do sistema operacional
+e a inicialização não depende de reprocessar o CSV.
+
+Uso:
+    python snapshot_pontos.py [arquivo.csv] [destino] [--verificar]
+
+O arquivo é um contêiner binário (ver conteiner_binario.py). Os metadados
+trazem o carimbo (tamanho, mtime_ns) e o SHA-256 do CSV de origem. Ao
+carregar, cada worker confere o cabeçalho (CRC-32 dos metadados e tamanho
+do arquivo) e compara o carimbo com o do CSV (um os.stat), sem ler o CSV
+nem o snapshot inteiros. Se o carimbo não bater (o CSV mudou ou os arquivos
+foram copiados, o que muda o mtime), o SHA-256 do CSV decide: se for o
+mesmo, o snapshot é usado e recarimbado (regravado com o carimbo novo,
+depois de conferir o CRC-32 do conteúdo); senão, é ignorado. A verificação
+completa (CRC-32 do conteúdo e SHA-256 do CSV) fica para --verificar
+(verificar_snapshot).
+
+Compartilhados entre workers (lidos direto do mapa): colunas, textos e as
+posições de cada célula da grade. Montados em cada worker a partir do mapa:
+o índice de tipos, um inteiro Python (bitset) por tipo, com n/8 bytes cada,
+e o dicionário de células da grade, uma entrada por célula ocupada (as
+posições continuam no mapa).
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from array import array
+from conteiner_binario import ErroConteiner, abrir_conteiner, fechar_conteiner, gravar_conteiner, regravar_metadados
+from indice_espacial import Coordenadas, GradeEspacial
+
+MAGICO = b"PCSNAP\x00\x01"
+VERSAO_FORMATO = 2
+EXTENSAO_SNAPSHOT = ".snap"
+
+logger = logging.getLogger(__name__)
+
+# Seções de colunas: nome -> código de tipo (array/memoryview)
+SECOES_COLUNAS = {
+    "latitudes": "d",
+    "longitudes": "d",
+    "ids": "I",
+    "nomes": "I",
+    "tipos_lixo": "I",
+    "enderecos": "I",
+    "mascaras": "Q",
+}
+
+
+def caminho_snapshot(csv_file):
+    """Caminho padrão do snapshot de um CSV (mesmo diretório, extensão .snap)."""
+    return csv_file + EXTENSAO_SNAPSHOT
+
+
+def carimbo_arquivo(caminho):
+    """Carimbo [tamanho, mtime_ns] de um arquivo, usado para saber se o CSV mudou."""
+    estado = os.stat(caminho)
+    return [estado.st_size, estado.st_mtime_ns]
+
+
+def hash_arquivo(caminho):
+    """Calcula o SHA-256 (hex) do conteúdo de um arquivo."""
+    resumo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+class TextosMapeados:
+    """
+    Tabela de textos lida de um snapshot: deslocamentos em uma coluna e os
+    bytes UTF-8 concatenados em outra; cada texto é decodificado ao ser lido.
+    """
+
+    __slots__ = ("deslocamentos", "conteudo")
+
+    def __init__(self, deslocamentos, conteudo):
+        self.deslocamentos = deslocamentos
+        self.conteudo = conteudo
+
+    def __getitem__(self, indice):
+        return str(self.conteudo[self.deslocamentos[indice]:self.deslocamentos[indice + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self.deslocamentos) - 1
+
+
+def gravar_snapshot(dados, destino, csv_sha256, csv_carimbo):
+    """
+    Grava um DadosPontos como snapshot binário.
+
+    O arquivo é escrito ao lado do destino e renomeado no final, de modo que
+    processos lendo o snapshot antigo nunca vejam um arquivo pela metade.
+
+    Args:
+        dados: DadosPontos carregado do CSV
+        destino: Caminho do snapshot
+        csv_sha256: SHA-256 do CSV de origem
+        csv_carimbo: carimbo_arquivo do CSV de origem
+
+    Lança:
+        ValueError: se houver mais de 64 tipos de lixo (máscaras não cabem em 64 bits)
+    """
+    if len(dados.bits_tipos) > 64:
+        raise ValueError("Snapshot suporta no máximo 64 tipos de lixo")
+
+    secoes = []
+    for nome, codigo in SECOES_COLUNAS.items():
+        secoes.append((nome, codigo, array(codigo, getattr(dados, nome)).tobytes()))
+
+    # Tabela de textos: deslocamentos + bytes concatenados
+    conteudo = bytearray()
+    deslocamentos = array("Q", [0])
+    for indice in range(len(dados.textos)):
+        conteudo += dados.textos[indice].encode("utf-8")
+        deslocamentos.append(len(conteudo))
+    secoes.append(("textos_deslocamentos", "Q", deslocamentos.tobytes()))
+    secoes.append(("textos_conteudo", "", bytes(conteudo)))
+
+    # Índice de tipos: um bitset por tipo, na ordem dos bits
+    tipos = sorted(dados.bits_tipos, key=dados.bits_tipos.get)
+    tamanho_bitset = (len(dados) + 7) // 8
+    indice = b"".join(dados.indice_tipos[tipo].to_bytes(tamanho_bitset, "little") for tipo in tipos)
+    secoes.append(("indice_tipos", "", indice))
+
+    # Grade espacial em formato CSR: chaves das células, início de cada uma e posições
+    chaves = array("i")
+    inicios = array("I", [0])
+    posicoes = array("I")
+    for (linha, coluna), posicoes_celula in sorted(dados.grade.celulas.items()):
+        chaves.extend((linha, coluna))
+        posicoes.extend(posicoes_celula)
+        inicios.append(len(posicoes))
+    secoes.append(("grade_chaves", "i", chaves.tobytes()))
+    secoes.append(("grade_inicios", "I", inicios.tobytes()))
+    secoes.append(("grade_posicoes", "I", posicoes.tobytes()))
+
+    metadados = {
+        "csv_sha256": csv_sha256,
+        "csv_carimbo": csv_carimbo,
+        "total": len(dados),
+        "tipos": tipos,
+        "tamanho_celula": dados.grade.tamanho_celula,
+    }
+    gravar_conteiner(destino, MAGICO, VERSAO_FORMATO, metadados, secoes)
+
+
+def ler_snapshot(caminho, csv_file):
+    """
+    Mapeia um snapshot em memória e devolve as partes para montar um DadosPontos.
+
+    Args:
+        caminho: Caminho do snapshot
+        csv_file: CSV de origem (para conferir se o snapshot está atualizado)
+
+    Só o cabeçalho é conferido (CRC-32 dos metadados e tamanho); o CRC-32
+    do conteúdo só quando o carimbo não bate (ver _recarimbar_snapshot) ou
+    em verificar_snapshot.
+
+    Retorna:
+        Dicionário com os argumentos de DadosPontos.de_colunas (sem assinatura),
+        ou None se o snapshot não existir, for de outra versão do formato,
+        estiver truncado ou não tiver sido gerado do conteúdo atual do CSV
+    """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        metadados, secoes = abrir_conteiner(caminho, MAGICO, VERSAO_FORMATO, verificar_crc=False)
+        if metadados.get("csv_carimbo") != carimbo_arquivo(csv_file):
+            # Nada foi montado a partir do mapa ainda: fecha antes de regravar o arquivo
+            fechar_conteiner(secoes)
+            if not _recarimbar_snapshot(caminho, csv_file, metadados):
+                return None
+            metadados, secoes = abrir_conteiner(caminho, MAGICO, VERSAO_FORMATO, verificar_crc=False)
+    except (OSError, ErroConteiner) as e:
+        logger.warning("Snapshot %s ignorado (%s); lendo o CSV", caminho, e)
+        return None
+    try:
+        return _montar_partes(metadados, secoes)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Snapshot %s incompleto (%r); lendo o CSV", caminho, e)
+        return None
+
+
+def _recarimbar_snapshot(caminho, csv_file, metadados):
+    """
+    Chamado quando o carimbo do CSV não bate com o do snapshot: confere o
+    SHA-256 do CSV e, se for o mesmo conteúdo, regrava o snapshot com o
+    carimbo atual (para os próximos processos não recalcularem o hash).
+
+    Args:
+        caminho: Caminho do snapshot
+        csv_file: CSV de origem
+        metadados: Metadados do snapshot
+
+    Retorna:
+        True se o snapshot corresponde ao conteúdo atual do CSV
+
+    Lança:
+        ErroConteiner: se o conteúdo do snapshot estiver corrompido
+    """
+    # Carimbo antes do hash, como em compilar_snapshot
+    csv_carimbo = carimbo_arquivo(csv_file)
+    # Snapshots sem a chave também contam como desatualizados
+    if metadados.get("csv_sha256") != hash_arquivo(csv_file):
+        logger.warning("Snapshot %s desatualizado em relação ao CSV; lendo o CSV", caminho)
+        return False
+    try:
+        regravar_metadados(caminho, MAGICO, VERSAO_FORMATO, {"csv_carimbo": csv_carimbo})
+    except OSError as e:
+        # Ex.: diretório somente leitura; o snapshot serve, mas cada processo recalcula o hash
+        logger.warning("Snapshot %s não pôde ser recarimbado (%s)", caminho, e)
+    else:
+        logger.info("Snapshot %s recarimbado: o CSV mudou de data, mas não de conteúdo", caminho)
+    return True
+
+
+def _montar_partes(metadados, secoes):
+    partes = {nome: secoes[nome] for nome in SECOES_COLUNAS}
+    partes["textos"] = TextosMapeados(secoes["textos_deslocamentos"], secoes["textos_conteudo"])
+
+    tipos = metadados["tipos"]
+    partes["bits_tipos"] = {tipo: 1 << bit for bit, tipo in enumerate(tipos)}
+    tamanho_bitset = (metadados["total"] + 7) // 8
+    indice = secoes["indice_tipos"]
+    partes["indice_tipos"] = {
+        tipo: int.from_bytes(indice[bit * tamanho_bitset:(bit + 1) * tamanho_bitset], "little")
+        for bit, tipo in enumerate(tipos)
+    }
+
+    chaves, inicios, posicoes = secoes["grade_chaves"], secoes["grade_inicios"], secoes["grade_posicoes"]
+    celulas = {
+        (chaves[2 * i], chaves[2 * i + 1]): posicoes[inicios[i]:inicios[i + 1]]
+        for i in range(len(inicios) - 1)
+    }
+    partes["grade"] = GradeEspacial.de_celulas(
+        Coordenadas(partes["latitudes"], partes["longitudes"]), celulas, metadados["tamanho_celula"]
+    )
+    return partes
+
+
+def compilar_snapshot(csv_file, destino=None):
+    """
+    Lê o CSV e grava o snapshot correspondente.
+
+    Args:
+        csv_file: Caminho do arquivo CSV
+        destino: Caminho do snapshot (padrão: caminho_snapshot(csv_file))
+
+    Retorna:
+        Caminho do snapshot gravado
+    """
+    # Importado aqui porque repositorio_pontos importa este módulo
+    from repositorio_pontos import RepositorioPontos
+
+    destino = destino or caminho_snapshot(csv_file)
+    # Carimbo antes da leitura: se o CSV mudar durante a compilação, o snapshot já nasce desatualizado
+    csv_carimbo = carimbo_arquivo(csv_file)
+    csv_sha256 = hash_arquivo(csv_file)
+    dados = RepositorioPontos(csv_file, usar_snapshot=False).dados()
+    gravar_snapshot(dados, destino, csv_sha256, csv_carimbo)
+    return destino
+
+
+def verificar_snapshot(caminho, csv_file):
+    """
+    Verificação completa de um snapshot: CRC-32 de todo o conteúdo e SHA-256
+    do CSV de origem (lê os dois arquivos inteiros).
+
+    Args:
+        caminho: Caminho do snapshot
+        csv_file: CSV de origem
+
+    Retorna:
+        True se o snapshot está íntegro e foi gerado do conteúdo atual do CSV
+        (o motivo da falha é registrado como aviso)
+    """
+    try:
+        metadados, _ = abrir_conteiner(caminho, MAGICO, VERSAO_FORMATO)
+    except (OSError, ErroConteiner) as e:
+        logger.warning("Snapshot %s inválido (%s)", caminho, e)
+        return False
+    if metadados.get("csv_sha256") != hash_arquivo(csv_file):
+        logger.warning("Snapshot %s foi gerado de outro conteúdo do CSV", caminho)
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila (ou verifica) o snapshot binário dos pontos")
+    parser.add_argument("csv", nargs="?", default="pontos-de-coleta.csv", help="arquivo CSV dos pontos")
+    parser.add_argument("destino", nargs="?", help="arquivo do snapshot (padrão: CSV + .snap)")
+    parser.add_argument("--verificar", action="store_true",
+                        help="só confere CRC-32 e SHA-256 do CSV de um snapshot existente")
+    args = parser.parse_args()
+
+    if args.verificar:
+        caminho = args.destino or caminho_snapshot(args.csv)
+        logging.basicConfig(format="%(levelname)s %(message)s")
+        if not verificar_snapshot(caminho, args.csv):
+            sys.exit(1)
+        print(f"✅ Snapshot {caminho} íntegro e atualizado")
+        return
+    destino = compilar_snapshot(args.csv, args.destino)
+    print(f"✅ Snapshot gravado em {destino} ({os.path.getsize(destino)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+// Carregamento sob demanda dos pontos de coleta no mapa (/mapa).
+// A cada movimento do mapa, busca em /api/coleta-pontos.geojson apenas a área
+// visível no zoom atual; o servidor já devolve os pontos próximos agrupados.
+
+function escaparHtml(texto) {
+    return String(texto == null ? '' : texto)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+function popupPontoColeta(propriedades, latlng) {
+    var googleMapsUrl = 'https://www.google.com/maps?q=' + latlng.lat + ',' + latlng.lng;
+    return '<div style="min-width: 200px; font-family: Arial, sans-serif;">' +
+        '<b style="font-size: 14px;">' + escaparHtml(propriedades.nome) + '</b><br>' +
+        '<small>' + escaparHtml(propriedades.endereco || 'N/A') + '</small><br>' +
+        '<b>Tipos:</b> ' + escaparHtml(propriedades.tipo_lixo) + '<br>' +
+        '<br><a href="' + googleMapsUrl + '" target="_blank" style="color: blue; text-decoration: none;">' +
+        '📍 Ver no Google Maps</a></div>';
+}
+
+function marcadorGrupo(mapa, latlng, quantidade) {
+    var lado = quantidade < 10 ? 30 : quantidade < 100 ? 36 : 44;
+    var icone = L.divIcon({
+        className: '',
+        iconSize: [lado, lado],
+        html: '<div style="width: ' + lado + 'px; height: ' + lado + 'px; line-height: ' + lado + 'px; ' +
+              'border-radius: 50%; background: rgba(220, 38, 38, 0.85); color: white; ' +
+              'font: bold 13px Arial, sans-serif; text-align: center; ' +
+              'border: 3px solid rgba(255, 255, 255, 0.8);">' + quantidade + '</div>'
+    });
+    return L.marker(latlng, {icon: icone, title: quantidade + ' pontos'}).on('click', function () {
+        mapa.setView(latlng, Math.min(mapa.getZoom() + 2, mapa.getMaxZoom()));
+    });
+}
+
+function carregarPontosColeta(mapa, filtros) {
+    var camada = L.layerGroup().addTo(mapa);
+    var controlador = null;
+
+    function atualizar() {
+        var limites = mapa.getBounds();
+        var parametros = new URLSearchParams(filtros);
+        parametros.set('bbox', [
+            limites.getWest(), limites.getSouth(), limites.getEast(), limites.getNorth()
+        ].map(function (v) { return v.toFixed(5); }).join(','));
+        parametros.set('zoom', Math.round(mapa.getZoom()));
+
+        // Só a última área pedida interessa: cancela a requisição anterior
+        if (controlador) {
+            controlador.abort();
+        }
+        controlador = new AbortController();
+
+        fetch('/api/coleta-pontos.geojson?' + parametros.toString(), {signal: controlador.signal})
+            .then(function (resposta) { return resposta.json(); })
+            .then(function (colecao) {
+                camada.clearLayers();
+                L.geoJSON(colecao, {
+                    pointToLayer: function (feature, latlng) {
+                        var propriedades = feature.properties;
+                        if (propriedades.cluster) {
+                            return marcadorGrupo(mapa, latlng, propriedades.quantidade);
+                        }
+                        return L.marker(latlng, {
+                            icon: L.AwesomeMarkers.icon({icon: 'info-sign', prefix: 'glyphicon', markerColor: 'red', iconColor: 'white'})
+                        }).bindPopup(popupPontoColeta(propriedades, latlng), {maxWidth: 300});
+                    }
+                }).addTo(camada);
+            })
+            .catch(function (erro) {
+                if (erro.name !== 'AbortError') {
+                    console.error('Erro ao carregar pontos de coleta:', erro);
+                }
+            });
+    }
+
+    mapa.on('moveend', atualizar);
+    atualizar();
+}
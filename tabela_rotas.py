@@ -0,0 +1,489 @@
+"""
+Tabelas de tempos de direção pré-calculadas por célula de origem.
+
+A área atendida é dividida em uma grade regular de células de `passo` graus.
+Um job offline calcula, a partir do centro de cada célula, a distância e o
+tempo de direção até os pontos próximos (os `destinos_por_tipo` mais
+próximos em linha reta de cada tipo de lixo e de todos os tipos), usando um
+provedor de rotas. O resultado fica em um arquivo binário que os processos
+do servidor mapeiam em memória, como o snapshot dos pontos: a célula de uma
+origem sai de uma conta sobre a latitude/longitude (O(1)) e cada destino é
+procurado por busca binária entre os poucos destinos da célula.
+
+Cada destino é identificado por um hash de 64 bits do id e das coordenadas
+do ponto: se o CSV mudar um ponto de lugar, a entrada deixa de coincidir e
+aquele destino volta a ser roteado ao vivo. Origens fora da área, células
+ausentes (o provedor falhou) e células calculadas há mais de `validade`
+segundos também ficam para o roteamento ao vivo.
+
+Uso:
+    python tabela_rotas.py --area LAT_MIN,LON_MIN,LAT_MAX,LON_MAX [--passo 0.005]
+                           [--destinos-por-tipo 15] [--provedor google] [--paralelas 4]
+                           [--validade 604800] [--csv pontos-de-coleta.csv]
+                           [--saida tabela-rotas.bin]
+    python tabela_rotas.py --verificar [--saida tabela-rotas.bin]
+
+Se a saída já existir, com a mesma grade e o mesmo provedor, as células
+ainda válidas são reaproveitadas e só as ausentes ou vencidas são
+recalculadas (o job pode rodar periodicamente).
+
+Os workers não conferem o CRC-32 ao mapear a tabela (leria todas as
+páginas do arquivo em cada worker); o job confere a tabela anterior antes
+de reaproveitá-la e --verificar (verificar_tabela) confere sob demanda.
+
+O arquivo é um contêiner binário (ver conteiner_binario.py). Seções: inicios (uint32, uma por célula + 1), geradas_em (uint32, segundos
+desde a época; 0 = célula ausente), destinos (uint64, hashes em ordem
+crescente dentro de cada célula), distancias_m e duracoes_s (uint32).
+"""
+import argparse
+import bisect
+import hashlib
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from conteiner_binario import ErroConteiner, abrir_conteiner, fechar_conteiner, gravar_conteiner
+
+MAGICO = b"PCROTA\x00\x01"
+VERSAO_FORMATO = 2
+VALIDADE_PADRAO = 7 * 86400
+# No Windows um arquivo mapeado não pode ser substituído (os.replace falha com
+# PermissionError): lá os workers copiam a tabela para a memória, para que o
+# job consiga gravar a nova por cima
+MAPEAR_TABELA = os.name != "nt"
+
+logger = logging.getLogger(__name__)
+
+SECOES = {
+    "inicios": "I",
+    "geradas_em": "I",
+    "destinos": "Q",
+    "distancias_m": "I",
+    "duracoes_s": "I",
+}
+
+
+def chave_destino(id_ponto, latitude, longitude):
+    """Hash de 64 bits que identifica um destino (id e coordenadas do ponto)."""
+    texto = f"{id_ponto}|{latitude:.6f}|{longitude:.6f}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(texto, digest_size=8).digest(), "little")
+
+
+class Grade:
+    """
+    Grade regular de células de origem sobre uma área retangular.
+
+    Args:
+        lat_min, lon_min, lat_max, lon_max: Limites da área
+        passo: Lado de cada célula, em graus
+    """
+
+    __slots__ = ("lat_min", "lon_min", "passo", "linhas", "colunas")
+
+    def __init__(self, lat_min, lon_min, lat_max, lon_max, passo):
+        if passo <= 0 or lat_max <= lat_min or lon_max <= lon_min:
+            raise ValueError("Área inválida: use LAT_MIN,LON_MIN,LAT_MAX,LON_MAX com máximos maiores e passo > 0")
+        self.lat_min = lat_min
+        self.lon_min = lon_min
+        self.passo = passo
+        self.linhas = math.ceil(round((lat_max - lat_min) / passo, 9))
+        self.colunas = math.ceil(round((lon_max - lon_min) / passo, 9))
+
+    @classmethod
+    def dos_metadados(cls, metadados):
+        """Recria a grade gravada nos metadados de uma tabela."""
+        grade = cls.__new__(cls)
+        for nome in cls.__slots__:
+            setattr(grade, nome, metadados[nome])
+        return grade
+
+    def metadados(self):
+        return {nome: getattr(self, nome) for nome in self.__slots__}
+
+    def __len__(self):
+        return self.linhas * self.colunas
+
+    def celula(self, lat, lon):
+        """Índice da célula que contém a origem, ou None fora da área."""
+        linha = math.floor((lat - self.lat_min) / self.passo)
+        coluna = math.floor((lon - self.lon_min) / self.passo)
+        if 0 <= linha < self.linhas and 0 <= coluna < self.colunas:
+            return linha * self.colunas + coluna
+        return None
+
+    def centro(self, celula):
+        """Coordenadas (lat, lon) do centro de uma célula."""
+        linha, coluna = divmod(celula, self.colunas)
+        return self.lat_min + (linha + 0.5) * self.passo, self.lon_min + (coluna + 0.5) * self.passo
+
+
+def destinos_da_celula(dados, lat, lon, destinos_por_tipo):
+    """
+    Escolhe os pontos roteados a partir do centro de uma célula.
+
+    Args:
+        dados: DadosPontos do repositório
+        lat, lon: Centro da célula
+        destinos_por_tipo: Vizinhos mais próximos (linha reta) mantidos por tipo e no geral
+
+    Retorna:
+        Lista de posições, sem repetição
+    """
+    posicoes = {posicao for _, posicao in dados.grade.k_mais_proximos(lat, lon, destinos_por_tipo)}
+    for tipo in dados.bits_tipos:
+        vizinhos = dados.grade.k_mais_proximos(lat, lon, destinos_por_tipo, dados.filtro_tipos([tipo]))
+        posicoes.update(posicao for _, posicao in vizinhos)
+    return sorted(posicoes)
+
+
+def gravar_tabela(destino, grade, celulas, provedor, modo, destinos_por_tipo):
+    """
+    Grava uma tabela de rotas.
+
+    O arquivo é escrito ao lado do destino e renomeado no final, de modo que
+    processos lendo a tabela antiga nunca vejam um arquivo pela metade.
+
+    Args:
+        destino: Caminho do arquivo
+        grade: Grade das células de origem
+        celulas: Dicionário {célula: (gerada_em, [(chave_destino, metros, segundos)])}
+        provedor: Nome do provedor de rotas usado
+        modo: Modo de viagem (ex.: "DRIVE")
+        destinos_por_tipo: Parâmetro usado na escolha dos destinos (informativo)
+    """
+    colunas = {nome: array(codigo) for nome, codigo in SECOES.items()}
+    colunas["inicios"].append(0)
+    for celula in range(len(grade)):
+        gerada_em, entradas = celulas.get(celula, (0, []))
+        for chave, metros, segundos in sorted(entradas):
+            colunas["destinos"].append(chave)
+            colunas["distancias_m"].append(metros)
+            colunas["duracoes_s"].append(segundos)
+        colunas["geradas_em"].append(int(gerada_em))
+        colunas["inicios"].append(len(colunas["destinos"]))
+
+    metadados = {
+        **grade.metadados(),
+        "provedor": provedor,
+        "modo": modo,
+        "destinos_por_tipo": destinos_por_tipo,
+    }
+    secoes = [(nome, codigo, colunas[nome].tobytes()) for nome, codigo in SECOES.items()]
+    gravar_conteiner(destino, MAGICO, VERSAO_FORMATO, metadados, secoes)
+
+
+class TabelaMapeada:
+    """
+    Tabela de rotas mapeada em memória (ver ler_tabela).
+
+    Atributos:
+        grade: Grade das células de origem
+        provedor: Nome do provedor de rotas com que a tabela foi calculada
+        modo: Modo de viagem
+    """
+
+    __slots__ = ("grade", "provedor", "modo", "destinos_por_tipo", "inicios", "geradas_em", "destinos",
+                 "distancias_m", "duracoes_s")
+
+    def __init__(self, metadados, secoes):
+        self.grade = Grade.dos_metadados(metadados)
+        self.provedor = metadados["provedor"]
+        self.modo = metadados["modo"]
+        self.destinos_por_tipo = metadados["destinos_por_tipo"]
+        for nome in SECOES:
+            setattr(self, nome, secoes[nome])
+
+    def fechar(self):
+        """Libera o mapa do arquivo; a tabela não pode mais ser consultada."""
+        fechar_conteiner({nome: getattr(self, nome) for nome in SECOES})
+
+    def entradas(self, celula):
+        """Lista de (chave_destino, metros, segundos) de uma célula."""
+        inicio, fim = self.inicios[celula], self.inicios[celula + 1]
+        return list(zip(self.destinos[inicio:fim], self.distancias_m[inicio:fim], self.duracoes_s[inicio:fim]))
+
+    def procurar(self, celula, chave):
+        """Busca um destino na célula; retorna (metros, segundos) ou None."""
+        inicio, fim = self.inicios[celula], self.inicios[celula + 1]
+        posicao = bisect.bisect_left(self.destinos, chave, inicio, fim)
+        if posicao < fim and self.destinos[posicao] == chave:
+            return self.distancias_m[posicao], self.duracoes_s[posicao]
+        return None
+
+
+def ler_tabela(caminho, mapear=True, verificar_crc=False):
+    """
+    Mapeia uma tabela de rotas em memória.
+
+    Args:
+        caminho: Caminho do arquivo
+        mapear: Se False, copia o arquivo para a memória (ver MAPEAR_TABELA)
+        verificar_crc: Se deve conferir o CRC-32 do conteúdo (lê o arquivo inteiro)
+
+    Retorna:
+        TabelaMapeada, ou None se o arquivo não existir, for de outra versão
+        do formato ou estiver corrompido (só detectado com verificar_crc)
+    """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        metadados, secoes = abrir_conteiner(caminho, MAGICO, VERSAO_FORMATO, verificar_crc, mapear)
+    except (OSError, ErroConteiner) as e:
+        logger.warning("Tabela de rotas %s ignorada (%s); roteando ao vivo", caminho, e)
+        return None
+    return TabelaMapeada(metadados, secoes)
+
+
+def verificar_tabela(caminho):
+    """
+    Verificação completa de uma tabela: CRC-32 de todo o conteúdo.
+
+    Retorna:
+        True se a tabela existe e está íntegra (o motivo da falha é registrado como aviso)
+    """
+    if not os.path.exists(caminho):
+        logger.warning("Tabela de rotas %s não existe", caminho)
+        return False
+    tabela = ler_tabela(caminho, verificar_crc=True)
+    if tabela is None:
+        return False
+    tabela.fechar()
+    return True
+
+
+class TabelaRotas:
+    """
+    Consulta da tabela de rotas pré-calculada no caminho das requisições.
+
+    O arquivo é mapeado na primeira consulta e volta a ser mapeado quando o
+    mtime muda (o job grava uma tabela nova e renomeia por cima da antiga).
+    Sem caminho configurado, as consultas não encontram nada.
+
+    Args:
+        caminho: Arquivo da tabela (None desativa)
+        validade: Idade máxima (segundos) de uma célula para ser usada
+    """
+
+    def __init__(self, caminho=None, validade=VALIDADE_PADRAO):
+        self.caminho = caminho
+        self.validade = validade
+        self.acertos = 0
+        self.faltas = 0
+        self.origens_sem_celula = 0
+        self.celulas_vencidas = 0
+        self._mtime = None
+        self._tabela = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def da_configuracao(cls):
+        """
+        Cria a consulta a partir das variáveis de ambiente TABELA_ROTAS_ARQUIVO
+        e TABELA_ROTAS_VALIDADE.
+        """
+        return cls(
+            caminho=os.getenv("TABELA_ROTAS_ARQUIVO") or None,
+            validade=float(os.getenv("TABELA_ROTAS_VALIDADE", str(VALIDADE_PADRAO))),
+        )
+
+    def tabela(self):
+        """Tabela mapeada atual, ou None se não houver uma válida."""
+        if not self.caminho:
+            return None
+        try:
+            mtime = os.stat(self.caminho).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._tabela = ler_tabela(self.caminho, MAPEAR_TABELA) if mtime is not None else None
+                    self._mtime = mtime
+        return self._tabela
+
+    def obter_muitos(self, provedor, origem_lat, origem_lon, pontos, modo="DRIVE"):
+        """
+        Busca na tabela os resultados de vários destinos para uma origem.
+
+        Args:
+            provedor: Nome do provedor de rotas (só a tabela do mesmo provedor é usada)
+            origem_lat: Latitude da origem
+            origem_lon: Longitude da origem
+            pontos: Dicionário {id: {latitude, longitude, ...}} dos destinos
+            modo: Modo de viagem
+
+        Retorna:
+            Dicionário {id: {distance_km, duration_min}} só com os acertos
+        """
+        tabela = self.tabela()
+        if tabela is None or tabela.provedor != provedor or tabela.modo != modo:
+            return {}
+        celula = tabela.grade.celula(origem_lat, origem_lon)
+        with self._lock:
+            if celula is None or not tabela.geradas_em[celula]:
+                self.origens_sem_celula += 1
+                return {}
+            if time.time() - tabela.geradas_em[celula] > self.validade:
+                self.celulas_vencidas += 1
+                return {}
+
+        encontrados = {}
+        for id_ponto, ponto in pontos.items():
+            resultado = tabela.procurar(celula, chave_destino(id_ponto, ponto['latitude'], ponto['longitude']))
+            if resultado is not None:
+                metros, segundos = resultado
+                encontrados[id_ponto] = {"distance_km": metros / 1000, "duration_min": segundos / 60}
+        with self._lock:
+            self.acertos += len(encontrados)
+            self.faltas += len(pontos) - len(encontrados)
+        return encontrados
+
+    def resumo(self):
+        """Retorna os contadores de acertos/faltas e a descrição da tabela carregada."""
+        tabela = self.tabela()
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                'arquivo': self.caminho,
+                'carregada': tabela is not None,
+                'provedor': tabela.provedor if tabela is not None else None,
+                'celulas': len(tabela.grade) if tabela is not None else 0,
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'origens_sem_celula': self.origens_sem_celula,
+                'celulas_vencidas': self.celulas_vencidas,
+                'validade_segundos': self.validade
+            }
+
+
+def _rotear_celula(provedor, dados, grade, celula, destinos_por_tipo):
+    """Roteia uma célula; retorna a lista de (chave_destino, metros, segundos), ou None se o provedor falhou."""
+    # Importado aqui porque coleta_service importa este módulo
+    from provedores_rotas import ErroRoteamento
+
+    lat, lon = grade.centro(celula)
+    posicoes = destinos_da_celula(dados, lat, lon, destinos_por_tipo)
+    if not posicoes:
+        return []
+    pontos = dados.pontos(posicoes)
+    try:
+        resultados = provedor.calcular_distancias(lat, lon, [(p.latitude, p.longitude) for p in pontos])
+    except ErroRoteamento as e:
+        logger.warning("Célula %d: provedor %s falhou: %s", celula, provedor.nome, e)
+        return None
+    entradas = []
+    for ponto, resultado in zip(pontos, resultados):
+        if resultado["distance_km"] is None or resultado["duration_min"] is None:
+            continue
+        entradas.append((chave_destino(ponto.id, ponto.latitude, ponto.longitude),
+                         round(resultado["distance_km"] * 1000), round(resultado["duration_min"] * 60)))
+    # Sem nenhum resultado (ex.: todas as rotas falharam), a célula fica ausente
+    return entradas if entradas or not resultados else None
+
+
+def gerar_tabela(dados, provedor, grade, destino, destinos_por_tipo=15, paralelas=4,
+                 validade=VALIDADE_PADRAO, modo="DRIVE"):
+    """
+    Calcula (ou atualiza) a tabela de rotas de uma grade e grava no destino.
+
+    Se o destino já tiver uma tabela íntegra (CRC-32 conferido) com a mesma
+    grade, provedor, modo e destinos_por_tipo, as células com menos de
+    `validade` segundos são copiadas dela; as demais são roteadas.
+
+    Args:
+        dados: DadosPontos do repositório
+        provedor: ProvedorRotas usado no cálculo
+        grade: Grade das células de origem
+        destino: Caminho do arquivo da tabela
+        destinos_por_tipo: Vizinhos mais próximos roteados por tipo e no geral
+        paralelas: Células roteadas em paralelo
+        validade: Idade máxima (segundos) de uma célula reaproveitada
+        modo: Modo de viagem
+
+    Retorna:
+        Dicionário com as células reaproveitadas, calculadas e com falha
+    """
+    agora = time.time()
+    celulas = {}
+    anterior = ler_tabela(destino, verificar_crc=True)
+    if anterior is not None and (anterior.grade.metadados(), anterior.provedor, anterior.modo,
+                                 anterior.destinos_por_tipo) == (grade.metadados(), provedor.nome, modo,
+                                                                 destinos_por_tipo):
+        for celula in range(len(grade)):
+            gerada_em = anterior.geradas_em[celula]
+            if gerada_em and agora - gerada_em <= validade:
+                celulas[celula] = (gerada_em, anterior.entradas(celula))
+    if anterior is not None:
+        # As células reaproveitadas já foram copiadas: o arquivo não pode
+        # continuar mapeado quando a tabela nova for renomeada por cima dele
+        anterior.fechar()
+    reaproveitadas = len(celulas)
+
+    pendentes = [celula for celula in range(len(grade)) if celula not in celulas]
+    falhas = 0
+    with ThreadPoolExecutor(max_workers=paralelas) as executor:
+        resultados = executor.map(lambda c: _rotear_celula(provedor, dados, grade, c, destinos_por_tipo), pendentes)
+        for celula, entradas in zip(pendentes, resultados):
+            if entradas is None:
+                falhas += 1
+            else:
+                celulas[celula] = (agora, entradas)
+
+    gravar_tabela(destino, grade, celulas, provedor.nome, modo, destinos_por_tipo)
+    return {'reaproveitadas': reaproveitadas, 'calculadas': len(pendentes) - falhas, 'falhas': falhas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-calcula a tabela de tempos de direção por célula de origem")
+    parser.add_argument("--area", help="LAT_MIN,LON_MIN,LAT_MAX,LON_MAX da área atendida")
+    parser.add_argument("--passo", type=float, default=0.005, help="lado das células em graus (0.005 ~ 550 m)")
+    parser.add_argument("--destinos-por-tipo", type=int, default=15,
+                        help="pontos mais próximos roteados por tipo de lixo e no geral")
+    parser.add_argument("--provedor", default="google", help="provedor de rotas (google, osrm...)")
+    parser.add_argument("--paralelas", type=int, default=4, help="células roteadas em paralelo")
+    parser.add_argument("--validade", type=float, default=VALIDADE_PADRAO,
+                        help="idade máxima (s) das células reaproveitadas de uma tabela existente")
+    parser.add_argument("--csv", default="pontos-de-coleta.csv", help="arquivo CSV dos pontos")
+    parser.add_argument("--saida", default="tabela-rotas.bin", help="arquivo da tabela")
+    parser.add_argument("--verificar", action="store_true",
+                        help="só confere o CRC-32 de uma tabela existente (--saida)")
+    args = parser.parse_args()
+
+    if args.verificar:
+        logging.basicConfig(format="%(levelname)s %(message)s")
+        if not verificar_tabela(args.saida):
+            sys.exit(1)
+        print(f"✅ Tabela de rotas {args.saida} íntegra")
+        return
+    if not args.area:
+        parser.error("--area é obrigatório para gerar a tabela")
+
+    # Importado aqui porque coleta_service importa este módulo
+    from coleta_service import MODO_VIAGEM, resolver_provedores
+    from repositorio_pontos import obter_repositorio
+
+    try:
+        grade = Grade(*(float(valor) for valor in args.area.split(",")), args.passo)
+        provedor, = resolver_provedores([args.provedor])
+    except (TypeError, ValueError) as e:
+        parser.error(str(e))
+    if not provedor.disponivel():
+        parser.error(f"Provedor de rotas {provedor.nome} não está configurado")
+
+    dados = obter_repositorio(args.csv).dados()
+    resumo = gerar_tabela(dados, provedor, grade, args.saida, args.destinos_por_tipo, args.paralelas,
+                          args.validade, MODO_VIAGEM)
+    print(f"✅ Tabela de rotas gravada em {args.saida} ({os.path.getsize(args.saida)} bytes): "
+          f"{len(grade)} células, {resumo['calculadas']} calculadas, {resumo['reaproveitadas']} reaproveitadas, "
+          f"{resumo['falhas']} com falha")
+    if resumo['falhas']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
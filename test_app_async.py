@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+import time
+from unittest import mock
+import httpx
+import app
+import app_async
+from cache_respostas import CacheRespostas
+from cache_rotas import CacheRotas
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class TestAppAsync(unittest.TestCase):
+    """Testes do caminho ASGI assíncrono de /api/coleta-pontos."""
+
+    def setUp(self):
+        self.servidor = ServidorRotasFalso(latencia=0.3).iniciar()
+        self.patches = [
+            mock.patch('coleta_service.GOOGLE_API_KEY', 'chave-teste'),
+            mock.patch('coleta_service.GOOGLE_ROUTES_URL', self.servidor.url),
+            mock.patch('coleta_service.cache_rotas', CacheRotas()),
+            mock.patch.object(app, 'cache_respostas', CacheRespostas()),
+            mock.patch.object(app_async, 'cache_respostas', CacheRespostas()),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.servidor.parar()
+
+    async def buscar(self, caminhos, headers=None):
+        transporte = httpx.ASGITransport(app=app_async.aplicacao)
+        async with httpx.AsyncClient(transport=transporte, base_url='http://teste') as cliente:
+            respostas = await asyncio.gather(*(cliente.get(c, headers=headers) for c in caminhos))
+        await app_async.fechar_clientes_rotas_async()
+        return respostas
+
+    def test_rotas_iguais_ao_caminho_sincrono(self):
+        """Teste: o caminho assíncrono devolve o mesmo corpo e ETag que a view Flask."""
+        caminho = '/api/coleta-pontos?tipos=pilhas&lat=-15.79&lon=-47.88&n=3&roteamento=google'
+        resposta, = asyncio.run(self.buscar([caminho]))
+        sincrona = app.app.test_client().get(caminho)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['pontos'], sincrona.get_json()['pontos'])
+        self.assertEqual(resposta.json()['pontos'][0]['fonte_distancia'], 'google')
+        self.assertEqual(resposta.headers['ETag'], sincrona.headers['ETag'])
+        self.assertEqual(resposta.headers['Cache-Control'], 'private, no-cache')
+
+        condicional, = asyncio.run(self.buscar([caminho], headers={'If-None-Match': resposta.headers['ETag']}))
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional.headers['ETag'], resposta.headers['ETag'])
+        self.assertEqual(condicional.headers['Cache-Control'], 'private, no-cache')
+        self.assertNotIn('Content-Type', condicional.headers)
+        self.assertNotIn('Content-Length', condicional.headers)
+
+    def test_consultas_lentas_em_paralelo(self):
+        """Teste: consultas com rotas lentas ficam em andamento ao mesmo tempo no mesmo worker."""
+        caminhos = [f'/api/coleta-pontos?tipos=pilhas&lat=-15.{700 + i}&lon=-47.88&n=2&roteamento=google'
+                    for i in range(12)]
+        inicio = time.monotonic()
+        respostas = asyncio.run(self.buscar(caminhos))
+
+        self.assertTrue(all(r.status_code == 200 for r in respostas))
+        self.assertEqual(self.servidor.pico_concorrencia, 12)
+        self.assertLess(time.monotonic() - inicio, 12 * 0.3 / 2)
+
+    def test_demais_rotas_no_flask(self):
+        """Teste: listagens e erros de parâmetro continuam atendidos pelo app Flask."""
+        lista, erro = asyncio.run(self.buscar(['/api/coleta-pontos?page_size=2',
+                                               '/api/coleta-pontos?tipos=pilhas&lat=-15.79&lon=-47.88&page=0']))
+
+        self.assertEqual(len(lista.json()['pontos']), 2)
+        self.assertTrue(lista.headers['Cache-Control'].startswith('public'))
+        self.assertEqual(erro.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import tempfile
+from benchmark import comparar, gerar_csv_sintetico, medir
+from repositorio_pontos import RepositorioPontos
+
+
+class TestBenchmark(unittest.TestCase):
+    """Testes das peças do benchmark (dados sintéticos e comparação de resultados)."""
+
+    def test_csv_sintetico(self):
+        """Teste: o CSV sintético é lido pelo repositório, com a mistura de tipos do CSV real."""
+        caminho = os.path.join(tempfile.mkdtemp(), 'pontos.csv')
+        gerar_csv_sintetico(caminho, 2000, semente=7)
+        self.addCleanup(os.unlink, caminho)
+
+        dados = RepositorioPontos(caminho, usar_snapshot=False).dados()
+        self.assertEqual(len(dados), 2000)
+        self.assertEqual(set(dados.bits_tipos), {'pilhas', 'lampadas', 'eletroeletronicos', 'eletrodomesticos'})
+        self.assertGreater(len(dados.filtrar_por_tipos(['pilhas'])), 1000)
+        self.assertTrue(all(-16.5 < lat < -15.0 for lat in dados.latitudes))
+
+    def test_medir_e_comparar(self):
+        """Teste: medir prepara cada repetição e comparar aponta só as medianas acima da tolerância."""
+        preparos = []
+        resumo = medir(lambda: None, 3, preparar=lambda: preparos.append(1), aquecer=False)
+        self.assertEqual((resumo['repeticoes'], len(preparos)), (3, 3))
+
+        base = {'resultados': {'1000': {'filtro': {'mediana_ms': 10.0}, 'mapa': {'mediana_ms': 10.0}}}}
+        atual = {'resultados': {'1000': {'filtro': {'mediana_ms': 11.0}, 'mapa': {'mediana_ms': 13.0},
+                                         'novo': {'mediana_ms': 1.0}}}}
+        self.assertEqual(comparar(atual, base, 0.2), [('1000', 'mapa', 10.0, 13.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+from cache_mapas import CacheMapas, MapaRenderizado
+import app
+
+
+class TestCacheMapas(unittest.TestCase):
+    """Testes do cache de mapas base renderizados."""
+
+    def test_chave_normaliza_filtros(self):
+        """Teste: ordem, caixa e repetição dos tipos não mudam a chave."""
+        chave = CacheMapas.chave('v1', ['pilhas', 'Lampadas '], 'todos')
+
+        self.assertEqual(CacheMapas.chave('v1', ['lampadas', 'pilhas', 'pilhas'], 'todos'), chave)
+        self.assertNotEqual(CacheMapas.chave('v1', ['lampadas', 'pilhas'], 'qualquer'), chave)
+        self.assertNotEqual(CacheMapas.chave('v2', ['lampadas', 'pilhas'], 'todos'), chave)
+        self.assertEqual(CacheMapas.chave('v1', ['pilhas'], 'todos'), CacheMapas.chave('v1', ['pilhas'], 'qualquer'))
+
+    def test_renderiza_uma_vez_por_chave(self):
+        """Teste: a segunda consulta da mesma chave não renderiza de novo."""
+        cache = CacheMapas(capacidade=1)
+        renderizacoes = []
+
+        def gerar():
+            renderizacoes.append(1)
+            return MapaRenderizado('<html></html>', 'map_1')
+
+        primeiro = cache.obter(('v1', (), None), gerar)
+        self.assertIs(cache.obter(('v1', (), None), gerar), primeiro)
+        cache.obter(('v2', (), None), gerar)
+        cache.obter(('v1', (), None), gerar)
+
+        self.assertEqual(len(renderizacoes), 3)
+        self.assertEqual(cache.resumo(), {'acertos': 1, 'faltas': 3, 'mapas': 1})
+
+    def test_mapa_com_etag(self):
+        """Teste: /mapa responde 304 para If-None-Match com o ETag atual."""
+        cliente = app.app.test_client()
+        resposta = cliente.get('/mapa?tipos=pilhas')
+        etag = resposta.headers['ETag']
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(cliente.get('/mapa?tipos=Pilhas').headers['ETag'], etag)
+        self.assertEqual(cliente.get('/mapa?tipos=pilhas', headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_mapa_usa_filtros_normalizados(self):
+        """Teste: o mapa em cache não carrega a grafia dos tipos de quem o renderizou primeiro."""
+        cliente = app.app.test_client()
+        with mock.patch.object(app, 'cache_mapas', CacheMapas()):
+            html = cliente.get('/mapa?tipos=Pilhas,%20LAMPADAS,pilhas').get_data(as_text=True)
+            self.assertEqual(cliente.get('/mapa?tipos=lampadas,pilhas').get_data(as_text=True), html)
+            vazio = cliente.get('/mapa?tipos=pilhas,<b>x</b>').get_data(as_text=True)
+
+        self.assertIn('"tipos": "lampadas,pilhas"', html)
+        self.assertNotIn('LAMPADAS', html)
+        self.assertIn('&lt;b&gt;x&lt;/b&gt;', vazio)
+        self.assertNotIn('<b>x</b>', vazio)
+
+    def test_localizacao_sobrepoe_mapa_base(self):
+        """Teste: com lat/lon o mapa base é reutilizado e recebe apenas a sobreposição."""
+        cliente = app.app.test_client()
+        base = cliente.get('/mapa?tipos=pilhas').get_data(as_text=True)
+        resposta = cliente.get('/mapa?tipos=pilhas&lat=-15.79&lon=-47.88&n=2&roteamento=estimativa')
+        html = resposta.get_data(as_text=True)
+
+        self.assertTrue(html.startswith(base[:-len('</html>')]))
+        self.assertIn('Sua localização', html)
+        self.assertEqual(html.count('"cor": "green"'), 2)
+        self.assertNotEqual(resposta.headers['ETag'], cliente.get('/mapa?tipos=pilhas').headers['ETag'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+import app
+import cache_respostas
+from cache_respostas import CacheRespostas
+
+
+class TestCacheRespostas(unittest.TestCase):
+    """Testes do cache de respostas serializadas de /api/coleta-pontos."""
+
+    def test_serializa_uma_vez_por_chave(self):
+        """Teste: o corpo é gerado uma vez por chave e o LRU respeita a capacidade."""
+        cache = CacheRespostas(capacidade=1)
+        geracoes = []
+
+        def gerar():
+            geracoes.append(1)
+            return b'{}'
+
+        primeira = cache.obter(('v1', 'a'), gerar)
+        self.assertIs(cache.obter(('v1', 'a'), gerar), primeira)
+        cache.obter(('v1', 'b'), gerar)
+        cache.obter(('v1', 'a'), gerar)
+
+        self.assertTrue(primeira.etag.startswith('v1-'))
+        self.assertEqual(len(geracoes), 3)
+        self.assertEqual(cache.resumo(), {'acertos': 1, 'faltas': 3, 'respostas': 1, 'bytes': 2})
+
+    def test_ttl_expira_entrada(self):
+        """Teste: entradas com TTL são geradas de novo depois de expirarem."""
+        cache = CacheRespostas()
+        with mock.patch.object(cache_respostas.time, 'monotonic', return_value=100.0):
+            cache.obter(('v1', 'rotas'), lambda: b'1', ttl=10)
+        with mock.patch.object(cache_respostas.time, 'monotonic', return_value=105.0):
+            self.assertEqual(cache.obter(('v1', 'rotas'), lambda: b'2', ttl=10).corpo, b'1')
+        with mock.patch.object(cache_respostas.time, 'monotonic', return_value=111.0):
+            self.assertEqual(cache.obter(('v1', 'rotas'), lambda: b'2', ttl=10).corpo, b'2')
+
+    def test_api_etag_e_cache_control(self):
+        """Teste: consultas equivalentes compartilham o ETag e If-None-Match responde 304."""
+        cliente = app.app.test_client()
+        resposta = cliente.get('/api/coleta-pontos?tipos=pilhas,eletroeletronicos&modo=qualquer')
+        etag = resposta.headers['ETag']
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.headers['Cache-Control'].startswith('public, max-age='))
+        self.assertEqual(resposta.get_json()['tipos_filtrados'], ['eletroeletronicos', 'pilhas'])
+        equivalente = cliente.get('/api/coleta-pontos?tipos=Eletroeletronicos, pilhas&modo=qualquer')
+        self.assertEqual(equivalente.headers['ETag'], etag)
+        condicional = cliente.get('/api/coleta-pontos?tipos=pilhas,eletroeletronicos&modo=qualquer',
+                                  headers={'If-None-Match': etag})
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional.get_data(), b'')
+
+    def test_api_localizacao_privada(self):
+        """Teste: consultas com localização do usuário não são públicas."""
+        resposta = app.app.test_client().get('/api/coleta-pontos?near=-15.79,-47.88&k=2')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.headers['Cache-Control'], 'private, no-cache')
+        self.assertIn('ETag', resposta.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import asyncio
+import os
+import sqlite3
+import threading
+import tempfile
+import time
+from unittest import mock
+import coleta_service
+from cache_rotas import CacheRotas
+
+RESULTADO = {'distance_km': 2.5, 'duration_min': 7.0}
+PONTOS = {id_ponto: {'id': id_ponto, 'latitude': -15.7 - i / 100, 'longitude': -47.9}
+          for i, id_ponto in enumerate(('001', '002', '003'))}
+
+
+def destinos(*ids):
+    return {id_ponto: PONTOS[id_ponto] for id_ponto in ids}
+
+
+class TestCacheRotas(unittest.TestCase):
+    """Testes unitários do cache de resultados de roteamento."""
+
+    def test_acerto_com_origem_quantizada(self):
+        """Teste: origens próximas (mesma quantização) compartilham o resultado."""
+        cache = CacheRotas(precisao=3)
+        cache.gravar_muitos(-15.79001, -47.88002, PONTOS, {'001': RESULTADO})
+
+        self.assertEqual(cache.obter_muitos(-15.79004, -47.87998, destinos('001')), {'001': RESULTADO})
+        self.assertEqual(cache.obter_muitos(-15.80000, -47.88000, destinos('001')), {})
+        self.assertEqual(cache.obter_muitos(-15.79001, -47.88002, destinos('001'), modo='WALK'), {})
+        self.assertEqual(cache.resumo()['acertos_memoria'], 1)
+        self.assertEqual(cache.resumo()['faltas'], 2)
+
+    def test_ponto_movido_nao_acerta(self):
+        """Teste: se as coordenadas do destino mudam, a entrada antiga não é usada."""
+        cache = CacheRotas()
+        cache.gravar_muitos(-15.79, -47.88, PONTOS, {'001': RESULTADO})
+        movido = {'001': dict(PONTOS['001'], latitude=PONTOS['001']['latitude'] + 0.001)}
+
+        self.assertEqual(cache.obter_muitos(-15.79, -47.88, movido), {})
+        self.assertEqual(cache.obter_muitos(-15.79, -47.88, destinos('001')), {'001': RESULTADO})
+
+    def test_nao_grava_falhas(self):
+        """Teste: resultados sem distância não entram no cache."""
+        cache = CacheRotas()
+        cache.gravar_muitos(-15.79, -47.88, PONTOS, {'001': {'distance_km': None, 'duration_min': None}})
+
+        self.assertEqual(cache.obter_muitos(-15.79, -47.88, destinos('001')), {})
+
+    def test_expira_pelo_ttl(self):
+        """Teste: entradas vencidas não são retornadas."""
+        cache = CacheRotas(ttl=60)
+        cache.gravar_muitos(-15.79, -47.88, PONTOS, {'001': RESULTADO})
+
+        with mock.patch('cache_rotas.time.time', return_value=time.time() + 61):
+            self.assertEqual(cache.obter_muitos(-15.79, -47.88, destinos('001')), {})
+
+    def test_lru_descarta_mais_antigo(self):
+        """Teste: acima da capacidade, o item menos usado recentemente sai."""
+        cache = CacheRotas(capacidade=2)
+        cache.gravar_muitos(-15.79, -47.88, PONTOS, {'001': RESULTADO, '002': RESULTADO})
+        cache.obter_muitos(-15.79, -47.88, destinos('001'))
+        cache.gravar_muitos(-15.79, -47.88, PONTOS, {'003': RESULTADO})
+
+        self.assertEqual(set(cache.obter_muitos(-15.79, -47.88, destinos('001', '002', '003'))), {'001', '003'})
+
+    def test_camada_em_disco_sobrevive_reinicio(self):
+        """Teste: resultados gravados em SQLite são lidos por uma nova instância."""
+        arquivo = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False)
+        arquivo.close()
+        try:
+            CacheRotas(caminho_sqlite=arquivo.name).gravar_muitos(-15.79, -47.88, PONTOS, {'001': RESULTADO})
+            novo = CacheRotas(caminho_sqlite=arquivo.name)
+
+            self.assertEqual(novo.obter_muitos(-15.79, -47.88, destinos('001')), {'001': RESULTADO})
+            self.assertEqual(novo.resumo()['acertos_disco'], 1)
+            self.assertEqual(novo.obter_muitos(-15.79, -47.88, destinos('001')), {'001': RESULTADO})
+            self.assertEqual(novo.resumo()['acertos_memoria'], 1)
+        finally:
+            os.unlink(arquivo.name)
+
+    def test_remove_linhas_vencidas_ao_abrir(self):
+        """Teste: linhas vencidas do SQLite são apagadas ao abrir o cache."""
+        arquivo = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False)
+        arquivo.close()
+        self.addCleanup(os.unlink, arquivo.name)
+        CacheRotas(ttl=60, caminho_sqlite=arquivo.name).gravar_muitos(-15.79, -47.88, PONTOS, {'001': RESULTADO})
+        CacheRotas(ttl=600, caminho_sqlite=arquivo.name).gravar_muitos(-15.79, -47.88, PONTOS, {'002': RESULTADO})
+
+        with mock.patch('cache_rotas.time.time', return_value=time.time() + 61):
+            CacheRotas(caminho_sqlite=arquivo.name)
+        with sqlite3.connect(arquivo.name) as conexao:
+            self.assertEqual(conexao.execute("SELECT COUNT(*) FROM rotas").fetchone()[0], 1)
+
+    def test_async_consulta_disco_fora_do_loop(self):
+        """Teste: no caminho assíncrono, o cache em SQLite é consultado fora da thread do event loop."""
+        arquivo = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False)
+        arquivo.close()
+        self.addCleanup(os.unlink, arquivo.name)
+        pontos = {'001': {'id': '001', 'latitude': -15.1, 'longitude': -47.1}}
+        cache = CacheRotas(caminho_sqlite=arquivo.name)
+        cache.gravar_muitos(-15.0, -47.0, pontos, {'001': RESULTADO}, modo='google:DRIVE')
+        threads = []
+        obter_original = cache.obter_muitos
+
+        def obter_muitos(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return obter_original(*args, **kwargs)
+
+        async def enriquecer():
+            await coleta_service.enriquecer_pontos_com_distancias_async(pontos, -15.0, -47.0, ['google'])
+            return threading.current_thread()
+
+        with mock.patch.object(coleta_service, 'cache_rotas', cache), \
+                mock.patch.object(coleta_service, 'GOOGLE_API_KEY', 'chave-teste'), \
+                mock.patch.object(cache, 'obter_muitos', obter_muitos):
+            thread_do_loop = asyncio.run(enriquecer())
+
+        self.assertEqual(pontos['001']['duration_min'], 7.0)
+        self.assertTrue(threads)
+        self.assertNotIn(thread_do_loop, threads)
+
+    def test_enriquecer_usa_cache(self):
+        """Teste: pontos já em cache não são enviados para a API."""
+        pontos = {
+            '001': {'id': '001', 'latitude': -15.1, 'longitude': -47.1},
+            '002': {'id': '002', 'latitude': -15.2, 'longitude': -47.2},
+        }
+        cache = CacheRotas()
+        cache.gravar_muitos(-15.0, -47.0, pontos, {'001': RESULTADO}, modo='google:DRIVE')
+
+        with mock.patch.object(coleta_service, 'cache_rotas', cache), \
+                mock.patch.object(coleta_service, 'GOOGLE_API_KEY', 'chave-teste'), \
+                mock.patch.object(coleta_service, 'get_distances_from_google',
+                                  return_value=[{'distance_km': 9.0, 'duration_min': 12.0}]) as rotas:
+            coleta_service.enriquecer_pontos_com_distancias(pontos, -15.0, -47.0)
+
+        self.assertEqual(rotas.call_args[0][2], [(-15.2, -47.2)])
+        self.assertEqual(pontos['001']['duration_min'], 7.0)
+        self.assertEqual(pontos['002']['duration_min'], 12.0)
+        self.assertEqual(cache.obter_muitos(-15.0, -47.0, {'002': pontos['002']}, modo='google:DRIVE'),
+                         {'002': {'distance_km': 9.0, 'duration_min': 12.0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
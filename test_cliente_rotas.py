@@ -0,0 +1,127 @@
+import unittest
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cliente_rotas import ClienteRotas, ClienteRotasAsync, dividir_matriz
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class TestClienteRotas(unittest.TestCase):
+    """Testes do cliente de rotas contra um servidor Routes local."""
+
+    ORIGEM = (-15.79, -47.88)
+    DESTINOS = [(-15.79 + i * 0.01, -47.88 + i * 0.01) for i in range(1, 9)]
+
+    def criar_cliente(self, servidor, **opcoes):
+        opcoes.setdefault('backoff_base', 0.01)
+        cliente = ClienteRotas(servidor.url, 'chave-teste', **opcoes)
+        self.addCleanup(cliente.fechar)
+        return cliente
+
+    def test_dividir_matriz(self):
+        """Teste: blocos cobrem a matriz sem passar do limite de elementos."""
+        blocos = dividir_matriz(3, 10, 12)
+
+        self.assertEqual(blocos, [(0, 3, 0, 4), (0, 3, 4, 8), (0, 3, 8, 10)])
+        self.assertEqual(dividir_matriz(1, 5, 625), [(0, 1, 0, 5)])
+        self.assertTrue(all((o1 - o0) * (d1 - d0) <= 625 for o0, o1, d0, d1 in dividir_matriz(700, 3, 625)))
+
+    def test_repete_429_e_5xx(self):
+        """Teste: respostas 429 e 503 são repetidas até o sucesso."""
+        with ServidorRotasFalso() as servidor:
+            servidor.falhas = [429, 503]
+            cliente = self.criar_cliente(servidor, tentativas=3)
+            resultado = cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+
+        self.assertTrue(all(r['distance_km'] is not None for r in resultado))
+        self.assertEqual(cliente.resumo(), {'requisicoes': 3, 'repeticoes': 2, 'falhas': 0})
+
+    def test_async_repete_429_e_5xx(self):
+        """Teste: o cliente assíncrono segue o mesmo protocolo de repetições."""
+        async def calcular(servidor):
+            cliente = ClienteRotasAsync(servidor.url, 'chave-teste', backoff_base=0.01, tentativas=3)
+            try:
+                return cliente, await cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+            finally:
+                await cliente.fechar()
+
+        with ServidorRotasFalso() as servidor:
+            servidor.falhas = [429, 503]
+            cliente, resultado = asyncio.run(calcular(servidor))
+
+        self.assertTrue(all(r['distance_km'] is not None for r in resultado))
+        self.assertEqual(cliente.resumo(), {'requisicoes': 3, 'repeticoes': 2, 'falhas': 0})
+
+    def test_desiste_apos_tentativas(self):
+        """Teste: esgotadas as tentativas, o bloco fica sem resultado."""
+        with ServidorRotasFalso() as servidor:
+            servidor.falhas = [503, 503]
+            cliente = self.criar_cliente(servidor, tentativas=2)
+            resultado = cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+
+        self.assertTrue(all(r['distance_km'] is None for r in resultado))
+        self.assertEqual(cliente.resumo()['falhas'], 1)
+
+    def test_concorrencia_limitada(self):
+        """Teste: blocos vão em paralelo sem passar do limite de concorrência."""
+        with ServidorRotasFalso(latencia=0.1) as servidor:
+            cliente = self.criar_cliente(servidor, limite_elementos=1, max_concorrencia=3)
+            inicio = time.monotonic()
+            resultado = cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+            decorrido = time.monotonic() - inicio
+
+        self.assertEqual(len(servidor.requisicoes), len(self.DESTINOS))
+        self.assertEqual(servidor.pico_concorrencia, 3)
+        self.assertLess(decorrido, 0.1 * len(self.DESTINOS))
+        self.assertTrue(all(r['distance_km'] is not None for r in resultado))
+
+    def test_chamadas_simultaneas(self):
+        """Teste: o limite de concorrência vale por chamada; chamadas simultâneas não esperam umas pelas outras."""
+        with ServidorRotasFalso(latencia=0.3) as servidor:
+            cliente = self.criar_cliente(servidor, limite_elementos=4, max_concorrencia=2, max_conexoes=32)
+            inicio = time.monotonic()
+            with ThreadPoolExecutor(max_workers=12) as chamadores:
+                resultados = list(chamadores.map(
+                    lambda _: cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS), range(12)))
+            decorrido = time.monotonic() - inicio
+
+        self.assertEqual(len(servidor.requisicoes), 12 * 2)
+        self.assertGreater(servidor.pico_concorrencia, 2)
+        self.assertLess(decorrido, 0.3 * 3)
+        self.assertTrue(all(r['distance_km'] is not None for resultado in resultados for r in resultado))
+
+    def test_prazo_total(self):
+        """Teste: a consulta inteira respeita um prazo único."""
+        with ServidorRotasFalso(latencia=0.5) as servidor:
+            cliente = self.criar_cliente(servidor, limite_elementos=2, max_concorrencia=1)
+            inicio = time.monotonic()
+            resultado = cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS, prazo=0.2)
+            decorrido = time.monotonic() - inicio
+
+        self.assertLess(decorrido, 0.45)
+        self.assertTrue(all(r['distance_km'] is None for r in resultado))
+
+    def test_reaproveita_conexoes(self):
+        """Teste: consultas seguidas reutilizam a mesma conexão HTTP."""
+        with ServidorRotasFalso() as servidor:
+            cliente = self.criar_cliente(servidor, max_concorrencia=1)
+            for _ in range(5):
+                cliente.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+
+        self.assertEqual(len(servidor.requisicoes), 5)
+        self.assertEqual(servidor.conexoes, 1)
+
+    def test_varias_origens(self):
+        """Teste: matriz com várias origens associa originIndex e destinationIndex."""
+        origens = [self.ORIGEM, (-15.9, -48.0)]
+        with ServidorRotasFalso() as servidor:
+            cliente = self.criar_cliente(servidor, limite_elementos=4)
+            matriz = cliente.calcular_matriz(origens, self.DESTINOS)
+            esperado = [cliente.calcular_distancias(lat, lon, self.DESTINOS) for lat, lon in origens]
+
+        self.assertEqual(matriz, esperado)
+        self.assertNotEqual(matriz[0], matriz[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from cache_rotas import CacheRotas
+from coalescencia import Coalescedor
+from coleta_service import ler_pontos_por_tipo_lixo
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class TestCoalescencia(unittest.TestCase):
+    """Testes da coalescência de chamadas simultâneas idênticas."""
+
+    def test_threads_compartilham_uma_execucao(self):
+        """Teste: chamadas simultâneas com a mesma chave executam a função uma vez."""
+        coalescedor = Coalescedor()
+        chamadas = []
+
+        def lenta():
+            chamadas.append(1)
+            time.sleep(0.2)
+            return [{'distance_km': 1.0}]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resultados = list(executor.map(lambda _: coalescedor.executar('a', lenta), range(8)))
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertTrue(all(r is resultados[0] for r in resultados))
+        self.assertEqual(coalescedor.resumo(), {'execucoes': 1, 'coalescidas': 7, 'coalescidas_entre_processos': 0})
+        # Depois de terminar, a próxima chamada executa de novo
+        coalescedor.executar('a', lenta)
+        self.assertEqual(len(chamadas), 2)
+
+    def test_erro_propagado_aos_seguidores(self):
+        """Teste: a exceção do líder chega a todas as chamadas coalescidas."""
+        coalescedor = Coalescedor()
+        iniciou = threading.Event()
+
+        def falha():
+            iniciou.set()
+            time.sleep(0.1)
+            raise RuntimeError('upstream fora do ar')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lider = executor.submit(coalescedor.executar, 'a', falha)
+            iniciou.wait()
+            seguidor = executor.submit(coalescedor.executar, 'a', falha)
+            for futuro in (lider, seguidor):
+                with self.assertRaises(RuntimeError):
+                    futuro.result()
+        self.assertEqual(coalescedor.resumo()['execucoes'], 1)
+
+    def test_corrotinas_compartilham_uma_execucao(self):
+        """Teste: corrotinas simultâneas com a mesma chave aguardam uma única execução."""
+        coalescedor = Coalescedor()
+        chamadas = []
+
+        async def lenta():
+            chamadas.append(1)
+            await asyncio.sleep(0.1)
+            return 42
+
+        async def principal():
+            return await asyncio.gather(*(coalescedor.executar_async('a', lenta) for _ in range(5)),
+                                        coalescedor.executar_async('b', lenta))
+
+        self.assertEqual(asyncio.run(principal()), [42] * 6)
+        self.assertEqual(len(chamadas), 2)
+
+    def test_entre_processos_pelo_arquivo(self):
+        """Teste: coalescedores com o mesmo arquivo (workers diferentes) compartilham o resultado."""
+        caminho = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False).name
+        self.addCleanup(os.unlink, caminho)
+        worker_a = Coalescedor(caminho_sqlite=caminho, intervalo_consulta=0.01)
+        worker_b = Coalescedor(caminho_sqlite=caminho, intervalo_consulta=0.01)
+        chamadas = []
+        iniciou = threading.Event()
+
+        def lenta():
+            chamadas.append(1)
+            iniciou.set()
+            time.sleep(0.2)
+            return [{'distance_km': 2.5, 'duration_min': 4.0}]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lider = executor.submit(worker_a.executar, 'rota', lenta)
+            iniciou.wait()
+            seguidor = executor.submit(worker_b.executar, 'rota', lenta)
+            self.assertEqual(seguidor.result(), lider.result())
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(worker_b.resumo()['coalescidas_entre_processos'], 1)
+
+    def test_consultas_simultaneas_uma_chamada_upstream(self):
+        """Teste: usuários próximos consultando ao mesmo tempo geram uma única requisição à API."""
+        with ServidorRotasFalso(latencia=0.2) as servidor, \
+                mock.patch('coleta_service.GOOGLE_API_KEY', 'chave-teste'), \
+                mock.patch('coleta_service.GOOGLE_ROUTES_URL', servidor.url), \
+                mock.patch('coleta_service.cache_rotas', CacheRotas()), \
+                mock.patch('coleta_service.coalescedor_rotas', Coalescedor()):
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                resultados = list(executor.map(
+                    lambda i: ler_pontos_por_tipo_lixo(['pilhas'], -15.7901 - i * 0.00001, -47.8801, 3,
+                                                       roteamento=['google']),
+                    range(6)
+                ))
+
+        self.assertEqual(len(servidor.requisicoes), 1)
+        self.assertTrue(all(list(r) == list(resultados[0]) for r in resultados))
+
+
+if __name__ == '__main__':
+    unittest.main()
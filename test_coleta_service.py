@@ -1,8 +1,12 @@
 import unittest
 import os
+import json
 import csv
 import tempfile
-from coleta_service import ler_pontos_por_tipo_lixo
+from unittest import mock
+from coleta_service import (ler_pontos_por_tipo_lixo, consultar_pontos, pontos_mais_proximos, pontos_geojson,
+                            buscar_pontos_proximos_em_lote, exportar_pontos, EstatisticasPrefiltro)
+from cache_rotas import CacheRotas
 
 
 class TestColetaService(unittest.TestCase):
@@ -32,7 +36,7 @@ class TestColetaService(unittest.TestCase):
     
     def test_filtrar_por_um_tipo(self):
         """Teste: filtrar pontos por um único tipo de lixo."""
-        resultado = ler_pontos_por_tipo_lixo(['pilhas'], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(['pilhas'], csv_file=self.temp_csv.name)
         
         # Deve retornar 3 pontos que têm pilhas
         self.assertEqual(len(resultado), 3)
@@ -42,7 +46,7 @@ class TestColetaService(unittest.TestCase):
     
     def test_filtrar_por_multiplos_tipos(self):
         """Teste: filtrar pontos que têm TODOS os tipos especificados."""
-        resultado = ler_pontos_por_tipo_lixo(['eletroeletronicos', 'pilhas'], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(['eletroeletronicos', 'pilhas'], csv_file=self.temp_csv.name)
         
         # Deve retornar apenas pontos que têm AMBOS eletroeletronicos E pilhas
         self.assertEqual(len(resultado), 2)
@@ -51,28 +55,28 @@ class TestColetaService(unittest.TestCase):
     
     def test_filtrar_com_tipo_inexistente(self):
         """Teste: filtrar por tipo que não existe."""
-        resultado = ler_pontos_por_tipo_lixo(['tipo_inexistente'], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(['tipo_inexistente'], csv_file=self.temp_csv.name)
         
         # Deve retornar vazio
         self.assertEqual(len(resultado), 0)
     
     def test_filtrar_com_lista_vazia(self):
         """Teste: filtrar com lista vazia de tipos."""
-        resultado = ler_pontos_por_tipo_lixo([], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo([], csv_file=self.temp_csv.name)
         
         # Deve retornar vazio
         self.assertEqual(len(resultado), 0)
     
     def test_filtrar_com_None(self):
         """Teste: filtrar com None."""
-        resultado = ler_pontos_por_tipo_lixo(None, self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(None, csv_file=self.temp_csv.name)
         
         # Deve retornar vazio
         self.assertEqual(len(resultado), 0)
     
     def test_estrutura_dados_retornados(self):
         """Teste: verificar se a estrutura dos dados retornados é correta."""
-        resultado = ler_pontos_por_tipo_lixo(['pilhas'], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(['pilhas'], csv_file=self.temp_csv.name)
         
         # Verificar estrutura de um ponto
         ponto = resultado['001']
@@ -91,9 +95,9 @@ class TestColetaService(unittest.TestCase):
     
     def test_case_insensitive(self):
         """Teste: verificar se o filtro é case-insensitive."""
-        resultado1 = ler_pontos_por_tipo_lixo(['PILHAS'], self.temp_csv.name)
-        resultado2 = ler_pontos_por_tipo_lixo(['pilhas'], self.temp_csv.name)
-        resultado3 = ler_pontos_por_tipo_lixo(['Pilhas'], self.temp_csv.name)
+        resultado1 = ler_pontos_por_tipo_lixo(['PILHAS'], csv_file=self.temp_csv.name)
+        resultado2 = ler_pontos_por_tipo_lixo(['pilhas'], csv_file=self.temp_csv.name)
+        resultado3 = ler_pontos_por_tipo_lixo(['Pilhas'], csv_file=self.temp_csv.name)
         
         # Todos devem retornar o mesmo resultado
         self.assertEqual(len(resultado1), len(resultado2))
@@ -102,17 +106,141 @@ class TestColetaService(unittest.TestCase):
     def test_arquivo_nao_encontrado(self):
         """Teste: comportamento quando arquivo CSV não existe."""
         with self.assertRaises(FileNotFoundError):
-            ler_pontos_por_tipo_lixo(['pilhas'], 'arquivo_inexistente.csv')
+            ler_pontos_por_tipo_lixo(['pilhas'], csv_file='arquivo_inexistente.csv')
     
     def test_tipos_com_espacos(self):
         """Teste: filtro com tipos que têm espaços em branco."""
-        resultado = ler_pontos_por_tipo_lixo(['  pilhas  ', ' eletroeletronicos '], self.temp_csv.name)
+        resultado = ler_pontos_por_tipo_lixo(['  pilhas  ', ' eletroeletronicos '], csv_file=self.temp_csv.name)
         
         # Deve remover espaços e encontrar os pontos
         self.assertEqual(len(resultado), 2)
         self.assertIn('001', resultado)
         self.assertIn('003', resultado)
 
+    def test_modo_qualquer(self):
+        """Teste: modo "qualquer" retorna pontos com pelo menos um dos tipos."""
+        resultado = ler_pontos_por_tipo_lixo(['lampadas', 'eletrodomesticos'], csv_file=self.temp_csv.name,
+                                             modo='qualquer')
+        
+        # Pontos B e C têm eletrodomesticos, D tem lampadas
+        self.assertEqual(list(resultado), ['002', '003', '004'])
+    
+    def test_modo_invalido(self):
+        """Teste: modo desconhecido gera ValueError."""
+        with self.assertRaises(ValueError):
+            ler_pontos_por_tipo_lixo(['pilhas'], csv_file=self.temp_csv.name, modo='talvez')
+
+    def test_prefiltro_roteia_apenas_mais_proximos(self):
+        """Teste: com n e fator 1, só os n pontos mais próximos em linha reta são roteados."""
+        def distancias_falsas(lat, lon, destinos):
+            # Ordem de tempo invertida em relação à linha reta
+            return [{'distance_km': 1.0, 'duration_min': 10.0 - i} for i in range(len(destinos))]
+
+        with mock.patch('coleta_service.get_distances_from_google', side_effect=distancias_falsas) as rotas, \
+                mock.patch('coleta_service.estatisticas_prefiltro', EstatisticasPrefiltro()) as estatisticas, \
+                mock.patch('coleta_service.cache_rotas', CacheRotas()), \
+                mock.patch('coleta_service.GOOGLE_API_KEY', 'chave-teste'):
+            resultado = ler_pontos_por_tipo_lixo(['pilhas'], -15.0, -47.0, 2, csv_file=self.temp_csv.name,
+                                                 fator_prefiltro=1)
+        
+        # Pontos com pilhas mais próximos de (-15.0, -47.0) em linha reta: 001 e 003
+        destinos = rotas.call_args[0][2]
+        self.assertEqual(destinos, [(-15.1, -47.1), (-15.3, -47.3)])
+        self.assertEqual(list(resultado), ['003', '001'])
+        self.assertEqual(estatisticas.resumo()['divergencias'], 0)
+    
+    def test_prefiltro_registra_divergencia(self):
+        """Teste: top-n por tempo diferente do top-n em linha reta é contabilizado."""
+        def distancias_falsas(lat, lon, destinos):
+            return [{'distance_km': 1.0, 'duration_min': 10.0 - i} for i in range(len(destinos))]
+
+        with mock.patch('coleta_service.get_distances_from_google', side_effect=distancias_falsas) as rotas, \
+                mock.patch('coleta_service.estatisticas_prefiltro', EstatisticasPrefiltro()) as estatisticas, \
+                mock.patch('coleta_service.cache_rotas', CacheRotas()), \
+                mock.patch('coleta_service.GOOGLE_API_KEY', 'chave-teste'):
+            resultado = ler_pontos_por_tipo_lixo(['pilhas'], -15.0, -47.0, 1, csv_file=self.temp_csv.name,
+                                                 fator_prefiltro=3)
+        
+        self.assertEqual(len(rotas.call_args[0][2]), 3)
+        self.assertEqual(list(resultado), ['004'])
+        self.assertEqual(estatisticas.resumo()['divergencias'], 1)
+        self.assertEqual(estatisticas.resumo()['candidatos_roteados'], 3)
+
+    def test_consulta_paginada(self):
+        """Teste: só a página pedida é retornada, com o total do filtro."""
+        resultado = consultar_pontos(['pilhas'], limite=2, deslocamento=1, csv_file=self.temp_csv.name)
+        
+        self.assertEqual([p['id'] for p in resultado['pontos']], ['003', '004'])
+        self.assertEqual(resultado['total'], 3)
+        self.assertIsNone(resultado['proximo_cursor'])
+    
+    def test_consulta_com_cursor(self):
+        """Teste: o cursor continua da posição seguinte à última página."""
+        primeira = consultar_pontos(limite=3, csv_file=self.temp_csv.name)
+        segunda = consultar_pontos(limite=3, cursor=primeira['proximo_cursor'], csv_file=self.temp_csv.name)
+        
+        self.assertEqual([p['id'] for p in primeira['pontos']], ['001', '002', '003'])
+        self.assertEqual([p['id'] for p in segunda['pontos']], ['004'])
+        self.assertIsNone(segunda['proximo_cursor'])
+        with self.assertRaises(ValueError):
+            consultar_pontos(cursor='invalido', csv_file=self.temp_csv.name)
+    
+    def test_cursor_expira_quando_dados_mudam(self):
+        """Teste: cursor de uma versão anterior do CSV é rejeitado."""
+        primeira = consultar_pontos(limite=1, csv_file=self.temp_csv.name)
+        estado = os.stat(self.temp_csv.name)
+        os.utime(self.temp_csv.name, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+        
+        with self.assertRaises(ValueError):
+            consultar_pontos(limite=1, cursor=primeira['proximo_cursor'], csv_file=self.temp_csv.name)
+    
+    def test_mais_proximos_estavel(self):
+        """Teste: top-n mantém a ordem original nos empates e deixa None por último."""
+        pontos = {i: {'id': i, 'duration_min': d} for i, d in [('a', 5.0), ('b', None), ('c', 2.0), ('d', 5.0)]}
+        
+        self.assertEqual(list(pontos_mais_proximos(pontos, 3)), ['c', 'a', 'd'])
+        self.assertEqual(list(pontos_mais_proximos(pontos, 10)), ['c', 'a', 'd', 'b'])
+    
+    def test_geojson_sem_agrupamento(self):
+        """Teste: sem zoom cada ponto vira uma feature [lon, lat] arredondada."""
+        colecao = pontos_geojson(['pilhas'], precisao=0, csv_file=self.temp_csv.name)
+        
+        self.assertEqual(colecao['total'], 3)
+        self.assertEqual([f['properties']['id'] for f in colecao['features']], ['001', '003', '004'])
+        self.assertEqual(colecao['features'][0]['geometry'], {'type': 'Point', 'coordinates': [-47.0, -15.0]})
+    
+    def test_geojson_agrupado_por_zoom(self):
+        """Teste: em zoom baixo pontos vizinhos viram um grupo no centróide."""
+        colecao = pontos_geojson(zoom=3, csv_file=self.temp_csv.name)
+        grupo = colecao['features'][0]
+        
+        self.assertEqual(len(colecao['features']), 1)
+        self.assertEqual(grupo['properties'], {'cluster': True, 'quantidade': 4})
+        self.assertAlmostEqual(grupo['geometry']['coordinates'][1], -15.25)
+        self.assertEqual(len(pontos_geojson(zoom=12, csv_file=self.temp_csv.name)['features']), 4)
+    
+    def test_proximos_em_lote(self):
+        """Teste: cada origem recebe seus K vizinhos do filtro, do mais próximo ao mais distante."""
+        resultado = buscar_pontos_proximos_em_lote([(-15.39, -47.39), (-15.1, -47.1)], 2, ['pilhas'],
+                                                   csv_file=self.temp_csv.name)
+        
+        self.assertEqual([[id_ponto for id_ponto, _ in linha] for linha in resultado], [['004', '003'], ['001', '003']])
+        self.assertLess(resultado[1][0][1], 1e-9)
+        self.assertEqual(buscar_pontos_proximos_em_lote([], 2, csv_file=self.temp_csv.name), [])
+    
+    def test_exportar_ndjson_e_json(self):
+        """Teste: exportação em NDJSON e em array JSON traz os mesmos pontos."""
+        with mock.patch('coleta_service.PONTOS_POR_BLOCO_EXPORTACAO', 2):
+            _, partes_ndjson = exportar_pontos(['pilhas'], csv_file=self.temp_csv.name)
+            _, partes_json = exportar_pontos(['pilhas'], formato='json', csv_file=self.temp_csv.name)
+            linhas = b''.join(partes_ndjson).decode('utf-8').splitlines()
+            array = json.loads(b''.join(partes_json))
+        
+        self.assertEqual([json.loads(linha)['id'] for linha in linhas], ['001', '003', '004'])
+        self.assertEqual([json.loads(linha) for linha in linhas], array)
+        with self.assertRaises(ValueError):
+            exportar_pontos(formato='xml', csv_file=self.temp_csv.name)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+import app
+from cache_rotas import CacheRotas
+from coleta_service import _agrupar_para_matriz, ler_pontos_por_tipo_lixo, ler_pontos_proximos_em_lote
+from servidor_rotas_falso import ServidorRotasFalso
+
+ORIGENS = [(-15.7901 - i * 0.0004, -47.8801 + i * 0.0002) for i in range(6)]
+
+
+class TestConsultasLote(unittest.TestCase):
+    """Testes das consultas de proximidade em lote."""
+
+    def test_igual_as_consultas_individuais(self):
+        """Teste: cada resultado do lote é o mesmo da consulta individual equivalente."""
+        consultas = [{'lat': lat, 'lon': lon, 'tipos': ['pilhas'], 'n': 3} for lat, lon in ORIGENS]
+        consultas.append({'lat': -15.8, 'lon': -47.9, 'tipos': 'eletroeletronicos, Pilhas', 'n': 2})
+
+        resultados = ler_pontos_proximos_em_lote(consultas, roteamento=['estimativa'])
+
+        self.assertEqual(len(resultados), len(consultas))
+        for consulta, resultado in zip(consultas, resultados):
+            tipos = consulta['tipos'] if isinstance(consulta['tipos'], list) else consulta['tipos'].split(',')
+            individual = ler_pontos_por_tipo_lixo(tipos, consulta['lat'], consulta['lon'], consulta['n'],
+                                                  roteamento=['estimativa'])
+            self.assertEqual(list(resultado['pontos']), list(individual))
+            self.assertEqual(list(resultado['pontos'].values()), list(individual.values()))
+
+    def test_erros_por_consulta(self):
+        """Teste: consultas inválidas recebem erro sem afetar as demais."""
+        resultados = ler_pontos_proximos_em_lote([
+            {'lat': -15.79, 'lon': -47.88, 'tipos': ['pilhas'], 'n': 1},
+            {'lon': -47.88, 'tipos': ['pilhas']},
+            {'lat': 'norte', 'lon': -47.88},
+            {'lat': -15.79, 'lon': -47.88, 'n': 0},
+            {'lat': -15.79, 'lon': -47.88, 'tipos': ['tipo_inexistente'], 'n': 2},
+        ], roteamento=['estimativa'])
+
+        self.assertEqual(len(resultados[0]['pontos']), 1)
+        self.assertIn('lat', resultados[1]['erro'])
+        self.assertIn('números', resultados[2]['erro'])
+        self.assertIn('n deve ser', resultados[3]['erro'])
+        self.assertEqual(resultados[4], {'pontos': {}})
+        with self.assertRaises(ValueError):
+            ler_pontos_proximos_em_lote([], modo='alguns')
+        with self.assertRaises(ValueError):
+            ler_pontos_proximos_em_lote([], roteamento=['waze'])
+
+    def test_agrupamento_por_eficiencia(self):
+        """Teste: consultas com os mesmos destinos dividem uma matriz; destinos disjuntos, não."""
+        origens = {0: (-15.79, -47.88), 1: (-15.791, -47.88), 2: (-23.5, -46.6)}
+        faltando = {0: ['a', 'b'], 1: ['a', 'b'], 2: ['x', 'y']}
+        self.assertEqual(_agrupar_para_matriz(faltando, origens), [[2], [0, 1]])
+
+    def test_roteamento_em_matriz(self):
+        """Teste: consultas vizinhas no lote geram uma única requisição de matriz à API."""
+        consultas = [{'lat': lat, 'lon': lon, 'tipos': ['pilhas'], 'n': 2} for lat, lon in ORIGENS]
+        with ServidorRotasFalso() as servidor, \
+                mock.patch('coleta_service.GOOGLE_API_KEY', 'chave-teste'), \
+                mock.patch('coleta_service.GOOGLE_ROUTES_URL', servidor.url), \
+                mock.patch('coleta_service.cache_rotas', CacheRotas()):
+            resultados = ler_pontos_proximos_em_lote(consultas, roteamento=['google'])
+            requisicoes = len(servidor.requisicoes)
+            individuais = []
+            for lat, lon in ORIGENS:
+                # Cache vazio a cada consulta: origens vizinhas caem na mesma célula do cache de rotas
+                with mock.patch('coleta_service.cache_rotas', CacheRotas()):
+                    individuais.append(ler_pontos_por_tipo_lixo(['pilhas'], lat, lon, 2, roteamento=['google']))
+
+        self.assertEqual(requisicoes, 1)
+        for resultado, individual in zip(resultados, individuais):
+            self.assertEqual(resultado['pontos'], individual)
+            self.assertTrue(all(p['fonte_distancia'] == 'google' for p in resultado['pontos'].values()))
+
+    def test_endpoint(self):
+        """Teste: POST /api/coleta-pontos/lote devolve um resultado por consulta."""
+        cliente = app.app.test_client()
+        resposta = cliente.post('/api/coleta-pontos/lote', json={
+            'consultas': [{'lat': -15.79, 'lon': -47.88, 'tipos': 'pilhas', 'n': 2}, {'lat': -15.79}],
+            'roteamento': 'estimativa'
+        })
+        dados = resposta.get_json()
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((dados['total'], dados['erros']), (2, 1))
+        self.assertEqual(dados['resultados'][0]['total'], 2)
+        self.assertEqual(dados['resultados'][0]['pontos'][0]['fonte_distancia'], 'estimativa')
+        self.assertIn('erro', dados['resultados'][1])
+        self.assertEqual(cliente.post('/api/coleta-pontos/lote', json=[1, 2]).status_code, 400)
+        self.assertEqual(cliente.post('/api/coleta-pontos/lote',
+                                      json={'consultas': [], 'modo': 'alguns'}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
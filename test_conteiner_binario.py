@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+from array import array
+from conteiner_binario import ErroConteiner, abrir_conteiner, gravar_conteiner, regravar_metadados
+
+MAGICO = b"TESTE\x00\x00\x01"
+
+
+class TestConteinerBinario(unittest.TestCase):
+    """Testes do contêiner binário compartilhado pelo snapshot e pela tabela de rotas."""
+
+    def setUp(self):
+        self.caminho = os.path.join(tempfile.mkdtemp(), 'conteiner.bin')
+        self.addCleanup(lambda: os.path.exists(self.caminho) and os.unlink(self.caminho))
+        gravar_conteiner(self.caminho, MAGICO, 3, {'nome': 'teste'}, [
+            ('bytes', '', b'abc'),
+            ('numeros', 'd', array('d', [1.5, -2.0]).tobytes()),
+        ])
+
+    def test_ida_e_volta(self):
+        """Teste: metadados e seções voltam como gravados, com seções alinhadas."""
+        metadados, secoes = abrir_conteiner(self.caminho, MAGICO, 3)
+
+        self.assertEqual(metadados['nome'], 'teste')
+        self.assertEqual(bytes(secoes['bytes']), b'abc')
+        self.assertEqual(secoes['numeros'].tolist(), [1.5, -2.0])
+        self.assertEqual(metadados['secoes']['numeros'][0] % 8, 0)
+        self.assertFalse(any(nome.endswith('.tmp') for nome in os.listdir(os.path.dirname(self.caminho))))
+
+    def test_rejeita_outro_tipo_versao_ou_corrompido(self):
+        """Teste: número mágico, versão e CRC-32 diferentes viram ErroConteiner."""
+        with self.assertRaises(ErroConteiner):
+            abrir_conteiner(self.caminho, b"OUTRO\x00\x00\x01", 3)
+        with self.assertRaises(ErroConteiner):
+            abrir_conteiner(self.caminho, MAGICO, 4)
+
+        with open(self.caminho, 'r+b') as arquivo:
+            arquivo.seek(-1, os.SEEK_END)
+            ultimo = arquivo.read(1)[0]
+            arquivo.seek(-1, os.SEEK_END)
+            arquivo.write(bytes([ultimo ^ 0xFF]))
+        with self.assertRaisesRegex(ErroConteiner, 'CRC-32'):
+            abrir_conteiner(self.caminho, MAGICO, 3)
+
+    def test_cabecalho_e_tamanho_sempre_conferidos(self):
+        """Teste: metadados alterados ou arquivo truncado falham mesmo sem o CRC-32 do corpo."""
+        with open(self.caminho, 'r+b') as arquivo:
+            arquivo.truncate(os.path.getsize(self.caminho) - 1)
+        with self.assertRaisesRegex(ErroConteiner, 'truncado'):
+            abrir_conteiner(self.caminho, MAGICO, 3, verificar_crc=False)
+
+        with open(self.caminho, 'r+b') as arquivo:
+            conteudo = arquivo.read()
+            arquivo.seek(conteudo.index(b'teste'))
+            arquivo.write(b'TESTE')
+        with self.assertRaisesRegex(ErroConteiner, 'metadados corrompidos'):
+            abrir_conteiner(self.caminho, MAGICO, 3, verificar_crc=False)
+
+    def test_regravar_metadados(self):
+        """Teste: regravar troca só os metadados e mantém as seções."""
+        regravar_metadados(self.caminho, MAGICO, 3, {'nome': 'outro'})
+
+        metadados, secoes = abrir_conteiner(self.caminho, MAGICO, 3)
+        self.assertEqual(metadados['nome'], 'outro')
+        self.assertEqual(bytes(secoes['bytes']), b'abc')
+        self.assertEqual(secoes['numeros'].tolist(), [1.5, -2.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import random
+from unittest import mock
+from distancias import DistanciasVetorizadas, haversine_km
+import distancias
+
+
+class TestDistanciasVetorizadas(unittest.TestCase):
+    """Testes do cálculo vetorizado comparando com o haversine escalar."""
+
+    @classmethod
+    def setUpClass(cls):
+        gerador = random.Random(7)
+        cls.coordenadas = [(gerador.uniform(-16.2, -15.4), gerador.uniform(-48.3, -47.4)) for _ in range(500)]
+        cls.origens = [(gerador.uniform(-16.2, -15.4), gerador.uniform(-48.3, -47.4)) for _ in range(30)]
+        cls.kernel = DistanciasVetorizadas([c[0] for c in cls.coordenadas], [c[1] for c in cls.coordenadas])
+
+    def linear_k(self, lat, lon, k, selecao=None):
+        posicoes = range(len(self.coordenadas)) if selecao is None else selecao
+        return sorted((haversine_km(lat, lon, *self.coordenadas[p]), p) for p in posicoes)[:k]
+
+    def test_matriz_igual_haversine(self):
+        """Teste: cada elemento da matriz coincide com o haversine escalar."""
+        matriz = self.kernel.matriz([o[0] for o in self.origens], [o[1] for o in self.origens])
+
+        self.assertEqual(matriz.shape, (len(self.origens), len(self.coordenadas)))
+        for i, (lat, lon) in enumerate(self.origens[:5]):
+            for j, coordenada in enumerate(self.coordenadas):
+                self.assertAlmostEqual(matriz[i, j], haversine_km(lat, lon, *coordenada), places=9)
+
+    def test_k_mais_proximos_em_lote(self):
+        """Teste: top-k de várias origens, processadas em blocos, igual à busca linear."""
+        selecao = list(range(0, len(self.coordenadas), 3))
+        with mock.patch.object(distancias, 'ELEMENTOS_POR_BLOCO', 1000):
+            dist, pos = self.kernel.k_mais_proximos([o[0] for o in self.origens], [o[1] for o in self.origens],
+                                                    4, selecao)
+
+        for i, (lat, lon) in enumerate(self.origens):
+            esperado = self.linear_k(lat, lon, 4, selecao)
+            self.assertEqual(pos[i].tolist(), [p for _, p in esperado])
+            self.assertAlmostEqual(dist[i, -1], esperado[-1][0], places=9)
+
+    def test_k_maior_que_total(self):
+        """Teste: com k acima do número de pontos, todos voltam ordenados."""
+        dist, pos = self.kernel.k_mais_proximos([-15.8], [-47.9], 10, [5, 1, 3])
+
+        self.assertEqual(sorted(pos[0].tolist()), [1, 3, 5])
+        self.assertEqual(dist[0].tolist(), sorted(dist[0].tolist()))
+        self.assertEqual(self.kernel.k_mais_proximos([-15.8], [-47.9], 3, [])[1].shape, (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
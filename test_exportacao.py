@@ -0,0 +1,46 @@
+import unittest
+import gzip
+from unittest import mock
+import exportacao
+from exportacao import CorposPreCalculados, comprimir_fluxo, escolher_codificacao
+
+
+class TestExportacao(unittest.TestCase):
+    """Testes de negociação de compressão e dos corpos pré-calculados."""
+
+    def test_escolher_codificacao(self):
+        """Teste: Accept-Encoding com q-values escolhe a compressão suportada."""
+        with mock.patch.object(exportacao, 'brotli', None):
+            self.assertEqual(escolher_codificacao('gzip, deflate, br'), 'gzip')
+            self.assertIsNone(escolher_codificacao('br'))
+            self.assertIsNone(escolher_codificacao('gzip;q=0'))
+            self.assertIsNone(escolher_codificacao(None))
+            self.assertEqual(escolher_codificacao('*'), 'gzip')
+
+    def test_comprimir_fluxo_gzip(self):
+        """Teste: o fluxo comprimido parte a parte descomprime no conteúdo original."""
+        partes = [f'{{"id": "{i:03d}"}}\n'.encode() for i in range(2000)]
+        comprimido = b''.join(comprimir_fluxo(iter(partes), 'gzip'))
+
+        self.assertEqual(gzip.decompress(comprimido), b''.join(partes))
+        self.assertLess(len(comprimido), len(b''.join(partes)) // 5)
+
+    def test_corpos_pre_calculados(self):
+        """Teste: o corpo é gerado uma vez por chave e o LRU respeita a capacidade."""
+        corpos = CorposPreCalculados(capacidade=1)
+        geracoes = []
+
+        def gerar():
+            geracoes.append(1)
+            return iter([b'[', b']'])
+
+        self.assertEqual(corpos.obter(('v1', 'json', None), gerar), b'[]')
+        self.assertEqual(corpos.obter(('v1', 'json', None), gerar), b'[]')
+        corpos.obter(('v2', 'json', None), gerar)
+
+        self.assertEqual(len(geracoes), 2)
+        self.assertEqual(corpos.resumo(), {'acertos': 1, 'faltas': 2, 'corpos': 1, 'bytes': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import itertools
+import json
+import os
+import tempfile
+from gerador_carga import carregar_cenario, executar_cenario, sequencia_requisicoes, validar_cenario
+
+DIRETORIO_CENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cenarios_carga')
+
+
+class TestGeradorCarga(unittest.TestCase):
+    """Testes do gerador de carga guiado por cenários."""
+
+    def test_cenarios_e_validacao(self):
+        """Teste: os cenários do repositório são válidos e erros de cenário viram ValueError."""
+        for nome in os.listdir(DIRETORIO_CENARIOS):
+            cenario = carregar_cenario(os.path.join(DIRETORIO_CENARIOS, nome))
+            self.assertTrue(cenario['mistura'] and cenario['configuracoes'])
+
+        for invalido in ({'mistura': [{'endpoint': 'inexistente'}]},
+                         {'mistura': [{'endpoint': 'lista', 'peso': 0}]},
+                         {'mistura': [{'endpoint': 'lista'}, {'endpoint': 'lista'}]},
+                         {'configuracoes': [{'servidor': 'gunicorn'}]}):
+            with self.assertRaises(ValueError):
+                validar_cenario(invalido)
+
+        caminho = os.path.join(tempfile.mkdtemp(), 'cenario.json')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump([1, 2], arquivo)
+        self.addCleanup(os.unlink, caminho)
+        with self.assertRaises(ValueError):
+            carregar_cenario(caminho)
+
+    def test_sequencia_reprodutivel(self):
+        """Teste: a sequência de requisições depende só da semente e do cliente e segue os pesos."""
+        cenario = validar_cenario({'mistura': [{'endpoint': 'proximidade', 'peso': 9},
+                                               {'endpoint': 'lote', 'peso': 1, 'consultas': 3}]})
+        primeira = list(itertools.islice(sequencia_requisicoes(cenario, 0), 200))
+
+        self.assertEqual(primeira, list(itertools.islice(sequencia_requisicoes(cenario, 0), 200)))
+        self.assertNotEqual(primeira, list(itertools.islice(sequencia_requisicoes(cenario, 1), 200)))
+        self.assertGreater(sum(nome == 'proximidade' for nome, *_ in primeira), 150)
+        nome, metodo, caminho, corpo = next(r for r in primeira if r[0] == 'lote')
+        self.assertEqual((metodo, caminho, len(corpo['consultas'])), ('POST', '/api/coleta-pontos/lote', 3))
+
+    def test_execucao_curta(self):
+        """Teste: uma rodada curta contra o app reporta cada endpoint, sem erros."""
+        cenario = validar_cenario({
+            'clientes': 2, 'duracao': 0.5, 'aquecimento': 0, 'latencia_rotas': 0,
+            'configuracoes': [{'servidor': 'sincrono', 'threads': 2}],
+            'mistura': [{'endpoint': nome} for nome in ('lista', 'proximidade', 'near', 'lote')],
+        })
+        resultados = executar_cenario(cenario)
+        resultado = resultados['sincrono (2 threads)']
+
+        self.assertEqual(set(resultado['endpoints']), {'lista', 'proximidade', 'near', 'lote'})
+        self.assertGreater(resultado['total']['requisicoes'], 0)
+        self.assertEqual(resultado['total']['erros'], 0)
+        self.assertIsNotNone(resultado['total']['p99_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import random
+from distancias import haversine_km
+from indice_espacial import GradeEspacial, agrupar_por_pixels, pixel_mercator
+
+
+class TestIndiceEspacial(unittest.TestCase):
+    """Testes da grade espacial comparando com busca linear."""
+
+    @classmethod
+    def setUpClass(cls):
+        gerador = random.Random(42)
+        cls.coordenadas = [(gerador.uniform(-16.2, -15.4), gerador.uniform(-48.3, -47.4)) for _ in range(2000)]
+        cls.grade = GradeEspacial(cls.coordenadas, tamanho_celula=0.05)
+
+    def linear_k(self, lat, lon, k, permitido=None):
+        distancias = sorted(
+            (haversine_km(lat, lon, p_lat, p_lon), posicao)
+            for posicao, (p_lat, p_lon) in enumerate(self.coordenadas)
+            if permitido is None or permitido(posicao)
+        )
+        return distancias[:k]
+
+    def test_k_mais_proximos_igual_busca_linear(self):
+        """Teste: vizinhos da grade coincidem com a busca linear."""
+        for lat, lon in [(-15.79, -47.88), (-16.19, -48.29), (-15.0, -47.0), (-20.0, -50.0)]:
+            resultado = self.grade.k_mais_proximos(lat, lon, 7)
+            self.assertEqual([p for _, p in resultado], [p for _, p in self.linear_k(lat, lon, 7)])
+
+    def test_k_mais_proximos_com_filtro(self):
+        """Teste: o filtro por posição é respeitado na busca de vizinhos."""
+        permitido = lambda posicao: posicao % 13 == 0
+        resultado = self.grade.k_mais_proximos(-15.79, -47.88, 5, permitido)
+
+        self.assertEqual([p for _, p in resultado],
+                         [p for _, p in self.linear_k(-15.79, -47.88, 5, permitido)])
+
+    def test_k_maior_que_total(self):
+        """Teste: k maior que o número de pontos retorna todos os permitidos."""
+        permitido = lambda posicao: posicao < 3
+        resultado = self.grade.k_mais_proximos(-15.79, -47.88, 10, permitido)
+
+        self.assertEqual(sorted(p for _, p in resultado), [0, 1, 2])
+
+    def test_na_caixa_igual_busca_linear(self):
+        """Teste: consulta por retângulo coincide com o filtro linear."""
+        caixa = (-15.9, -48.0, -15.7, -47.8)
+        esperado = [posicao for posicao, (lat, lon) in enumerate(self.coordenadas)
+                    if caixa[0] <= lat <= caixa[2] and caixa[1] <= lon <= caixa[3]]
+
+        self.assertEqual(self.grade.na_caixa(*caixa), esperado)
+        self.assertEqual(self.grade.na_caixa(-90, -180, 90, 180), list(range(len(self.coordenadas))))
+        self.assertEqual(self.grade.na_caixa(0, 0, 1, 1), [])
+
+    def test_grade_vazia(self):
+        """Teste: grade sem pontos responde vazio."""
+        grade = GradeEspacial([])
+
+        self.assertEqual(grade.k_mais_proximos(0, 0, 3), [])
+        self.assertEqual(grade.na_caixa(-1, -1, 1, 1), [])
+
+    def test_pixel_mercator(self):
+        """Teste: projeção nos cantos e no centro do mundo."""
+        self.assertEqual(pixel_mercator(0, 0, 0), (128.0, 128.0))
+        self.assertEqual(pixel_mercator(0, -180, 1), (0.0, 256.0))
+        x, y = pixel_mercator(90, 180, 2)
+        self.assertEqual(x, 1024.0)
+        self.assertAlmostEqual(y, 0.0, places=3)
+
+    def test_agrupar_por_pixels(self):
+        """Teste: grupos cobrem todas as posições e diminuem com o zoom."""
+        posicoes = range(len(self.coordenadas))
+        longe = agrupar_por_pixels(self.coordenadas, posicoes, 8)
+        perto = agrupar_por_pixels(self.coordenadas, posicoes, 18)
+
+        self.assertEqual(sorted(p for grupo in longe for p in grupo), list(posicoes))
+        self.assertLess(len(longe), 20)
+        self.assertEqual(len(perto), len(self.coordenadas))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from lru import LRU
+
+
+class TestLRU(unittest.TestCase):
+    """Testes do LRU usado como camada em memória dos caches."""
+
+    def test_descarta_menos_usado(self):
+        """Teste: acima da capacidade sai o item menos usado recentemente."""
+        lru = LRU(2)
+        lru.gravar('a', 1)
+        lru.gravar('b', 2)
+        self.assertEqual(lru.obter('a'), 1)
+        lru.gravar('c', 3)
+
+        self.assertEqual(lru.obter_muitos(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        self.assertEqual(lru.resumo(), {'acertos': 3, 'faltas': 1, 'entradas': 2})
+
+    def test_invalidos_saem_e_contam_como_falta(self):
+        """Teste: valores rejeitados pela validação são removidos."""
+        lru = LRU(4)
+        lru.gravar_muitos([('a', 1), ('b', 2)])
+
+        self.assertEqual(lru.obter_muitos(['a', 'b'], lambda valor: valor > 1), {'b': 2})
+        self.assertEqual(len(lru), 1)
+        self.assertEqual((lru.acertos, lru.faltas), (1, 1))
+        lru.limpar(zerar_contadores=True)
+        self.assertEqual(lru.resumo(), {'acertos': 0, 'faltas': 0, 'entradas': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+import app
+from cache_respostas import CacheRespostas
+from metricas import RegistroMetricas, chamadas_rotas, duracao_etapas
+
+
+class TestMetricas(unittest.TestCase):
+    """Testes das métricas no formato do Prometheus."""
+
+    def test_contador_e_medidor(self):
+        """Teste: contadores e medidores aparecem com HELP, TYPE e rótulos escapados."""
+        registro = RegistroMetricas()
+        chamadas = registro.contador('chamadas_total', 'Chamadas', ('provedor',))
+        tamanho = registro.medidor('tamanho', 'Tamanho')
+        chamadas.inc(provedor='google')
+        chamadas.inc(2, provedor='os"rm')
+        tamanho.definir(42)
+
+        texto = registro.expor()
+        self.assertIn('# TYPE chamadas_total counter\n', texto)
+        self.assertIn('chamadas_total{provedor="google"} 1\n', texto)
+        self.assertIn('chamadas_total{provedor="os\\"rm"} 2\n', texto)
+        self.assertIn('tamanho 42\n', texto)
+        with self.assertRaises(ValueError):
+            chamadas.inc(-1, provedor='google')
+        with self.assertRaises(ValueError):
+            chamadas.inc(regiao='df')
+        with self.assertRaises(ValueError):
+            registro.medidor('tamanho', 'Repetida')
+
+    def test_histograma_cumulativo(self):
+        """Teste: as faixas do histograma são cumulativas e terminam em +Inf."""
+        registro = RegistroMetricas()
+        duracao = registro.histograma('duracao_segundos', 'Duração', ('etapa',), limites=(0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            duracao.observar(valor, etapa='filtro')
+
+        texto = registro.expor()
+        self.assertIn('duracao_segundos_bucket{etapa="filtro",le="0.1"} 2\n', texto)
+        self.assertIn('duracao_segundos_bucket{etapa="filtro",le="1.0"} 3\n', texto)
+        self.assertIn('duracao_segundos_bucket{etapa="filtro",le="+Inf"} 4\n', texto)
+        self.assertIn('duracao_segundos_sum{etapa="filtro"} 3.65\n', texto)
+        self.assertIn('duracao_segundos_count{etapa="filtro"} 4\n', texto)
+
+    def test_endpoint_registra_etapas(self):
+        """Teste: uma consulta por rotas passa pelas etapas e aparece em /metrics."""
+        etapas = ('carga', 'filtro', 'roteamento', 'ordenacao', 'serializacao')
+        antes = {etapa: duracao_etapas.valor(etapa=etapa) for etapa in etapas}
+        chamadas_antes = chamadas_rotas.valor(provedor='estimativa')
+
+        cliente = app.app.test_client()
+        with mock.patch('app.cache_respostas', CacheRespostas()):
+            resposta = cliente.get('/api/coleta-pontos?tipos=pilhas&lat=-15.79&lon=-47.88&n=3'
+                                   '&roteamento=estimativa')
+        self.assertEqual(resposta.status_code, 200)
+        for etapa in etapas:
+            self.assertEqual(duracao_etapas.valor(etapa=etapa), antes[etapa] + 1, etapa)
+        self.assertEqual(chamadas_rotas.valor(provedor='estimativa'), chamadas_antes + 1)
+
+        metricas = cliente.get('/metrics')
+        self.assertEqual(metricas.status_code, 200)
+        self.assertTrue(metricas.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = metricas.get_data(as_text=True)
+        self.assertIn('pontos_etapa_duracao_segundos_count{etapa="roteamento"}', texto)
+        self.assertIn('pontos_dataset_pontos ', texto)
+        self.assertIn('# TYPE pontos_indice_construcao_segundos gauge', texto)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+import coleta_service
+from cache_rotas import CacheRotas
+from distancias import haversine_km
+from provedores_rotas import ErroRoteamento, ProvedorEstimativa, ProvedorOSRM, ProvedorRotas
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class ProvedorParcial(ProvedorRotas):
+    """Provedor de teste que só calcula o primeiro destino."""
+
+    nome = "parcial"
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        return [{'distance_km': 1.0, 'duration_min': 2.0}] + \
+            [{'distance_km': None, 'duration_min': None}] * (len(destinos) - 1)
+
+
+class ProvedorQuebrado(ProvedorRotas):
+    """Provedor de teste que sempre falha."""
+
+    nome = "quebrado"
+
+    def calcular_distancias(self, origem_lat, origem_lon, destinos):
+        raise ErroRoteamento("fora do ar")
+
+
+class TestProvedoresRotas(unittest.TestCase):
+    """Testes dos provedores de rotas e da cadeia de reserva."""
+
+    ORIGEM = (-15.79, -47.88)
+    DESTINOS = [(-15.80, -47.89), (-15.70, -47.95), (-16.00, -48.10)]
+
+    def test_estimativa_usa_fatores_da_regiao(self):
+        """Teste: a estimativa aplica desvio e velocidade da região da origem."""
+        regioes = [{'nome': 'R', 'caixa': (-16, -48, -15, -47), 'fator_desvio': 2.0, 'velocidade_kmh': 60}]
+        provedor = ProvedorEstimativa(regioes, padrao={'fator_desvio': 1.0, 'velocidade_kmh': 30})
+
+        dentro = provedor.calcular_distancias(*self.ORIGEM, self.DESTINOS[:1])[0]
+        fora = provedor.calcular_distancias(-10.0, -40.0, [(-10.1, -40.1)])[0]
+
+        reta = haversine_km(*self.ORIGEM, *self.DESTINOS[0])
+        self.assertAlmostEqual(dentro['distance_km'], 2 * reta)
+        self.assertAlmostEqual(dentro['duration_min'], 2 * reta)
+        self.assertAlmostEqual(fora['duration_min'], 2 * fora['distance_km'])
+
+    def test_osrm_contra_servidor_local(self):
+        """Teste: o provedor OSRM lê o serviço table em lotes."""
+        with ServidorRotasFalso() as servidor:
+            provedor = ProvedorOSRM(servidor.url_base, destinos_por_requisicao=2)
+            resultado = provedor.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+            esperado = servidor.calcular_matriz({
+                'origins': [{'waypoint': {'location': {'latLng': {'latitude': lat, 'longitude': lon}}}}
+                            for lat, lon in [self.ORIGEM]],
+                'destinations': [{'waypoint': {'location': {'latLng': {'latitude': lat, 'longitude': lon}}}}
+                                 for lat, lon in self.DESTINOS],
+            })
+
+        self.assertEqual(len(servidor.requisicoes), 2)
+        self.assertEqual([r['distance_km'] for r in resultado], [e['distanceMeters'] / 1000 for e in esperado])
+
+    def test_osrm_falha_gera_erro(self):
+        """Teste: erro HTTP do OSRM vira ErroRoteamento; sem URL o provedor fica indisponível."""
+        with ServidorRotasFalso() as servidor:
+            servidor.falhas = [500]
+            with self.assertRaises(ErroRoteamento):
+                ProvedorOSRM(servidor.url_base).calcular_distancias(*self.ORIGEM, self.DESTINOS)
+
+        self.assertFalse(ProvedorOSRM(None).disponivel())
+
+    def test_osrm_resposta_malformada_gera_erro(self):
+        """Teste: resposta Ok sem a matriz esperada vira ErroRoteamento, não KeyError/IndexError."""
+        provedor = ProvedorOSRM('http://osrm.invalido')
+        for corpo in [{'code': 'Ok'}, {'code': 'Ok', 'durations': []},
+                      {'code': 'Ok', 'durations': [[0, 60]]}, {'code': 'Ok', 'durations': None}, []]:
+            resposta = mock.Mock(status_code=200, text='', json=mock.Mock(return_value=corpo))
+            with mock.patch.object(provedor.sessao, 'get', return_value=resposta):
+                with self.assertRaises(ErroRoteamento, msg=corpo):
+                    provedor.calcular_distancias(*self.ORIGEM, self.DESTINOS)
+
+    def test_cadeia_de_reserva(self):
+        """Teste: destinos sem resultado passam para o próximo provedor da cadeia."""
+        pontos = {str(i): {'latitude': lat, 'longitude': lon} for i, (lat, lon) in enumerate(self.DESTINOS)}
+        provedores = {'quebrado': ProvedorQuebrado(), 'parcial': ProvedorParcial(),
+                      'estimativa': ProvedorEstimativa()}
+
+        with mock.patch.object(coleta_service, 'PROVEDORES_ROTAS', provedores), \
+                mock.patch.object(coleta_service, 'cache_rotas', CacheRotas()):
+            coleta_service.enriquecer_pontos_com_distancias(pontos, *self.ORIGEM,
+                                                            roteamento=['quebrado', 'parcial', 'estimativa'])
+
+        self.assertEqual([p['fonte_distancia'] for p in pontos.values()], ['parcial', 'estimativa', 'estimativa'])
+        self.assertEqual(pontos['0']['duration_min'], 2.0)
+
+    def test_roteamento_invalido(self):
+        """Teste: provedor desconhecido gera ValueError."""
+        with self.assertRaises(ValueError):
+            coleta_service.resolver_provedores(['teletransporte'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import io
+import json
+import logging
+from registro import Adiado, configurar_registro, logger_payloads
+
+
+class TestRegistro(unittest.TestCase):
+    """Testes da configuração de registro (logging)."""
+
+    def setUp(self):
+        self.saida = io.StringIO()
+        self.addCleanup(configurar_registro)
+        self.addCleanup(logging.getLogger('cliente_rotas').setLevel, logging.NOTSET)
+
+    def test_padrao_nao_serializa_payloads(self):
+        """Teste: no nível padrão, payloads de depuração nunca são formatados."""
+        listener = configurar_registro(nivel='INFO', niveis={}, amostragem_payloads=1.0, destino=self.saida)
+        formatados = []
+        logger_payloads('cliente_rotas').debug("Resposta: %s", Adiado(lambda: formatados.append(1)))
+        logging.getLogger('cliente_rotas').info("lote enviado")
+        listener.stop()
+
+        self.assertEqual(formatados, [])
+        self.assertIn('INFO cliente_rotas: lote enviado', self.saida.getvalue())
+
+    def test_niveis_por_modulo_e_amostragem(self):
+        """Teste: DEBUG ligado só no módulo pedido; amostragem 0 descarta os payloads."""
+        listener = configurar_registro(nivel='WARNING', niveis={'cliente_rotas': 'DEBUG'},
+                                       amostragem_payloads=0.0, destino=self.saida)
+        logging.getLogger('cliente_rotas').debug("detalhe do cliente")
+        logging.getLogger('coleta_service').info("omitido")
+        logger_payloads('cliente_rotas').debug("payload %s", Adiado(lambda: 'omitido'))
+        listener.stop()
+
+        self.assertIn('detalhe do cliente', self.saida.getvalue())
+        self.assertNotIn('omitido', self.saida.getvalue())
+
+    def test_formato_json(self):
+        """Teste: o formato json gera uma linha por registro, com os campos de extra=."""
+        listener = configurar_registro(nivel='INFO', niveis={}, formato='json', destino=self.saida)
+        logging.getLogger('coleta_service').warning("Provedor %s falhou", 'osrm', extra={'pontos': 3})
+        listener.stop()
+
+        registro = json.loads(self.saida.getvalue().splitlines()[-1])
+        self.assertEqual(registro['nivel'], 'WARNING')
+        self.assertEqual(registro['modulo'], 'coleta_service')
+        self.assertEqual(registro['mensagem'], 'Provedor osrm falhou')
+        self.assertEqual(registro['pontos'], 3)
+        with self.assertRaises(ValueError):
+            configurar_registro(formato='xml')
+
+    def test_parar_duas_vezes_e_importar_app_nao_configura(self):
+        """Teste: stop() repetido não falha e importar app não troca os handlers da raiz."""
+        listener = configurar_registro(nivel='INFO', niveis={}, destino=self.saida)
+        listener.stop()
+        listener.stop()
+        self.assertFalse(listener.ativo)
+
+        handlers = list(logging.getLogger().handlers)
+        import app  # noqa: F401
+        self.assertEqual(logging.getLogger().handlers, handlers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import csv
+import tempfile
+from repositorio_pontos import obter_repositorio, RepositorioPontos, mascara_de_posicoes, posicoes_da_mascara
+
+
+class TestRepositorioPontos(unittest.TestCase):
+    """Testes unitários para o repositório de pontos em memória."""
+
+    def setUp(self):
+        """Criar um arquivo CSV de teste."""
+        self.temp_csv = tempfile.NamedTemporaryFile(mode='w', delete=False,
+                                                    suffix='.csv', encoding='utf-8', newline='')
+        self.escrever([
+            ['001', 'Ponto A', 'eletroeletronicos\\,pilhas', '-15.1', '-47.1', 'Endereco A'],
+            ['002', 'Ponto B', 'eletrodomesticos', '-15.2', '-47.2', 'Endereco B'],
+        ])
+
+    def tearDown(self):
+        """Remover arquivo CSV de teste."""
+        if os.path.exists(self.temp_csv.name):
+            os.unlink(self.temp_csv.name)
+
+    def escrever(self, linhas, mtime=None):
+        with open(self.temp_csv.name, 'w', newline='', encoding='utf-8') as arquivo:
+            writer = csv.writer(arquivo)
+            writer.writerow(['id', 'nome', 'tipo_lixo', 'latitude', 'longitude', 'endereco'])
+            writer.writerows(linhas)
+        if mtime is not None:
+            os.utime(self.temp_csv.name, ns=(mtime, mtime))
+
+    def test_carrega_uma_vez(self):
+        """Teste: leituras seguidas reutilizam os mesmos dados."""
+        repositorio = RepositorioPontos(self.temp_csv.name)
+        primeiro = repositorio.dados()
+        segundo = repositorio.dados()
+
+        self.assertIs(primeiro, segundo)
+        self.assertEqual(repositorio.versao, 1)
+        self.assertEqual(primeiro.ponto(0).tipos, ('eletroeletronicos', 'pilhas'))
+
+    def test_recarrega_quando_mtime_muda(self):
+        """Teste: alterar o CSV faz o repositório recarregar os dados."""
+        repositorio = RepositorioPontos(self.temp_csv.name)
+        self.assertEqual(len(repositorio), 2)
+
+        self.escrever([['003', 'Ponto C', 'lampadas', '-15.3', '-47.3', 'Endereco C']],
+                      mtime=os.stat(self.temp_csv.name).st_mtime_ns + 1_000_000_000)
+
+        self.assertEqual(len(repositorio), 1)
+        self.assertEqual(repositorio.dados().ponto(0).id, '003')
+        self.assertEqual(repositorio.versao, 2)
+
+    def test_repositorio_compartilhado(self):
+        """Teste: o mesmo caminho retorna a mesma instância."""
+        self.assertIs(obter_repositorio(self.temp_csv.name),
+                      obter_repositorio(os.path.abspath(self.temp_csv.name)))
+
+    def test_indice_tipos(self):
+        """Teste: índice invertido combina bitsets por interseção e união."""
+        dados = RepositorioPontos(self.temp_csv.name).dados()
+
+        self.assertEqual(dados.indice_tipos['pilhas'], 0b01)
+        self.assertEqual(dados.mascara_tipos(['eletroeletronicos', 'pilhas']), 0b01)
+        self.assertEqual(dados.mascara_tipos(['pilhas', 'eletrodomesticos']), 0)
+        self.assertEqual(dados.mascara_tipos(['pilhas', 'eletrodomesticos'], 'qualquer'), 0b11)
+        self.assertEqual(dados.mascara_tipos(['inexistente'], 'qualquer'), 0)
+
+    def test_selecao_tipos_vetorizada(self):
+        """Teste: seleção pelas máscaras de tipos coincide com o índice invertido."""
+        dados = RepositorioPontos(self.temp_csv.name).dados()
+
+        self.assertIsNone(dados.selecao_tipos([]))
+        self.assertEqual(dados.selecao_tipos(['pilhas']).tolist(), [0])
+        self.assertEqual(dados.selecao_tipos(['pilhas', 'eletrodomesticos'], 'qualquer').tolist(), [0, 1])
+        self.assertEqual(dados.selecao_tipos(['pilhas', 'inexistente']).tolist(), [])
+
+    def test_conversao_bitset(self):
+        """Teste: posições e bitsets são conversíveis nos dois sentidos."""
+        posicoes = [0, 3, 8, 64, 999]
+        mascara = mascara_de_posicoes(posicoes, 1000)
+
+        self.assertEqual(mascara, sum(1 << p for p in posicoes))
+        self.assertEqual(posicoes_da_mascara(mascara), posicoes)
+        self.assertEqual(posicoes_da_mascara(0), [])
+
+    def test_arquivo_nao_encontrado(self):
+        """Teste: arquivo inexistente gera FileNotFoundError."""
+        with self.assertRaises(FileNotFoundError):
+            RepositorioPontos('arquivo_inexistente.csv').dados()
+
+
+if __name__ == '__main__':
+    unittest.main()
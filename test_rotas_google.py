@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+import coleta_service
+from coleta_service import get_distances_from_google
+from servidor_rotas_falso import ServidorRotasFalso
+
+
+class ServidorRotasInvertido(ServidorRotasFalso):
+    """Servidor falso que devolve os elementos fora de ordem."""
+
+    def calcular_matriz(self, corpo):
+        return list(reversed(super().calcular_matriz(corpo)))
+
+
+class TestRotasGoogle(unittest.TestCase):
+    """Testes do cliente computeRouteMatrix contra um servidor Routes local."""
+
+    ORIGEM = (-15.79, -47.88)
+    DESTINOS = [(-15.79 + i * 0.01, -47.88 + i * 0.01) for i in range(1, 8)]
+
+    def consultar(self, servidor, destinos, limite=625):
+        with mock.patch.object(coleta_service, 'GOOGLE_API_KEY', 'chave-teste'), \
+                mock.patch.object(coleta_service, 'GOOGLE_ROUTES_URL', servidor.url), \
+                mock.patch.object(coleta_service, 'LIMITE_ELEMENTOS_MATRIZ', limite):
+            return get_distances_from_google(*self.ORIGEM, destinos)
+
+    def test_uma_requisicao_para_todos_os_destinos(self):
+        """Teste: todos os destinos vão em uma única requisição quando cabem no limite."""
+        with ServidorRotasFalso() as servidor:
+            resultado = self.consultar(servidor, self.DESTINOS)
+
+        self.assertEqual(len(servidor.requisicoes), 1)
+        self.assertEqual(len(servidor.requisicoes[0]['destinations']), len(self.DESTINOS))
+        self.assertEqual(len(resultado), len(self.DESTINOS))
+        distancias = [r['distance_km'] for r in resultado]
+        self.assertEqual(distancias, sorted(distancias))
+
+    def test_divide_em_lotes_pelo_limite(self):
+        """Teste: destinos acima do limite são divididos no menor número de lotes."""
+        with ServidorRotasFalso(limite_elementos=3) as servidor:
+            resultado = self.consultar(servidor, self.DESTINOS, limite=3)
+
+        self.assertEqual(sorted(len(r['destinations']) for r in servidor.requisicoes), [1, 3, 3])
+        self.assertTrue(all(r['distance_km'] is not None for r in resultado))
+
+    def test_associa_pelo_destination_index(self):
+        """Teste: elementos fora de ordem voltam para o destino correto."""
+        with ServidorRotasFalso() as servidor:
+            esperado = self.consultar(servidor, self.DESTINOS, limite=3)
+        with ServidorRotasInvertido() as servidor:
+            resultado = self.consultar(servidor, self.DESTINOS, limite=3)
+
+        self.assertEqual(resultado, esperado)
+
+    def test_falha_em_um_lote(self):
+        """Teste: um lote com erro HTTP definitivo só anula os destinos daquele lote."""
+        with ServidorRotasFalso() as servidor:
+            servidor.falhas = [400]
+            resultado = self.consultar(servidor, self.DESTINOS, limite=4)
+
+        # Os lotes são enviados em paralelo: qualquer um deles pode receber o erro
+        sem_rota = [r['distance_km'] is None for r in resultado]
+        self.assertIn(sem_rota, ([True] * 4 + [False] * 3, [False] * 4 + [True] * 3))
+
+    def test_sem_chave_de_api(self):
+        """Teste: sem chave configurada nenhum destino recebe distância."""
+        with mock.patch.object(coleta_service, 'GOOGLE_API_KEY', 'YOUR_GOOGLE_API_KEY'):
+            resultado = get_distances_from_google(*self.ORIGEM, self.DESTINOS)
+
+        self.assertEqual(resultado, [{'distance_km': None, 'duration_min': None}] * len(self.DESTINOS))
+
+
+if __name__ == '__main__':
+    unittest.main()
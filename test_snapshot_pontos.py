@@ -0,0 +1,125 @@
+import unittest
+from unittest import mock
+import os
+import csv
+import tempfile
+from repositorio_pontos import RepositorioPontos
+from conteiner_binario import abrir_conteiner, gravar_conteiner
+from snapshot_pontos import MAGICO, VERSAO_FORMATO, caminho_snapshot, carimbo_arquivo, compilar_snapshot, \
+    ler_snapshot, verificar_snapshot
+
+
+class TestSnapshotPontos(unittest.TestCase):
+    """Testes do snapshot binário dos pontos de coleta."""
+
+    def setUp(self):
+        """Criar um arquivo CSV de teste e o snapshot correspondente."""
+        self.temp_csv = tempfile.NamedTemporaryFile(mode='w', delete=False,
+                                                    suffix='.csv', encoding='utf-8', newline='')
+        writer = csv.writer(self.temp_csv)
+        writer.writerow(['id', 'nome', 'tipo_lixo', 'latitude', 'longitude', 'endereco'])
+        writer.writerow(['001', 'Ponto Á', 'eletroeletronicos\\,pilhas', '-15.1', '-47.1', 'Endereço A'])
+        writer.writerow(['002', 'Ponto B', 'eletrodomesticos', '-15.2', '-47.2', 'Endereco B'])
+        writer.writerow(['003', 'Ponto C', 'pilhas', '-15.3', '-47.3', 'Endereco C'])
+        self.temp_csv.close()
+        self.snapshot = compilar_snapshot(self.temp_csv.name)
+
+    def tearDown(self):
+        """Remover arquivos de teste."""
+        for caminho in (self.temp_csv.name, self.snapshot):
+            if os.path.exists(caminho):
+                os.unlink(caminho)
+
+    def _corromper_ultimo_byte(self):
+        with open(self.snapshot, 'r+b') as arquivo:
+            arquivo.seek(-1, os.SEEK_END)
+            ultimo = arquivo.read(1)
+            arquivo.seek(-1, os.SEEK_END)
+            arquivo.write(bytes([ultimo[0] ^ 0xFF]))
+
+    def test_snapshot_igual_ao_csv(self):
+        """Teste: dados mapeados do snapshot equivalem aos lidos do CSV."""
+        do_snapshot = RepositorioPontos(self.temp_csv.name).dados()
+        do_csv = RepositorioPontos(self.temp_csv.name, usar_snapshot=False).dados()
+
+        self.assertIsInstance(do_snapshot.latitudes, memoryview)
+        self.assertEqual(self.snapshot, caminho_snapshot(self.temp_csv.name))
+        self.assertEqual([p.para_dict() for p in do_snapshot.pontos(range(3))],
+                         [p.para_dict() for p in do_csv.pontos(range(3))])
+        self.assertEqual(do_snapshot.indice_tipos, do_csv.indice_tipos)
+        self.assertEqual(do_snapshot.ponto(0).tipos, ('eletroeletronicos', 'pilhas'))
+        self.assertEqual(do_snapshot.selecao_tipos(['pilhas']).tolist(), [0, 2])
+        self.assertEqual(do_snapshot.grade.k_mais_proximos(-15.29, -47.29, 2),
+                         do_csv.grade.k_mais_proximos(-15.29, -47.29, 2))
+
+    def test_snapshot_desatualizado(self):
+        """Teste: CSV alterado depois do snapshot faz o repositório ler o CSV."""
+        with open(self.temp_csv.name, 'a', encoding='utf-8', newline='') as arquivo:
+            csv.writer(arquivo).writerow(['004', 'Ponto D', 'lampadas', '-15.4', '-47.4', 'Endereco D'])
+
+        with self.assertLogs('snapshot_pontos', level='WARNING'):
+            self.assertIsNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+            dados = RepositorioPontos(self.temp_csv.name).dados()
+        self.assertEqual(len(dados), 4)
+        self.assertNotIsInstance(dados.latitudes, memoryview)
+
+    def test_carimbo_do_csv(self):
+        """Teste: CSV com outro mtime e o mesmo conteúdo (ex.: copiado) usa o snapshot e o recarimba."""
+        estado = os.stat(self.temp_csv.name)
+        os.utime(self.temp_csv.name, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+
+        with self.assertLogs('snapshot_pontos', level='INFO') as aviso:
+            self.assertIsNotNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        self.assertIn('recarimbado', aviso.records[-1].getMessage())
+        metadados, _ = abrir_conteiner(self.snapshot, MAGICO, VERSAO_FORMATO)
+        self.assertEqual(metadados['csv_carimbo'], carimbo_arquivo(self.temp_csv.name))
+        self.assertTrue(verificar_snapshot(self.snapshot, self.temp_csv.name))
+
+        # Com o carimbo novo, a carga não lê mais o CSV inteiro
+        with mock.patch('snapshot_pontos.hash_arquivo') as hash_arquivo:
+            self.assertIsNotNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        hash_arquivo.assert_not_called()
+
+    def test_carimbo_diferente_com_conteudo_corrompido(self):
+        """Teste: ao recarimbar, o CRC-32 do conteúdo é conferido e um snapshot corrompido é ignorado."""
+        self._corromper_ultimo_byte()
+        estado = os.stat(self.temp_csv.name)
+        os.utime(self.temp_csv.name, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+
+        with self.assertLogs('snapshot_pontos', level='WARNING') as aviso:
+            self.assertIsNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        self.assertIn('CRC-32', aviso.records[-1].getMessage())
+
+    def test_snapshot_truncado(self):
+        """Teste: snapshot truncado é ignorado na carga, mesmo com o carimbo do CSV certo."""
+        with open(self.snapshot, 'r+b') as arquivo:
+            arquivo.truncate(os.path.getsize(self.snapshot) - 8)
+
+        with self.assertLogs('snapshot_pontos', level='WARNING') as aviso:
+            self.assertIsNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        self.assertIn('truncado', aviso.records[-1].getMessage())
+
+    def test_snapshot_sem_chave_nos_metadados(self):
+        """Teste: snapshot de versão anterior, sem uma chave dos metadados, é ignorado em vez de falhar."""
+        metadados, secoes = abrir_conteiner(self.snapshot, MAGICO, VERSAO_FORMATO)
+        antigos = {chave: valor for chave, valor in metadados.items() if chave not in ('crc32', 'secoes', 'total')}
+        gravar_conteiner(self.snapshot, MAGICO, VERSAO_FORMATO, antigos, [
+            (nome, codigo, bytes(secoes[nome].cast('B'))) for nome, (_, _, codigo) in metadados['secoes'].items()
+        ])
+
+        with self.assertLogs('snapshot_pontos', level='WARNING'):
+            self.assertIsNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        self.assertEqual(len(RepositorioPontos(self.temp_csv.name).dados()), 3)
+
+    def test_snapshot_corrompido(self):
+        """Teste: bytes alterados não são lidos na carga, mas a verificação completa acusa o CRC-32."""
+        self._corromper_ultimo_byte()
+
+        self.assertIsNotNone(ler_snapshot(self.snapshot, self.temp_csv.name))
+        with self.assertLogs('snapshot_pontos', level='WARNING') as aviso:
+            self.assertFalse(verificar_snapshot(self.snapshot, self.temp_csv.name))
+        self.assertIn('CRC-32', aviso.records[-1].getMessage())
+
+
+if __name__ == '__main__':
+    unittest.main()
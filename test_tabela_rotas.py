@@ -0,0 +1,127 @@
+import unittest
+from unittest import mock
+import os
+import tempfile
+from cache_rotas import CacheRotas
+from coleta_service import PROVEDORES_ROTAS, ler_pontos_por_tipo_lixo
+from repositorio_pontos import obter_repositorio
+from servidor_rotas_falso import ServidorRotasFalso
+import tabela_rotas
+from tabela_rotas import Grade, TabelaRotas, gerar_tabela, ler_tabela, verificar_tabela
+
+ORIGEM = (-15.7963, -47.8877)
+
+
+class TestTabelaRotas(unittest.TestCase):
+    """Testes da tabela de tempos de direção pré-calculada por célula."""
+
+    def setUp(self):
+        self.caminho = os.path.join(tempfile.mkdtemp(), 'tabela-rotas.bin')
+        self.grade = Grade(-15.82, -47.92, -15.78, -47.86, 0.01)
+        self.servidor = ServidorRotasFalso().iniciar()
+        self.addCleanup(self.servidor.parar)
+        for alvo, valor in (('GOOGLE_API_KEY', 'chave-teste'), ('GOOGLE_ROUTES_URL', self.servidor.url),
+                            ('cache_rotas', CacheRotas())):
+            patcher = mock.patch(f'coleta_service.{alvo}', valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if os.path.exists(self.caminho):
+            os.unlink(self.caminho)
+
+    def _gerar(self, **kwargs):
+        return gerar_tabela(obter_repositorio().dados(), PROVEDORES_ROTAS['google'], self.grade, self.caminho,
+                            destinos_por_tipo=30, **kwargs)
+
+    def test_grade(self):
+        """Teste: a célula de uma origem sai de uma conta; fora da área não há célula."""
+        self.assertEqual((self.grade.linhas, self.grade.colunas), (4, 6))
+        celula = self.grade.celula(*ORIGEM)
+        centro = self.grade.centro(celula)
+        self.assertEqual(self.grade.celula(*centro), celula)
+        self.assertLess(max(abs(centro[0] - ORIGEM[0]), abs(centro[1] - ORIGEM[1])), 0.005)
+        self.assertIsNone(self.grade.celula(-15.7, -47.9))
+        with self.assertRaises(ValueError):
+            Grade(-15.7, -47.9, -15.8, -47.8, 0.01)
+
+    def test_consulta_usa_a_tabela(self):
+        """Teste: com a tabela da célula, a consulta não chama a API e usa os tempos a partir do centro."""
+        resumo = self._gerar()
+        self.assertEqual(resumo, {'reaproveitadas': 0, 'calculadas': len(self.grade), 'falhas': 0})
+        self.assertEqual(self._gerar()['reaproveitadas'], len(self.grade))
+        requisicoes_do_job = len(self.servidor.requisicoes)
+
+        tabela = TabelaRotas(self.caminho)
+        with mock.patch('coleta_service.tabela_rotas', tabela):
+            pontos = ler_pontos_por_tipo_lixo(['pilhas'], *ORIGEM, 3, roteamento=['google'])
+
+        self.assertEqual(len(self.servidor.requisicoes), requisicoes_do_job)
+        self.assertEqual(len(pontos), 3)
+        centro = self.grade.centro(self.grade.celula(*ORIGEM))
+        for ponto in pontos.values():
+            metros, segundos = self.servidor._metros_e_segundos(*centro, ponto['latitude'], ponto['longitude'])
+            self.assertEqual((ponto['distance_km'], ponto['duration_min']), (metros / 1000, segundos / 60))
+            self.assertEqual(ponto['fonte_distancia'], 'google')
+        self.assertEqual(tabela.resumo()['faltas'], 0)
+        self.assertEqual(tabela.obter_muitos('osrm', *ORIGEM, {}), {})
+
+    def test_regerar_libera_o_mapa_antes_de_gravar(self):
+        """Teste: ao atualizar, a tabela anterior é desmapeada antes do arquivo novo ser renomeado por cima."""
+        self._gerar()
+        abertas = []
+
+        def ler(caminho, *args, **kwargs):
+            tabela = ler_tabela(caminho, *args, **kwargs)
+            abertas.append((tabela, tabela.destinos.obj))
+            return tabela
+
+        def gravar(*args, **kwargs):
+            tabela, mapa = abertas[0]
+            self.assertTrue(mapa.closed)
+            with self.assertRaises(ValueError):
+                tabela.destinos[0]
+            return gravar_tabela(*args, **kwargs)
+
+        gravar_tabela = tabela_rotas.gravar_tabela
+        with mock.patch('tabela_rotas.ler_tabela', ler), mock.patch('tabela_rotas.gravar_tabela', gravar):
+            self.assertEqual(self._gerar()['reaproveitadas'], len(self.grade))
+
+        # Sem mapa (Windows), a consulta lê uma cópia em memória
+        with mock.patch('tabela_rotas.MAPEAR_TABELA', False):
+            tabela = TabelaRotas(self.caminho).tabela()
+        self.assertIsInstance(tabela.destinos.obj, bytes)
+
+    def test_vencida_ausente_ou_invalida_vai_ao_vivo(self):
+        """Teste: células vencidas, origens fora da área e destinos alterados são roteados ao vivo."""
+        self._gerar()
+        ponto = next(iter(ler_pontos_por_tipo_lixo(['pilhas'], *ORIGEM, 1, roteamento=['estimativa']).values()))
+        destinos = {ponto['id']: ponto}
+
+        self.assertEqual(len(TabelaRotas(self.caminho).obter_muitos('google', *ORIGEM, destinos)), 1)
+        vencida = TabelaRotas(self.caminho, validade=-1)
+        self.assertEqual(vencida.obter_muitos('google', *ORIGEM, destinos), {})
+        self.assertEqual(vencida.resumo()['celulas_vencidas'], 1)
+        tabela = TabelaRotas(self.caminho)
+        self.assertEqual(tabela.obter_muitos('google', -15.7, -47.9, destinos), {})
+        movido = {ponto['id']: dict(ponto, latitude=ponto['latitude'] + 0.001)}
+        self.assertEqual(tabela.obter_muitos('google', *ORIGEM, movido), {})
+        self.assertEqual((tabela.resumo()['origens_sem_celula'], tabela.resumo()['faltas']), (1, 1))
+
+        # Células vencidas são recalculadas pelo job; a carga não confere o CRC-32 (só o job e --verificar)
+        self.assertEqual(self._gerar(validade=-1)['reaproveitadas'], 0)
+        with open(self.caminho, 'r+b') as arquivo:
+            arquivo.seek(-1, os.SEEK_END)
+            ultimo = arquivo.read(1)[0]
+            arquivo.seek(-1, os.SEEK_END)
+            arquivo.write(bytes([ultimo ^ 0xff]))
+        self.assertIsNotNone(ler_tabela(self.caminho))
+        with self.assertLogs('tabela_rotas', 'WARNING'):
+            self.assertFalse(verificar_tabela(self.caminho))
+        with self.assertLogs('tabela_rotas', 'WARNING'):
+            self.assertEqual(self._gerar()['reaproveitadas'], 0)
+        self.assertTrue(verificar_tabela(self.caminho))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+import socket
+from unittest import mock
+import httpx
+import coleta_service
+import transporte_rotas
+from cliente_rotas import ClienteRotas, ClienteRotasAsync
+from servidor_rotas_falso import ServidorRotasFalso
+from transporte_rotas import FAMILIA_IPV4, ResolvedorDNS, transporte_async
+
+
+def _infos(*enderecos):
+    """Resultado de getaddrinfo para os endereços dados."""
+    return [(socket.AF_INET6 if ':' in e else socket.AF_INET, socket.SOCK_STREAM, 6, '', (e, 443))
+            for e in enderecos]
+
+
+class TestTransporteRotas(unittest.TestCase):
+    """Testes da resolução DNS e do reaproveitamento de conexões dos clientes de rotas."""
+
+    def test_sem_alterar_socket_global(self):
+        """Teste: importar o serviço não substitui socket.getaddrinfo."""
+        self.assertIsNotNone(coleta_service.resolvedor_rotas)
+        self.assertEqual(socket.getaddrinfo.__module__, 'socket')
+
+    def test_cache_com_ttl_e_preferencia_ipv4(self):
+        """Teste: endereços IPv4 vêm primeiro e o resultado fica em cache até o TTL."""
+        resolvedor = ResolvedorDNS(ttl=60)
+        with mock.patch.object(transporte_rotas.socket, 'getaddrinfo',
+                               return_value=_infos('2001:db8::1', '203.0.113.7')) as getaddrinfo, \
+                mock.patch.object(transporte_rotas.time, 'monotonic', return_value=100.0):
+            self.assertEqual(resolvedor.resolver('api.exemplo', 443), ['203.0.113.7', '2001:db8::1'])
+            resolvedor.resolver('api.exemplo', 443)
+        self.assertEqual(getaddrinfo.call_count, 1)
+
+        with mock.patch.object(transporte_rotas.socket, 'getaddrinfo',
+                               side_effect=socket.gaierror('sem rede')), \
+                mock.patch.object(transporte_rotas.time, 'monotonic', return_value=161.0), \
+                self.assertLogs('transporte_rotas', level='WARNING'):
+            # Expirado e sem DNS: reaproveita o resultado anterior
+            self.assertEqual(resolvedor.resolver('api.exemplo', 443), ['203.0.113.7', '2001:db8::1'])
+        self.assertEqual(resolvedor.resumo(), {'consultas': 2, 'acertos': 1, 'nomes': 1})
+
+    def test_somente_ipv4(self):
+        """Teste: a política ipv4 pede apenas endereços AF_INET ao sistema."""
+        with mock.patch.object(transporte_rotas.socket, 'getaddrinfo',
+                               return_value=_infos('203.0.113.7')) as getaddrinfo:
+            ResolvedorDNS(familia=FAMILIA_IPV4).resolver('api.exemplo', 443)
+        self.assertEqual(getaddrinfo.call_args[0][2], socket.AF_INET)
+        with self.assertRaises(ValueError):
+            ResolvedorDNS(familia='ipv5')
+
+    def test_cliente_reaproveita_dns_e_conexao(self):
+        """Teste: chamadas seguidas usam uma conexão e uma única consulta DNS."""
+        with ServidorRotasFalso() as servidor:
+            resolvedor = ResolvedorDNS()
+            url = servidor.url.replace('127.0.0.1', 'localhost')
+            cliente = ClienteRotas(url, 'chave-teste', max_concorrencia=1, resolvedor=resolvedor)
+            try:
+                for _ in range(3):
+                    resultado = cliente.calcular_distancias(-15.79, -47.88, [(-15.80, -47.89)])
+            finally:
+                cliente.fechar()
+
+        self.assertIsNotNone(resultado[0]['distance_km'])
+        self.assertEqual(servidor.conexoes, 1)
+        self.assertEqual(resolvedor.resumo()['consultas'], 1)
+
+    def test_cliente_async_reaproveita_dns_e_conexao(self):
+        """Teste: o cliente assíncrono também resolve o nome uma vez e mantém a conexão."""
+        async def consultar(url, resolvedor):
+            cliente = ClienteRotasAsync(url, 'chave-teste', resolvedor=resolvedor)
+            try:
+                for _ in range(3):
+                    resultado = await cliente.calcular_distancias(-15.79, -47.88, [(-15.80, -47.89)])
+            finally:
+                await cliente.fechar()
+            return resultado
+
+        with ServidorRotasFalso() as servidor:
+            resolvedor = ResolvedorDNS()
+            resultado = asyncio.run(consultar(servidor.url.replace('127.0.0.1', 'localhost'), resolvedor))
+
+        self.assertIsNotNone(resultado[0]['distance_km'])
+        self.assertEqual(servidor.conexoes, 1)
+        self.assertEqual(resolvedor.resumo()['consultas'], 1)
+
+    def test_transporte_async_relanca_erros_do_httpx(self):
+        """Teste: falhas de conexão saem como exceções do httpx, que o cliente assíncrono trata."""
+        with socket.socket() as livre:
+            livre.bind(('127.0.0.1', 0))
+            porta = livre.getsockname()[1]
+
+        async def consultar():
+            async with httpx.AsyncClient(transport=transporte_async(ResolvedorDNS(), 2)) as cliente:
+                await cliente.get(f'http://localhost:{porta}/')
+
+        with self.assertRaises(httpx.ConnectError):
+            asyncio.run(consultar())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+"""
+Transporte HTTP dos clientes de rotas: resolução DNS própria, com cache por
+TTL e preferência de família de endereços por cliente, e conexões
+persistentes (keep-alive) reaproveitadas entre chamadas.
+
+Nada aqui altera o módulo socket: a política vale só para as sessões e
+clientes que montam estes adaptadores/transportes.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+# httpx/httpcore são opcionais: só o transporte assíncrono depende deles
+try:
+    import httpcore
+    import httpx
+except ImportError:
+    httpcore = httpx = None
+
+# Políticas de família de endereços
+FAMILIA_IPV4 = "ipv4"                    # só IPv4
+FAMILIA_PREFERIR_IPV4 = "preferir_ipv4"  # IPv4 primeiro, IPv6 como reserva
+FAMILIA_SISTEMA = "sistema"              # ordem devolvida pelo sistema
+
+logger = logging.getLogger(__name__)
+
+
+class ResolvedorDNS:
+    """
+    Resolve nomes com cache por TTL e ordena os endereços pela política de família.
+
+    Se a consulta falhar e houver um resultado expirado para o nome, ele é
+    reaproveitado (com aviso) em vez de derrubar a chamada.
+
+    Args:
+        ttl: Segundos que um resultado fica no cache
+        familia: FAMILIA_IPV4, FAMILIA_PREFERIR_IPV4 ou FAMILIA_SISTEMA
+
+    Lança:
+        ValueError: se a política de família for desconhecida
+    """
+
+    def __init__(self, ttl=300.0, familia=FAMILIA_PREFERIR_IPV4):
+        if familia not in (FAMILIA_IPV4, FAMILIA_PREFERIR_IPV4, FAMILIA_SISTEMA):
+            raise ValueError(f"Família de endereços inválida: {familia}")
+        self.ttl = ttl
+        self.familia = familia
+        self.consultas = 0
+        self.acertos = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def da_configuracao(cls):
+        """Cria o resolvedor a partir de ROTAS_DNS_TTL e ROTAS_FAMILIA_IP."""
+        return cls(
+            ttl=float(os.getenv("ROTAS_DNS_TTL", "300")),
+            familia=os.getenv("ROTAS_FAMILIA_IP", FAMILIA_PREFERIR_IPV4),
+        )
+
+    def _do_cache(self, host, porta):
+        with self._lock:
+            entrada = self._cache.get((host, porta))
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.acertos += 1
+                return entrada[1]
+        return None
+
+    def resolver(self, host, porta):
+        """
+        Retorna os endereços IP de host, na ordem em que devem ser tentados.
+
+        Lança:
+            socket.gaierror: se o nome não puder ser resolvido (e não houver resultado anterior)
+        """
+        enderecos = self._do_cache(host, porta)
+        if enderecos is not None:
+            return enderecos
+
+        familia = socket.AF_INET if self.familia == FAMILIA_IPV4 else socket.AF_UNSPEC
+        with self._lock:
+            self.consultas += 1
+        try:
+            infos = socket.getaddrinfo(host, porta, familia, socket.SOCK_STREAM)
+        except socket.gaierror:
+            with self._lock:
+                anterior = self._cache.get((host, porta))
+            if anterior is None:
+                raise
+            logger.warning("Falha ao resolver %s; usando endereços anteriores", host)
+            return anterior[1]
+
+        enderecos = []
+        for info in infos:
+            if info[4][0] not in enderecos:
+                enderecos.append(info[4][0])
+        if self.familia == FAMILIA_PREFERIR_IPV4:
+            enderecos.sort(key=lambda endereco: ":" in endereco)
+        with self._lock:
+            self._cache[(host, porta)] = (time.monotonic() + self.ttl, enderecos)
+        return enderecos
+
+    async def resolver_async(self, host, porta):
+        """Como resolver(), sem bloquear o event loop quando é preciso consultar o DNS."""
+        enderecos = self._do_cache(host, porta)
+        if enderecos is not None:
+            return enderecos
+        return await asyncio.to_thread(self.resolver, host, porta)
+
+    def invalidar(self, host, porta):
+        """Descarta o resultado de host (ex.: nenhum endereço aceitou conexão)."""
+        with self._lock:
+            self._cache.pop((host, porta), None)
+
+    def resumo(self):
+        """Retorna consultas DNS feitas e acertos do cache."""
+        with self._lock:
+            return {'consultas': self.consultas, 'acertos': self.acertos, 'nomes': len(self._cache)}
+
+
+class _ConexaoResolvida:
+    """Mixin de conexão urllib3 que usa o ResolvedorDNS da classe em vez do DNS do sistema."""
+
+    resolvedor = None
+
+    def _new_conn(self):
+        try:
+            enderecos = self.resolvedor.resolver(self._dns_host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        erro = None
+        for endereco in enderecos:
+            try:
+                return create_connection((endereco, self.port), self.timeout,
+                                         source_address=self.source_address,
+                                         socket_options=self.socket_options)
+            except OSError as e:
+                erro = e
+        # Nenhum endereço aceitou: na próxima conexão o nome é resolvido de novo
+        self.resolvedor.invalidar(self._dns_host, self.port)
+        if isinstance(erro, socket.timeout):
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from erro
+        raise NewConnectionError(self, f"Failed to establish a new connection: {erro}") from erro
+
+
+class AdaptadorRotas(HTTPAdapter):
+    """
+    HTTPAdapter do requests cujas conexões resolvem nomes pelo ResolvedorDNS.
+
+    As conexões ficam no pool do adaptador (keep-alive) e só pagam DNS e
+    handshake quando uma nova precisa ser aberta.
+
+    Args:
+        resolvedor: ResolvedorDNS usado pelas conexões
+        **kwargs: Argumentos do HTTPAdapter (pool_connections, pool_maxsize, ...)
+    """
+
+    def __init__(self, resolvedor, **kwargs):
+        self.resolvedor = resolvedor
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        atributos = {"resolvedor": self.resolvedor}
+        conexao_http = type("ConexaoHTTPRotas", (_ConexaoResolvida, HTTPConnection), atributos)
+        conexao_https = type("ConexaoHTTPSRotas", (_ConexaoResolvida, HTTPSConnection), atributos)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("PoolHTTPRotas", (HTTPConnectionPool,), {"ConnectionCls": conexao_http}),
+            "https": type("PoolHTTPSRotas", (HTTPSConnectionPool,), {"ConnectionCls": conexao_https}),
+        }
+
+
+if httpcore is not None:
+    class _BackendResolvido(httpcore.AsyncNetworkBackend):
+        """Backend de rede do httpcore que resolve nomes pelo ResolvedorDNS."""
+
+        def __init__(self, resolvedor, backend):
+            self.resolvedor = resolvedor
+            self.backend = backend
+
+        async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+            erro = None
+            for endereco in await self.resolvedor.resolver_async(host, port):
+                try:
+                    return await self.backend.connect_tcp(endereco, port, timeout=timeout,
+                                                          local_address=local_address,
+                                                          socket_options=socket_options)
+                except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                    erro = e
+            self.resolvedor.invalidar(host, port)
+            raise erro or httpcore.ConnectError(f"Nenhum endereço para {host}")
+
+        async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+            return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+        async def sleep(self, seconds):
+            await self.backend.sleep(seconds)
+
+    # Exceções do httpcore -> httpx, as mais específicas primeiro (os nomes coincidem)
+    _ERROS_HTTPCORE = [
+        (getattr(httpcore, nome), getattr(httpx, nome)) for nome in (
+            "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout", "TimeoutException",
+            "ConnectError", "ReadError", "WriteError", "NetworkError", "ProxyError", "UnsupportedProtocol",
+            "LocalProtocolError", "RemoteProtocolError", "ProtocolError",
+        )
+    ]
+
+    @contextlib.contextmanager
+    def _erros_httpx():
+        """Relança exceções do httpcore como as equivalentes do httpx (ex.: httpx.TransportError)."""
+        try:
+            yield
+        except tuple(origem for origem, _ in _ERROS_HTTPCORE) as e:
+            destino = next(destino for origem, destino in _ERROS_HTTPCORE if isinstance(e, origem))
+            raise destino(str(e)) from e
+
+    class _CorpoResposta(httpx.AsyncByteStream):
+        """Corpo de uma resposta do httpcore visto pelo httpx."""
+
+        def __init__(self, corpo):
+            self.corpo = corpo
+
+        async def __aiter__(self):
+            with _erros_httpx():
+                async for parte in self.corpo:
+                    yield parte
+
+        async def aclose(self):
+            await self.corpo.aclose()
+
+    class _TransporteResolvido(httpx.AsyncBaseTransport):
+        """
+        Transporte do httpx sobre um httpcore.AsyncConnectionPool próprio, cujo
+        backend de rede resolve nomes pelo ResolvedorDNS (só APIs públicas das
+        duas bibliotecas).
+        """
+
+        def __init__(self, pool):
+            self.pool = pool
+
+        async def handle_async_request(self, request):
+            requisicao = httpcore.Request(
+                method=request.method,
+                url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host,
+                                 port=request.url.port, target=request.url.raw_path),
+                headers=request.headers.raw,
+                content=request.stream,
+                extensions=request.extensions,
+            )
+            with _erros_httpx():
+                resposta = await self.pool.handle_async_request(requisicao)
+            return httpx.Response(status_code=resposta.status, headers=resposta.headers,
+                                  stream=_CorpoResposta(resposta.stream), extensions=resposta.extensions)
+
+        async def aclose(self):
+            await self.pool.aclose()
+
+
+def transporte_async(resolvedor, max_conexoes):
+    """
+    Cria o transporte do httpx.AsyncClient com o ResolvedorDNS e keep-alive.
+
+    Args:
+        resolvedor: ResolvedorDNS usado pelas conexões
+        max_conexoes: Máximo de conexões simultâneas (todas podem ficar abertas)
+
+    Retorna:
+        httpx.AsyncBaseTransport
+    """
+    pool = httpcore.AsyncConnectionPool(
+        ssl_context=httpx.create_ssl_context(trust_env=False),
+        max_connections=max_conexoes,
+        max_keepalive_connections=max_conexoes,
+        keepalive_expiry=60.0,
+        network_backend=_BackendResolvido(resolvedor, httpcore.AnyIOBackend()),
+    )
+    return _TransporteResolvido(pool)